@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Room, Booking, UserProfile, BookingAddon, RoomServiceRequest, ContactMessage
+from .admin_export import CsvExportMixin
+from .models import Room, Booking, BookingArchive, GuestProfile, UserProfile, BookingAddon, RoomServiceRequest, ContactMessage
 
 # Register your models here.
 
@@ -20,23 +21,60 @@ class RoomServiceInline(admin.TabularInline):
     readonly_fields = ['requested_at']
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(CsvExportMixin, admin.ModelAdmin):
     list_display = ['booking_id', 'guest_name', 'room', 'check_in_date', 'check_out_date', 'status', 'get_total_with_addons', 'created_at']
     list_filter = ['status', 'created_at', 'check_in_date']
     search_fields = ['booking_id', 'guest_name', 'guest_email']
     readonly_fields = ['created_at']
     inlines = [BookingAddonInline, RoomServiceInline]
+    list_select_related = ['room']
+    export_fields = [
+        ('booking_id', 'Booking ID'), 'guest_name', 'guest_email', 'guest_phone', ('room__name', 'Room'),
+        'check_in_date', 'check_out_date', 'status', 'nights', ('base_total', 'Room total'),
+        ('addon_total', 'Add-on total'), ('grand_total', 'Total (with add-ons)'), ('user__username', 'User'),
+        'created_at',
+    ]
+
+    def get_queryset(self, request):
+        # Totals are computed in SQL instead of one add-on query per row
+        return super().get_queryset(request).with_totals()
 
     def get_total_with_addons(self, obj):
-        base_price = obj.get_total_price()
-        addon_total = sum(addon.get_total_price() for addon in obj.addons.all())
-        return f"RM{base_price + addon_total:.2f}"
+        return f"RM{obj.get_total_with_addons():.2f}"
+    get_total_with_addons.short_description = 'Total (with add-ons)'
+
+@admin.register(BookingArchive)
+class BookingArchiveAdmin(CsvExportMixin, admin.ModelAdmin):
+    list_display = ['booking_id', 'guest_name', 'room_name', 'check_in_date', 'check_out_date', 'status', 'get_total_with_addons', 'archived_at']
+    list_filter = ['status', 'check_in_date', 'archived_at']
+    search_fields = ['booking_id', 'guest_name', 'guest_email']
+    export_fields = [
+        ('booking_id', 'Booking ID'), 'guest_name', 'guest_email', 'guest_phone', ('room_name', 'Room'),
+        'check_in_date', 'check_out_date', 'status', ('base_total', 'Room total'), ('addon_total', 'Add-on total'),
+        ('user__username', 'User'), 'created_at', 'archived_at',
+    ]
+
+    # Archived bookings are a historical record
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_total_with_addons(self, obj):
+        return f"RM{obj.get_total_with_addons():.2f}"
     get_total_with_addons.short_description = 'Total (with add-ons)'
 
 @admin.register(BookingAddon)
-class BookingAddonAdmin(admin.ModelAdmin):
+class BookingAddonAdmin(CsvExportMixin, admin.ModelAdmin):
     list_display = ['booking', 'addon_type', 'get_details', 'get_total_price', 'created_at']
+    list_select_related = ['booking__room']
     list_filter = ['addon_type', 'created_at']
+    export_fields = [
+        ('booking__booking_id', 'Booking ID'), ('booking__guest_name', 'Guest name'), 'addon_type', 'price',
+        'breakfast_count', 'transport_direction', 'transport_date', 'transport_time', 'passenger_count',
+        'created_at',
+    ]
     search_fields = ['booking__booking_id', 'booking__guest_name']
     readonly_fields = ['created_at']
 
@@ -54,10 +92,22 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'user__email']
     search_fields = ['user__username', 'user__email']
 
+@admin.register(GuestProfile)
+class GuestProfileAdmin(admin.ModelAdmin):
+    list_display = ['guest_name', 'email', 'phone', 'last_booking_id', 'updated_at']
+    search_fields = ['email', 'guest_name', 'phone_key']
+    readonly_fields = ['name_key', 'phone_key', 'created_at', 'updated_at']
+
 @admin.register(RoomServiceRequest)
-class RoomServiceRequestAdmin(admin.ModelAdmin):
+class RoomServiceRequestAdmin(CsvExportMixin, admin.ModelAdmin):
     list_display = ['booking', 'service_type', 'status', 'get_service_details', 'requested_at']
+    list_select_related = ['booking__room']
     list_filter = ['service_type', 'status', 'requested_at']
+    export_fields = [
+        ('booking__booking_id', 'Booking ID'), ('booking__guest_name', 'Guest name'), 'service_type', 'status',
+        'cleaning_time_slot', 'special_instructions', 'dnd_active', 'dnd_start_time', 'dnd_end_time',
+        'requested_at', 'completed_at', 'notes',
+    ]
     search_fields = ['booking__booking_id', 'booking__guest_name']
     readonly_fields = ['requested_at']
 
@@ -71,7 +121,7 @@ class RoomServiceRequestAdmin(admin.ModelAdmin):
     get_service_details.short_description = 'Service Details'
 
 @admin.register(ContactMessage)
-class ContactMessageAdmin(admin.ModelAdmin):
+class ContactMessageAdmin(CsvExportMixin, admin.ModelAdmin):
     list_display = ['name', 'email', 'subject', 'is_read', 'replied', 'created_at']
     list_filter = ['is_read', 'replied', 'created_at']
     search_fields = ['name', 'email', 'subject']
@@ -84,7 +134,7 @@ class ContactMessageAdmin(admin.ModelAdmin):
         return self.readonly_fields
 
     # Custom actions
-    actions = ['mark_as_read', 'mark_as_replied']
+    actions = ['mark_as_read', 'mark_as_replied', 'export_as_csv']
 
     def mark_as_read(self, request, queryset):
         updated = queryset.update(is_read=True)
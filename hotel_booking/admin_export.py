@@ -0,0 +1,95 @@
+"""
+Streaming CSV export for admin changelists.
+
+``CsvExportMixin`` adds an "Export CSV" button and ``<changelist>/export/`` URL
+that stream the changelist as currently filtered, searched and ordered, and an
+admin action that streams the selected rows. Rows are read with
+``values_list(...).iterator(chunk_size=...)`` and written to the response in
+blocks, so the download starts at once and memory stays flat however many
+rows there are.
+"""
+import csv
+import io
+
+from django.core.exceptions import PermissionDenied
+from django.http import StreamingHttpResponse
+from django.urls import path
+from django.utils import timezone
+
+# Characters that make spreadsheet apps treat a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Bytes of CSV buffered before each chunk is sent
+FLUSH_SIZE = 64 * 1024
+
+
+def _header(field):
+    return field.replace('__', ' ').replace('_', ' ').capitalize()
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(queryset, fields, headers, chunk_size):
+    """Yield CSV text for ``fields`` of every row in ``queryset``, a block at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for values in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        writer.writerow([_cell(value) for value in values])
+        if buffer.tell() >= FLUSH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+class CsvExportMixin:
+    """
+    ModelAdmin mixin streaming the changelist as CSV.
+
+    ``export_fields`` lists field paths (``'room__name'``) or queryset
+    annotations; a ``(path, header)`` pair overrides the column header.
+    Admins that set ``actions`` must include ``'export_as_csv'`` themselves.
+    """
+    export_fields = None
+    export_chunk_size = 2000
+    change_list_template = 'admin/hotel_booking/export_change_list.html'
+    actions = ['export_as_csv']
+
+    def get_export_fields(self):
+        fields = self.export_fields or [field.name for field in self.model._meta.concrete_fields]
+        return [field if isinstance(field, tuple) else (field, _header(field)) for field in fields]
+
+    def get_urls(self):
+        opts = self.model._meta
+        return [
+            path('export/', self.admin_site.admin_view(self.export_csv_view),
+                 name=f'{opts.app_label}_{opts.model_name}_export'),
+        ] + super().get_urls()
+
+    def export_csv_view(self, request):
+        """The changelist with the request's filters, search and ordering, as CSV."""
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        changelist = self.get_changelist_instance(request)
+        return self.csv_response(changelist.get_queryset(request))
+
+    def export_as_csv(self, request, queryset):
+        return self.csv_response(queryset)
+    export_as_csv.short_description = 'Export selected rows as CSV'
+
+    def csv_response(self, queryset):
+        fields = self.get_export_fields()
+        rows = stream_csv(queryset, [field for field, _ in fields], [header for _, header in fields],
+                          self.export_chunk_size)
+        response = StreamingHttpResponse(rows, content_type='text/csv; charset=utf-8')
+        filename = f"{self.model._meta.model_name}-{timezone.now():%Y%m%d-%H%M%S}.csv"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
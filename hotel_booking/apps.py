@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ResturantConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'hotel_booking'
+
+    def ready(self):
+        from . import db_health, signals  # noqa: F401
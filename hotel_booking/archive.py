@@ -0,0 +1,167 @@
+"""
+Archival of old bookings out of the live ``Booking`` table.
+
+Availability checks, returning-customer lookups and status searches all scan
+``Booking``; finished bookings only make those scans longer. ``archive_bookings()``
+moves completed/cancelled bookings whose stay ended before a cutoff into
+``BookingArchive`` in batches, each batch in one transaction, with snapshots of
+their room, add-ons and room services. The reporting rollups also read the
+archive, so archiving doesn't change them.
+
+Read paths that must still find old bookings (status inquiries, profile
+history) use the helpers at the bottom, which fall back to the archive.
+"""
+import logging
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, reset_queries, transaction
+from django.utils import timezone
+
+from .models import Booking, BookingAddon, BookingArchive, RoomServiceRequest, addon_line_total
+from .reporting import suspend_rollups
+
+logger = logging.getLogger(__name__)
+
+ARCHIVABLE_STATUSES = ['completed', 'cancelled']
+DEFAULT_BATCH_SIZE = 1000
+
+
+def archive_cutoff(months, today=None):
+    """The date ``months`` (30-day) months before ``today``."""
+    today = today or timezone.localdate()
+    return today - timedelta(days=30 * months)
+
+
+def archivable(before, statuses=None):
+    """Bookings in ``statuses`` whose stay ended before ``before``."""
+    return Booking.objects.filter(check_out_date__lt=before, status__in=statuses or ARCHIVABLE_STATUSES)
+
+
+def _snapshots(queryset, booking_ids, **annotations):
+    """
+    Snapshot dicts of the related rows of ``booking_ids``, grouped by booking.
+
+    Read with values() rather than prefetch_related(): building a queryset
+    and model instance per related row costs more than the rest of a batch.
+    """
+    fields = [field.attname for field in queryset.model._meta.concrete_fields if field.name not in ('id', 'booking')]
+    grouped = {}
+    rows = queryset.filter(booking_id__in=booking_ids).annotate(**annotations).order_by('pk')
+    for row in rows.values('booking_id', *fields, *annotations):
+        grouped.setdefault(row.pop('booking_id'), []).append(row)
+    return grouped
+
+
+def to_archive(booking, addons=(), room_services=()):
+    """
+    Unsaved BookingArchive for ``booking`` (with its room selected).
+
+    ``addons`` and ``room_services`` are snapshot dicts of its related rows;
+    each add-on has its ``total`` price.
+    """
+    return BookingArchive(
+        original_id=booking.pk,
+        room_id=booking.room_id,
+        room_name=booking.room.name,
+        room_price=booking.room.price,
+        user_id=booking.user_id,
+        guest_name=booking.guest_name,
+        guest_email=booking.guest_email,
+        guest_phone=booking.guest_phone,
+        check_in_date=booking.check_in_date,
+        check_out_date=booking.check_out_date,
+        status=booking.status,
+        booking_id=booking.booking_id,
+        base_total=booking.get_total_price(),
+        addon_total=sum((row['total'] for row in addons), Decimal('0.00')),
+        addons_data=list(addons),
+        room_services_data=list(room_services),
+        created_at=booking.created_at,
+        updated_at=booking.updated_at,
+    )
+
+
+def archive_bookings(before, statuses=None, batch_size=DEFAULT_BATCH_SIZE, limit=None, progress=None):
+    """
+    Move archivable bookings (see ``archivable()``) into BookingArchive.
+
+    Args:
+        before (date): Archive stays that ended before this date.
+        statuses (list): Statuses to archive; default ARCHIVABLE_STATUSES.
+        batch_size (int): Bookings moved per transaction.
+        limit (int): Stop after this many bookings.
+        progress (callable): Called with the running total after each batch.
+
+    Returns:
+        int: Number of bookings archived.
+    """
+    queryset = archivable(before, statuses).order_by('pk')
+    moved = 0
+    last_pk = 0
+    started = time.perf_counter()
+    while limit is None or moved < limit:
+        size = batch_size if limit is None else min(batch_size, limit - moved)
+        # Continue after the last batch instead of rescanning the rows it skipped
+        batch = list(queryset.filter(pk__gt=last_pk).select_related('room')[:size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        pks = [booking.pk for booking in batch]
+        with transaction.atomic(), suspend_rollups():
+            addons = _snapshots(BookingAddon.objects, pks, total=addon_line_total())
+            services = _snapshots(RoomServiceRequest.objects, pks)
+            BookingArchive.objects.bulk_create([
+                to_archive(booking, addons.get(booking.pk, ()), services.get(booking.pk, ()))
+                for booking in batch
+            ])
+            # Cascades to the add-ons and room services
+            Booking.objects.filter(pk__in=pks).delete()
+        moved += len(batch)
+        if not connection.force_debug_cursor:
+            # Don't let DEBUG keep the SQL of every batch in memory
+            reset_queries()
+        if progress:
+            progress(moved)
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Archived {moved} bookings that ended before {before} in {elapsed:.1f}s")
+    return moved
+
+
+# Read paths --------------------------------------------------------------
+
+def find_archived_booking(booking_id):
+    """Most recently archived booking with this ``booking_id``, or None."""
+    if not booking_id:
+        return None
+    return BookingArchive.objects.filter(booking_id=booking_id).order_by('-archived_at', '-pk').first()
+
+
+def get_archived_booking(pk):
+    """Archived booking by its BookingArchive primary key, or None."""
+    return BookingArchive.objects.filter(pk=pk).first()
+
+
+def search_bookings(query, limit=None):
+    """
+    Live bookings matching the Q object ``query``, then archived ones, newest first.
+
+    The same field names exist on both tables, so any Booking filter on
+    guest/stay fields works. Archived results have ``is_archived = True``.
+    """
+    live = list(Booking.objects.filter(query).select_related('room').order_by('-created_at')[:limit])
+    if limit is not None and len(live) >= limit:
+        return live
+    archived = BookingArchive.objects.filter(query).order_by('-created_at')
+    if limit is not None:
+        archived = archived[:limit - len(live)]
+    return live + list(archived)
+
+
+def bookings_for_user(user):
+    """Every live and archived booking of ``user``, newest first."""
+    live = Booking.objects.filter(user=user).select_related('room').order_by('-created_at')
+    archived = BookingArchive.objects.filter(user=user).order_by('-created_at')
+    return sorted([*live, *archived], key=lambda booking: booking.created_at, reverse=True)
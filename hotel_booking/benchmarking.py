@@ -0,0 +1,160 @@
+"""
+Shared helpers for the ``benchmark_*`` management commands.
+
+Benchmarks always run against a throwaway test database so they never touch
+the development ``db.sqlite3`` file.
+"""
+import json
+import math
+import os
+import subprocess
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+# Room catalog used to seed benchmark databases (name, price per night, capacity)
+DEFAULT_ROOMS = [
+    ('Standard Room', Decimal('150.00'), 2),
+    ('Deluxe Room', Decimal('250.00'), 2),
+    ('Executive Suite', Decimal('450.00'), 4),
+]
+
+
+@contextmanager
+def isolated_database(verbosity=0):
+    """
+    Create a fresh test database for the duration of a benchmark run.
+
+    The Django test environment is set up too, so outgoing email goes to the
+    in-memory backend and the test client's host is allowed.
+    """
+    old_name = connection.settings_dict['NAME']
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield connection.settings_dict['NAME']
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def seed_rooms():
+    """Create the default room catalog and return the Room objects."""
+    from .models import Room
+
+    return [
+        Room.objects.create(name=name, description=f"{name} used for benchmarking", price=price, capacity=capacity)
+        for name, price, capacity in DEFAULT_ROOMS
+    ]
+
+
+def seed_bookings(rooms, guest_name, count, prefix='BM'):
+    """Create ``count`` upcoming bookings for one guest spread across ``rooms``."""
+    from .models import Booking
+
+    today = timezone.now().date()
+    bookings = []
+    for i in range(count):
+        check_in = today + timedelta(days=7 + i * 3)
+        bookings.append(Booking.objects.create(
+            room=rooms[i % len(rooms)],
+            guest_name=guest_name,
+            guest_email=f"{guest_name.lower().replace(' ', '.')}@example.com",
+            guest_phone=f"0123456{i:04d}",
+            check_in_date=check_in,
+            check_out_date=check_in + timedelta(days=2),
+            status='approved',
+            booking_id=f"{prefix}-{10000 + i}",
+        ))
+    return bookings
+
+
+def bulk_seed_bookings(rooms, count, batch_size=5000, prefix='HX'):
+    """
+    Insert ``count`` historical bookings, one per minute going back from now.
+
+    Uses bulk_create, so Booking.save() date validation is skipped and past
+    stays are allowed; statuses cycle through Booking.STATUS_CHOICES.
+    """
+    from .models import Booking
+
+    statuses = [status for status, _ in Booking.STATUS_CHOICES]
+    created_field = Booking._meta.get_field('created_at')
+    now = timezone.now()
+    # Keep the spread-out created_at values instead of auto_now_add's "now"
+    created_field.auto_now_add = False
+    try:
+        for start in range(0, count, batch_size):
+            batch = []
+            for i in range(start, min(start + batch_size, count)):
+                created_at = now - timedelta(minutes=i)
+                check_in = created_at.date() + timedelta(days=14)
+                batch.append(Booking(
+                    room=rooms[i % len(rooms)],
+                    guest_name=f"Guest {i}",
+                    guest_email=f"guest{i}@example.com",
+                    check_in_date=check_in,
+                    check_out_date=check_in + timedelta(days=1 + i % 4),
+                    status=statuses[i % len(statuses)],
+                    booking_id=f"{prefix}-{i:07d}",
+                    created_at=created_at,
+                ))
+            Booking.objects.bulk_create(batch)
+    finally:
+        created_field.auto_now_add = True
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples_ms):
+    """Summarize latency samples (milliseconds) as count/mean/p50/p90/p95/p99/max."""
+    if not samples_ms:
+        return {'count': 0}
+    return {
+        'count': len(samples_ms),
+        'mean_ms': round(sum(samples_ms) / len(samples_ms), 3),
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p90_ms': round(percentile(samples_ms, 90), 3),
+        'p95_ms': round(percentile(samples_ms, 95), 3),
+        'p99_ms': round(percentile(samples_ms, 99), 3),
+        'max_ms': round(max(samples_ms), 3),
+    }
+
+
+def git_revision():
+    """Short git revision of the working tree, or None outside a checkout."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path, name, results):
+    """Write benchmark results as JSON tagged with the git revision and timestamp."""
+    payload = {
+        'benchmark': name,
+        'revision': git_revision(),
+        'recorded_at': timezone.now().isoformat(),
+        'results': results,
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2, default=str)
+    return payload
@@ -0,0 +1,483 @@
+"""
+Streaming bulk import and export of bookings as CSV or JSON lines.
+
+Used by the ``import_bookings`` and ``export_bookings`` management commands.
+Rows are read and written one at a time and imported in batches, so memory
+stays flat however large the file is.
+
+Each import batch costs a fixed number of queries: existing bookings by
+``booking_id``, users by username, one overlap query for the batch's rooms
+and dates, then ``bulk_create``/``bulk_update`` and the guest profile upsert
+(see ``guest_profiles.record_guests()``). Rows are validated like
+``Booking.clean()`` (plus field checks), and overlaps with existing bookings
+or earlier rows are checked set-wise per batch against an in-memory index of
+the stays of the batch's rooms. Bulk writes bypass ``Booking.save()`` and the
+model signals, so callers refresh the reporting rollups afterwards (see
+``ImportResult.stay_range``).
+"""
+import bisect
+import csv
+import json
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connection, reset_queries, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .guest_profiles import record_guests
+from .models import Booking
+from .room_catalog import get_room_catalog, normalize_room_name
+
+FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_CHUNK_SIZE = 2000
+# Errors kept on ImportResult; the rest are only counted (pass on_error to see all)
+MAX_KEPT_ERRORS = 100
+
+# Column order of exports. Imports read the same columns; room_id wins over
+# room_name, and created_at is informational only.
+EXPORT_FIELDS = [
+    'booking_id', 'room_id', 'room_name', 'guest_name', 'guest_email', 'guest_phone',
+    'check_in_date', 'check_out_date', 'status', 'username', 'created_at',
+]
+# Fields written by bulk_update when a row's booking_id already exists
+UPDATE_FIELDS = [
+    'room', 'user', 'guest_name', 'guest_email', 'guest_phone',
+    'check_in_date', 'check_out_date', 'status', 'updated_at',
+]
+
+
+def detect_format(path, fmt=None):
+    """``fmt`` if given, otherwise 'jsonl' for .jsonl/.ndjson paths and 'csv' for anything else."""
+    if fmt:
+        return fmt
+    return 'jsonl' if str(path).lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(stream, fmt):
+    """
+    Yield ``(line_number, row, error)`` for each record of a CSV or JSON lines stream.
+
+    ``row`` is a dict of column values, or None when the record could not be
+    parsed, in which case ``error`` says why.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Expected a JSON object"
+            continue
+        yield line_number, row, None
+
+
+def export_rows(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield one dict per booking in ``queryset`` with the EXPORT_FIELDS columns."""
+    columns = [
+        'booking_id', 'room_id', 'room__name', 'guest_name', 'guest_email', 'guest_phone',
+        'check_in_date', 'check_out_date', 'status', 'user__username', 'created_at',
+    ]
+    rows = queryset.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+    for values in rows:
+        yield dict(zip(EXPORT_FIELDS, values))
+
+
+def write_rows(stream, fmt, rows):
+    """Write dicts of EXPORT_FIELDS to ``stream``; returns the number of rows written."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({key: _text(value) for key, value in row.items()})
+            count += 1
+        return count
+
+    for row in rows:
+        stream.write(json.dumps({key: _text(value) or None for key, value in row.items()}) + '\n')
+        count += 1
+    return count
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+class RowError:
+    """A rejected input row."""
+
+    def __init__(self, line, booking_id, message):
+        self.line = line
+        self.booking_id = booking_id
+        self.message = message
+
+    def __str__(self):
+        return f"line {self.line} ({self.booking_id or 'no booking_id'}): {self.message}"
+
+
+class ImportResult:
+    """Counters of one import run."""
+
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        # Earliest check-in and latest check-out of every stay touched, old or new
+        self.first_night = None
+        self.last_checkout = None
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def stay_range(self):
+        """``(start, end)`` nights whose rollups the import may have changed, or None."""
+        if self.first_night is None:
+            return None
+        return self.first_night, self.last_checkout
+
+    def touch(self, check_in, check_out):
+        if self.first_night is None or check_in < self.first_night:
+            self.first_night = check_in
+        if self.last_checkout is None or check_out > self.last_checkout:
+            self.last_checkout = check_out
+
+
+class _RoomStays:
+    """Stays of one room sorted by check-in, for overlap lookups."""
+
+    def __init__(self):
+        self.starts = []
+        self.stays = []
+        self.longest = timedelta(0)
+
+    def add(self, check_in, check_out, ref):
+        index = bisect.bisect_right(self.starts, check_in)
+        self.starts.insert(index, check_in)
+        self.stays.insert(index, (check_in, check_out, ref))
+        self.longest = max(self.longest, check_out - check_in)
+
+    def remove(self, pk):
+        for index, (_, _, ref) in enumerate(self.stays):
+            if ref[0] == pk:
+                del self.starts[index]
+                del self.stays[index]
+                return
+
+    def conflict(self, check_in, check_out, ignore=None):
+        """A stay overlapping ``[check_in, check_out)`` other than booking ``ignore``, or None."""
+        index = bisect.bisect_left(self.starts, check_out) - 1
+        # No stay starting on or before check_in - longest can reach check_in
+        while index >= 0 and self.starts[index] > check_in - self.longest:
+            start, end, ref = self.stays[index]
+            if end > check_in and (ignore is None or ref[0] != ignore):
+                return start, end, ref
+            index -= 1
+        return None
+
+
+class _Candidate:
+    def __init__(self, line, booking, username):
+        self.line = line
+        self.booking = booking
+        self.username = username
+        self.existing = None
+
+
+class BookingImporter:
+    """
+    Validate and write rows of booking data in batches.
+
+    Args:
+        batch_size (int): Rows validated and written per transaction.
+        update_existing (bool): Update bookings whose booking_id already exists
+            instead of rejecting those rows.
+        allow_past (bool): Accept check-in dates in the past (historical data).
+        dry_run (bool): Validate everything, then roll back.
+        on_error (callable): Called with every RowError.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, update_existing=True, allow_past=False,
+                 dry_run=False, on_error=None):
+        self.batch_size = max(1, int(batch_size))
+        self.update_existing = update_existing
+        self.allow_past = allow_past
+        self.dry_run = dry_run
+        self.on_error = on_error
+        self.catalog = get_room_catalog()
+        self._rooms_by_name = {}
+        for room in self.catalog.all():
+            self._rooms_by_name.setdefault(normalize_room_name(room.name), room)
+
+    def run(self, records, progress=None):
+        """
+        Import ``records`` (``(line, row, error)`` tuples from ``read_rows``).
+
+        Args:
+            progress (callable): Called with the ImportResult after every batch.
+
+        Returns:
+            ImportResult: Counts, kept errors and the touched stay range.
+        """
+        result = ImportResult()
+        if not self.dry_run:
+            self._import(records, result, progress)
+            return result
+
+        # One transaction around every batch, rolled back at the end
+        try:
+            with transaction.atomic():
+                self._import(records, result, progress)
+                raise _DryRun
+        except _DryRun:
+            pass
+        return result
+
+    def _import(self, records, result, progress):
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                self._finish_batch(batch, result, progress)
+                batch = []
+        if batch:
+            self._finish_batch(batch, result, progress)
+
+    def _finish_batch(self, batch, result, progress):
+        self._import_batch(batch, result)
+        if not connection.force_debug_cursor:
+            # With DEBUG on Django keeps the SQL of every query (bulk inserts
+            # included) until the next request; a long import has none.
+            reset_queries()
+        if progress:
+            progress(result)
+
+    def _import_batch(self, records, result):
+        result.processed += len(records)
+        candidates = []
+        seen_ids = set()
+        for line, row, error in records:
+            booking_id = _clean(row.get('booking_id')) if row else None
+            if error is None and booking_id in seen_ids:
+                error = "booking_id appears more than once in this batch"
+            if error is None:
+                try:
+                    candidates.append(self._parse(line, row, booking_id))
+                except ValidationError as e:
+                    error = '; '.join(e.messages)
+            if error:
+                self._reject(result, line, booking_id, error)
+            elif booking_id:
+                seen_ids.add(booking_id)
+
+        candidates = self._link_existing(candidates, result)
+        candidates = self._link_users(candidates, result)
+        candidates = self._check_overlaps(candidates, result)
+
+        now = timezone.now()
+        new, changed = [], []
+        for candidate in candidates:
+            booking = candidate.booking
+            result.touch(booking.check_in_date, booking.check_out_date)
+            if candidate.existing is None:
+                new.append(booking)
+            else:
+                result.touch(candidate.existing[1], candidate.existing[2])
+                booking.pk = candidate.existing[0]
+                booking.updated_at = now
+                changed.append(booking)
+
+        with transaction.atomic():
+            Booking.objects.bulk_create(new, batch_size=self.batch_size)
+            Booking.objects.bulk_update(changed, UPDATE_FIELDS, batch_size=self.batch_size)
+            # The post_save handler that maintains these doesn't run for bulk writes either
+            record_guests(candidate.booking for candidate in candidates)
+        result.created += len(new)
+        result.updated += len(changed)
+
+    def _parse(self, line, row, booking_id):
+        """Build an unsaved Booking from ``row``; raises ValidationError."""
+        errors = []
+        if booking_id and len(booking_id) > 20:
+            errors.append("booking_id is longer than 20 characters")
+
+        room = None
+        room_id = _clean(row.get('room_id'))
+        room_name = _clean(row.get('room_name'))
+        if room_id:
+            room = self.catalog.get(int(room_id)) if room_id.isdigit() else None
+            if room is None:
+                errors.append(f"Unknown room_id {room_id!r}")
+        elif room_name:
+            room = self._rooms_by_name.get(normalize_room_name(room_name))
+            if room is None:
+                errors.append(f"Unknown room_name {room_name!r}")
+        else:
+            errors.append("room_id or room_name is required")
+
+        guest_name = _clean(row.get('guest_name'))
+        if not guest_name:
+            errors.append("guest_name is required")
+        elif len(guest_name) > 100:
+            errors.append("guest_name is longer than 100 characters")
+
+        guest_email = _clean(row.get('guest_email'))
+        try:
+            validate_email(guest_email)
+        except ValidationError:
+            errors.append(f"Invalid guest_email {guest_email!r}")
+
+        guest_phone = _clean(row.get('guest_phone')) or ''
+        if len(guest_phone) > 20:
+            errors.append("guest_phone is longer than 20 characters")
+
+        status = _clean(row.get('status')) or 'pending'
+        if status not in dict(Booking.STATUS_CHOICES):
+            errors.append(f"Invalid status {status!r}")
+
+        check_in = _date(row.get('check_in_date'), 'check_in_date', errors)
+        check_out = _date(row.get('check_out_date'), 'check_out_date', errors)
+        if errors:
+            raise ValidationError(errors)
+
+        booking = Booking(
+            booking_id=booking_id, room=room, guest_name=guest_name, guest_email=guest_email,
+            guest_phone=guest_phone, check_in_date=check_in, check_out_date=check_out, status=status,
+        )
+        if self.allow_past:
+            if check_out <= check_in:
+                raise ValidationError("Check-out date must be after check-in date")
+        else:
+            booking.clean()
+        return _Candidate(line, booking, _clean(row.get('username')))
+
+    def _link_existing(self, candidates, result):
+        booking_ids = [c.booking.booking_id for c in candidates if c.booking.booking_id]
+        if not booking_ids:
+            return candidates
+        existing = {
+            booking_id: (pk, check_in, check_out)
+            for booking_id, pk, check_in, check_out in Booking.objects.filter(booking_id__in=booking_ids)
+            .values_list('booking_id', 'pk', 'check_in_date', 'check_out_date')
+        }
+        kept = []
+        for candidate in candidates:
+            candidate.existing = existing.get(candidate.booking.booking_id)
+            if candidate.existing and not self.update_existing:
+                self._reject(result, candidate.line, candidate.booking.booking_id, "booking_id already exists")
+                continue
+            kept.append(candidate)
+        return kept
+
+    def _link_users(self, candidates, result):
+        usernames = {c.username for c in candidates if c.username}
+        if not usernames:
+            return candidates
+        users = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+        kept = []
+        for candidate in candidates:
+            if candidate.username:
+                if candidate.username not in users:
+                    self._reject(result, candidate.line, candidate.booking.booking_id,
+                                 f"Unknown username {candidate.username!r}")
+                    continue
+                candidate.booking.user_id = users[candidate.username]
+            kept.append(candidate)
+        return kept
+
+    def _check_overlaps(self, candidates, result):
+        """Reject rows whose room is already held for any of their nights, in one query per batch."""
+        blocking = [c for c in candidates if c.booking.status in Booking.BLOCKING_STATUSES]
+        if not blocking:
+            return candidates
+
+        stays = {}
+        located = {}
+        held = Booking.objects.overlapping(
+            min(c.booking.check_in_date for c in blocking),
+            max(c.booking.check_out_date for c in blocking),
+        ).filter(
+            room_id__in={c.booking.room_id for c in blocking},
+            status__in=Booking.BLOCKING_STATUSES,
+        ).values_list('pk', 'booking_id', 'room_id', 'check_in_date', 'check_out_date')
+        for pk, booking_id, room_id, check_in, check_out in held.iterator(chunk_size=DEFAULT_CHUNK_SIZE):
+            stays.setdefault(room_id, _RoomStays()).add(check_in, check_out, (pk, booking_id or f"#{pk}"))
+            located[pk] = room_id
+
+        kept = []
+        for candidate in candidates:
+            booking = candidate.booking
+            pk = candidate.existing[0] if candidate.existing else None
+            if booking.status in Booking.BLOCKING_STATUSES:
+                room_stays = stays.setdefault(booking.room_id, _RoomStays())
+                conflict = room_stays.conflict(booking.check_in_date, booking.check_out_date, ignore=pk)
+                if conflict:
+                    start, end, (_, label) = conflict
+                    self._reject(result, candidate.line, booking.booking_id,
+                                 f"{booking.room.name} is already booked from {start} to {end} ({label})")
+                    continue
+            if pk in located:
+                stays[located.pop(pk)].remove(pk)
+            if booking.status in Booking.BLOCKING_STATUSES:
+                label = booking.booking_id or f"line {candidate.line}"
+                stays[booking.room_id].add(booking.check_in_date, booking.check_out_date, (pk, label))
+                if pk:
+                    located[pk] = booking.room_id
+            kept.append(candidate)
+        return kept
+
+    def _reject(self, result, line, booking_id, message):
+        error = RowError(line, booking_id, message)
+        result.failed += 1
+        if len(result.errors) < MAX_KEPT_ERRORS:
+            result.errors.append(error)
+        if self.on_error:
+            self.on_error(error)
+
+
+class _DryRun(Exception):
+    pass
+
+
+def _clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _date(value, field, errors):
+    value = _clean(value)
+    try:
+        day = parse_date(value or '')
+    except ValueError:
+        day = None
+    if day is None:
+        errors.append(f"{field} must be a date (YYYY-MM-DD), got {value!r}")
+    return day
@@ -0,0 +1,161 @@
+"""
+Request-scoped identity map for Booking and Room objects.
+
+A chat turn looks the same booking up several times: the DialogManager
+handlers find it by reference, store a flattened copy in ``user_data``, and
+then reload it by primary key, and the view post-processing in
+``process_chat_message`` fetches it again. Within a ``booking_cache()`` block
+every booking is loaded at most once (with its room, add-ons and room
+service requests) and the same instance is handed to every caller, so
+changes made by one handler are visible to the next.
+
+Outside a ``booking_cache()`` block the helpers fall back to plain queries.
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from hotel_booking.db_health import retry_read
+from hotel_booking.metrics import cache_lookup
+from hotel_booking.room_catalog import get_room_catalog
+
+logger = logging.getLogger(__name__)
+
+# Relations prefetched with every booking
+PREFETCH_RELATIONS = ('addons', 'room_services')
+
+_MISSING = object()
+_current_cache = ContextVar('chat_booking_cache', default=None)
+
+
+class BookingCache:
+    """Identity map of the bookings and rooms loaded during one chat turn."""
+
+    def __init__(self):
+        self._bookings = {}
+        self._by_reference = {}
+        self._by_email = {}
+        self._rooms = {}
+        self._rooms_by_name = {}
+
+    def _booking_queryset(self):
+        # Its ``db`` is the alias the router picks (the replica inside
+        # replica_reads()), which retry_read() must reconnect
+        from hotel_booking.models import Booking
+
+        return Booking.objects.select_related('room').prefetch_related(*PREFETCH_RELATIONS)
+
+    def remember(self, booking):
+        """Add a booking (e.g. one created during the turn) and return the cached instance."""
+        if booking is None:
+            return None
+        booking = self._bookings.setdefault(booking.pk, booking)
+        if booking.booking_id:
+            self._by_reference[booking.booking_id] = booking
+        if booking.room_id and 'room' in booking._state.fields_cache:
+            self._rooms.setdefault(booking.room_id, booking.room)
+        return booking
+
+    def get_booking(self, pk):
+        """Booking by primary key; raises Booking.DoesNotExist like ``objects.get``."""
+        booking = self._bookings.get(pk)
+        cache_lookup('booking', booking is not None)
+        if booking is None:
+            queryset = self._booking_queryset()
+            booking = self.remember(retry_read(queryset.get, pk=pk, using=queryset.db))
+        return booking
+
+    def find_booking(self, booking_id):
+        """Booking by its public reference (e.g. ``BK-12345``), or None."""
+        booking = self._by_reference.get(booking_id, _MISSING)
+        cache_lookup('booking', booking is not _MISSING)
+        if booking is _MISSING:
+            queryset = self._booking_queryset().filter(booking_id=booking_id)
+            booking = self.remember(retry_read(queryset.first, using=queryset.db))
+            self._by_reference[booking_id] = booking
+        return booking
+
+    def find_booking_by_email(self, email):
+        """First booking made with ``email``, or None."""
+        booking = self._by_email.get(email, _MISSING)
+        cache_lookup('booking', booking is not _MISSING)
+        if booking is _MISSING:
+            queryset = self._booking_queryset().filter(guest_email=email)
+            booking = self.remember(retry_read(queryset.first, using=queryset.db))
+            self._by_email[email] = booking
+        return booking
+
+    def get_room(self, pk):
+        """Room by primary key; raises Room.DoesNotExist like ``objects.get``."""
+        from hotel_booking.models import Room
+
+        room = self._rooms.get(pk)
+        if room is None:
+            room = get_room_catalog().get(pk)
+            if room is None:
+                raise Room.DoesNotExist(f"Room matching pk={pk} does not exist.")
+            self._rooms[pk] = room
+        return room
+
+    def find_room(self, name):
+        """Room of the type mentioned in ``name`` (see room_resolver.py), or None."""
+        room = self._rooms_by_name.get(name, _MISSING)
+        if room is _MISSING:
+            room = get_room_catalog().resolve(name)
+            if room is not None:
+                room = self._rooms.setdefault(room.pk, room)
+            self._rooms_by_name[name] = room
+        return room
+
+
+@contextmanager
+def booking_cache():
+    """
+    Share one BookingCache for the duration of the block.
+
+    Nested blocks reuse the outer cache, so ``process_chat_message`` and the
+    ``DialogManager.process`` call inside it see the same objects.
+    """
+    cache = _current_cache.get()
+    if cache is not None:
+        yield cache
+        return
+
+    token = _current_cache.set(BookingCache())
+    try:
+        yield _current_cache.get()
+    finally:
+        _current_cache.reset(token)
+
+
+def current_booking_cache():
+    """The active BookingCache, or a throwaway one when no turn is in progress."""
+    return _current_cache.get() or BookingCache()
+
+
+def get_booking(pk):
+    return current_booking_cache().get_booking(pk)
+
+
+def find_booking(booking_id):
+    return current_booking_cache().find_booking(booking_id)
+
+
+def find_booking_by_email(email):
+    return current_booking_cache().find_booking_by_email(email)
+
+
+def find_room(name):
+    return current_booking_cache().find_room(name)
+
+
+def remember_booking(booking):
+    return current_booking_cache().remember(booking)
+
+
+def related_changed(booking, *relations):
+    """Drop prefetched ``relations`` on ``booking`` after adding to them, so they reload."""
+    prefetched = getattr(booking, '_prefetched_objects_cache', None)
+    if prefetched:
+        for relation in relations or PREFETCH_RELATIONS:
+            prefetched.pop(relation, None)
@@ -0,0 +1,99 @@
+import json
+import logging
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .dialog_manager import DialogManager
+from .views import process_chat_message, resolve_chat_user
+
+logger = logging.getLogger(__name__)
+
+# Key under which the conversation is kept in the Django session between connections
+SESSION_CONVERSATION_KEY = 'chatbot_conversation'
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    """
+    WebSocket transport for the chatbot.
+
+    The conversation state and DialogManager live on the connection, so the
+    client only sends ``{"message": "..."}`` per turn instead of resending the
+    whole session. The state is restored from the Django session on connect
+    and written back on disconnect, if the visitor already has a session. Idle connections hold no thread; turns run
+    through the same ``process_chat_message`` path as the HTTP API.
+    """
+
+    async def connect(self):
+        self.dialog_manager = None
+        self.session_data = await self._load_conversation()
+        await self.accept()
+
+    async def receive_json(self, content, **kwargs):
+        user_message = str(content.get('message', '')).strip()
+        if not user_message:
+            await self.send_json({
+                'error': 'Bad request',
+                'message': 'Please provide a message to continue our conversation.'
+            })
+            return
+
+        try:
+            response_data = await self._process_turn(user_message)
+        except Exception as e:
+            logger.error("Unhandled exception in ChatConsumer: %s", e)
+            await self.send_json({
+                'message': 'Sorry, I am temporarily unable to process your request. Please try again.'
+            })
+            return
+
+        self.session_data = response_data['session']
+        await self.send_json({
+            'message': response_data['message'],
+            'state': self.session_data.get('state'),
+            'delayed_messages': response_data.get('delayed_messages', [])
+        })
+
+    async def disconnect(self, code):
+        await self._save_conversation()
+
+    @database_sync_to_async
+    def _process_turn(self, user_message):
+        if self.dialog_manager is None:
+            self.dialog_manager = DialogManager()
+        # Delayed messages belong to a single turn
+        self.dialog_manager.delayed_messages = []
+
+        request_user = self.scope.get('user')
+        user = None
+        booking_user = None
+        if request_user is not None:
+            user = resolve_chat_user(request_user, None, self.session_data)
+            booking_user = request_user if request_user.is_authenticated else None
+
+        return process_chat_message(
+            user_message, self.session_data,
+            user=user, booking_user=booking_user, dialog_manager=self.dialog_manager
+        )
+
+    @database_sync_to_async
+    def _load_conversation(self):
+        session = self.scope.get('session')
+        if session is None:
+            return {}
+        return dict(session.get(SESSION_CONVERSATION_KEY, {}))
+
+    @database_sync_to_async
+    def _save_conversation(self):
+        session = self.scope.get('session')
+        # Only sessions the HTTP side created: a new key could never reach the
+        # browser over this socket, so the row would only pile up
+        if session is None or session.session_key is None or not self.session_data:
+            return
+        try:
+            # Round-trip through DjangoJSONEncoder so dates survive the session serializer
+            session[SESSION_CONVERSATION_KEY] = json.loads(json.dumps(self.session_data, cls=DjangoJSONEncoder))
+            session.save()
+        except Exception as e:
+            logger.error("Failed to persist chatbot conversation: %s", e)
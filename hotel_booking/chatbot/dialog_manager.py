@@ -24,9 +24,42 @@ import random
 from typing import Dict, Optional, Tuple, List
 from langdetect import detect
 
-# 设置日志
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+from hotel_booking.db_routing import replica_reads
+from hotel_booking.metrics import model_inference_seconds
+from hotel_booking.request_timing import timed
+from hotel_booking.room_catalog import get_room_catalog
+
+from .booking_cache import (
+    booking_cache, find_booking, find_room, get_booking, related_changed, remember_booking
+)
+
+# 设置日志 (handlers come from settings.LOGGING)
 logger = logging.getLogger(__name__)
+# Per-turn trace lines; high volume, so sampled in production (see LOG_SAMPLING)
+turn_logger = logging.getLogger('hotel_booking.chatbot.turns')
+
+SENTIMENT_MODEL_NAME = "cardiffnlp/twitter-roberta-base-sentiment"
+
+# NLP models are loaded once per process and shared by every DialogManager,
+# so long-lived per-connection managers stay cheap.
+_spacy_models: Dict[str, Any] = {}
+_sentiment_model: Dict[str, Any] = {}
+
+
+def load_spacy_model(name: str = "en_core_web_sm"):
+    """Return the shared spaCy pipeline, loading it on first use."""
+    if name not in _spacy_models:
+        _spacy_models[name] = spacy.load(name)
+    return _spacy_models[name]
+
+
+def load_sentiment_model(device) -> Tuple[Any, Any]:
+    """Return the shared sentiment tokenizer and model, loading them on first use."""
+    if not _sentiment_model:
+        tokenizer = AutoTokenizer.from_pretrained(SENTIMENT_MODEL_NAME)
+        model = AutoModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL_NAME).to(device)
+        _sentiment_model.update(tokenizer=tokenizer, model=model)
+    return _sentiment_model['tokenizer'], _sentiment_model['model']
 
 class DialogManager:
     def __init__(self, intents_file: Optional[str] = None, qr_code_path: str = "/media/payment/QR Bank.jpeg"):
@@ -38,12 +71,12 @@ class DialogManager:
             qr_code_path (str): Path to the QR code image for payment.
         """
         try:
-            # Load spaCy English NLP model
-            self.nlp = spacy.load("en_core_web_sm")
+            # Load spaCy English NLP model (shared across instances)
+            self.nlp = load_spacy_model("en_core_web_sm")
 
             # Detect device
             self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-            logger.info(f"Using device: {self.device}")
+            logger.info("Using device: %s", self.device)
 
             # Initialize sentiment analysis model (lazy-loaded)
             self.tokenizer = None
@@ -101,9 +134,9 @@ class DialogManager:
                                     'zh': intent.get('responses', {}).get('zh', [])
                                 }
                             }
-                    logger.info(f"Loaded {len(self.intents)} intents from file")
+                    logger.info("Loaded %s intents from file", len(self.intents))
                 except Exception as e:
-                    logger.error(f"Failed to load intents file: {str(e)}")
+                    logger.error("Failed to load intents file: %s", e)
 
             # Initialize default responses if no file provided
             if not self.intents:
@@ -111,7 +144,7 @@ class DialogManager:
 
             logger.info("DialogManager initialized successfully")
         except Exception as e:
-            logger.error(f"Error initializing DialogManager: {str(e)}")
+            logger.error("Error initializing DialogManager: %s", e)
             raise
 
     def _initialize_default_responses(self) -> None:
@@ -202,6 +235,7 @@ class DialogManager:
             }
         }
 
+    @timed('sentiment')
     def analyze_sentiment(self, text: str) -> Tuple[str, float]:
         """
         Analyze the sentiment of the input text using a RoBERTa model.
@@ -214,14 +248,12 @@ class DialogManager:
         """
         try:
             if self.tokenizer is None or self.model is None:
-                self.tokenizer = AutoTokenizer.from_pretrained("cardiffnlp/twitter-roberta-base-sentiment")
-                self.model = AutoModelForSequenceClassification.from_pretrained("cardiffnlp/twitter-roberta-base-sentiment")
-                self.model = self.model.to(self.device)
+                self.tokenizer, self.model = load_sentiment_model(self.device)
 
             tokens = self.tokenizer(text, return_tensors='pt', truncation=True, padding=True)
             tokens = {k: v.to(self.device) for k, v in tokens.items()}
 
-            with torch.no_grad():
+            with torch.no_grad(), model_inference_seconds.time('sentiment'):
                 output = self.model(**tokens)
 
             scores = output.logits.detach().cpu().numpy()[0]
@@ -230,9 +262,10 @@ class DialogManager:
             confidence = probs.max()
             return sentiment, confidence
         except Exception as e:
-            logger.error(f"Error in sentiment analysis: {str(e)}")
+            logger.error("Error in sentiment analysis: %s", e)
             return "Neutral", 0.33
 
+    @timed('validation')
     def is_valid_input(self, text: str) -> Tuple[bool, str]:
         """
         Validate if the input is meaningful and not random/garbled content.
@@ -393,29 +426,31 @@ class DialogManager:
             return True, ""
 
         except Exception as e:
-            logger.error(f"Error validating input: {str(e)}")
+            logger.error("Error validating input: %s", e)
             # If validation fails, assume input is valid to avoid blocking legitimate users
             return True, ""
 
+    @timed('intent')
     def detect_intent(self, text: str) -> str:
         """Detect the intent of the user's input text."""
         try:
-            logger.info(f"Detecting intent for input: {text}")
+            logger.info("Detecting intent for input: %s", text)
 
             # First validate if the input is meaningful
             is_valid, reason = self.is_valid_input(text)
             if not is_valid:
-                logger.info(f"Invalid input detected: {reason}")
+                logger.info("Invalid input detected: %s", reason)
                 return 'invalid_input'
 
-            doc = self.nlp(text.lower())
+            with model_inference_seconds.time('spacy'):
+                doc = self.nlp(text.lower())
 
             # Pattern-based intent matching
             for intent_name, intent_data in self.intents.items():
                 patterns = intent_data.get('patterns', [])
                 for pattern in patterns:
                     if pattern.lower() in text.lower():
-                        logger.info(f"Pattern-based intent detected: {intent_name}")
+                        logger.info("Pattern-based intent detected: %s", intent_name)
                         return intent_name
 
             # Keyword-based intent detection
@@ -488,9 +523,10 @@ class DialogManager:
                     return 'off_topic'
                 return 'unknown'
         except Exception as e:
-            logger.error(f"Intent detection error: {str(e)}")
+            logger.error("Intent detection error: %s", e)
             return 'unknown'
 
+    @timed('dates')
     def extract_dates(self, text: str) -> Optional[Dict[str, str]]:
         """
         Extract check-in and check-out dates from text in various formats.
@@ -502,7 +538,7 @@ class DialogManager:
             Optional[Dict[str, str]]: Dictionary with 'check_in' and 'check_out' dates in YYYY-MM-DD format, or None if no valid dates found.
         """
         try:
-            logger.info(f"Extracting dates from: {text}")
+            logger.info("Extracting dates from: %s", text)
             today = datetime.now()
             dates = []
             text_lower = text.lower()
@@ -521,10 +557,10 @@ class DialogManager:
                         'check_in': check_in.strftime('%Y-%m-%d'),
                         'check_out': check_out.strftime('%Y-%m-%d')
                     }
-                    logger.info(f"Extracted single date: {result}")
+                    logger.info("Extracted single date: %s", result)
                     return result
                 except ValueError as e:
-                    logger.warning(f"Invalid single date format: {e}")
+                    logger.warning("Invalid single date format: %s", e)
                     return None
 
             # Month name to number mapping
@@ -540,10 +576,10 @@ class DialogManager:
             # Handle natural language expressions
             if 'tomorrow' in text_lower:
                 dates.append(today + timedelta(days=1))
-                logger.info(f"Extracted 'tomorrow' date: {dates[-1]}")
+                logger.info("Extracted 'tomorrow' date: %s", dates[-1])
             if 'today' in text_lower:
                 dates.append(today)
-                logger.info(f"Extracted 'today' date: {dates[-1]}")
+                logger.info("Extracted 'today' date: %s", dates[-1])
 
             # Handle "next Monday", "this Tuesday"
             for match in self.date_patterns[2].findall(text_lower):
@@ -555,7 +591,7 @@ class DialogManager:
                     days_to_add += 7
                 target_date = today + timedelta(days=days_to_add)
                 dates.append(target_date)
-                logger.info(f"Extracted '{prefix} {day_name}' date: {target_date}")
+                logger.info("Extracted '%s %s' date: %s", prefix, day_name, target_date)
 
             # Handle "May 12th, 2025"
             for match in self.date_patterns[4].findall(text_lower):
@@ -564,9 +600,9 @@ class DialogManager:
                     month_num = month_to_num[month_name.lower()]
                     date_obj = datetime(int(year), month_num, int(day))
                     dates.append(date_obj)
-                    logger.info(f"Extracted month-day-year date: {date_obj}")
+                    logger.info("Extracted month-day-year date: %s", date_obj)
                 except (ValueError, KeyError) as e:
-                    logger.warning(f"Invalid month-day-year date: {month_name} {day}, {year}: {str(e)}")
+                    logger.warning("Invalid month-day-year date: %s %s, %s: %s", month_name, day, year, e)
 
             # Handle "12th of May, 2025"
             for match in self.date_patterns[5].findall(text_lower):
@@ -575,9 +611,9 @@ class DialogManager:
                     month_num = month_to_num[month_name.lower()]
                     date_obj = datetime(int(year), month_num, int(day))
                     dates.append(date_obj)
-                    logger.info(f"Extracted day-month-year date: {date_obj}")
+                    logger.info("Extracted day-month-year date: %s", date_obj)
                 except (ValueError, KeyError) as e:
-                    logger.warning(f"Invalid day-month-year date: {day} of {month_name}, {year}: {str(e)}")
+                    logger.warning("Invalid day-month-year date: %s of %s, %s: %s", day, month_name, year, e)
 
             # Handle duration-based input (e.g., "3 nights from May 25th, 2025")
             for match in self.date_patterns[6].findall(text_lower):
@@ -588,9 +624,9 @@ class DialogManager:
                     check_out = check_in + timedelta(days=int(nights))
                     dates.append(check_in)
                     dates.append(check_out)
-                    logger.info(f"Extracted duration-based date: check-in {check_in}, check-out {check_out}")
+                    logger.info("Extracted duration-based date: check-in %s, check-out %s", check_in, check_out)
                 except (ValueError, KeyError) as e:
-                    logger.warning(f"Invalid duration-based date: {nights} nights from {month_name} {day}, {year}: {str(e)}")
+                    logger.warning("Invalid duration-based date: %s nights from %s %s, %s: %s", nights, month_name, day, year, e)
 
             # Handle "Month Day to Month Day" format (e.g., "June 10 to June 12")
             for match in self.date_patterns[7].findall(text_lower):
@@ -612,9 +648,9 @@ class DialogManager:
 
                     dates.append(check_in)
                     dates.append(check_out)
-                    logger.info(f"Extracted month-to-month date: check-in {check_in}, check-out {check_out}")
+                    logger.info("Extracted month-to-month date: check-in %s, check-out %s", check_in, check_out)
                 except (ValueError, KeyError) as e:
-                    logger.warning(f"Invalid month-to-month date: {start_month} {start_day} to {end_month} {end_day}: {str(e)}")
+                    logger.warning("Invalid month-to-month date: %s %s to %s %s: %s", start_month, start_day, end_month, end_day, e)
 
             # Handle standard date formats
             for match in self.date_patterns[0].findall(text):
@@ -622,18 +658,18 @@ class DialogManager:
                 try:
                     date_obj = datetime(int(year), int(month), int(day))
                     dates.append(date_obj)
-                    logger.info(f"Extracted DD/MM/YYYY date: {date_obj}")
+                    logger.info("Extracted DD/MM/YYYY date: %s", date_obj)
                 except ValueError as e:
-                    logger.warning(f"Invalid DD/MM/YYYY date: {match}: {str(e)}")
+                    logger.warning("Invalid DD/MM/YYYY date: %s: %s", match, e)
 
             for match in self.date_patterns[1].findall(text):
                 year, month, day = match
                 try:
                     date_obj = datetime(int(year), int(month), int(day))
                     dates.append(date_obj)
-                    logger.info(f"Extracted YYYY/MM/DD date: {date_obj}")
+                    logger.info("Extracted YYYY/MM/DD date: %s", date_obj)
                 except ValueError as e:
-                    logger.warning(f"Invalid YYYY/MM/DD date: {match}: {str(e)}")
+                    logger.warning("Invalid YYYY/MM/DD date: %s: %s", match, e)
 
             if not dates:
                 logger.warning("No dates found")
@@ -652,7 +688,7 @@ class DialogManager:
                     'check_in': check_in.strftime('%Y-%m-%d'),
                     'check_out': check_out.strftime('%Y-%m-%d')
                 }
-                logger.info(f"Single date result: {result}")
+                logger.info("Single date result: %s", result)
                 return result
 
             check_in = valid_dates[0]
@@ -665,11 +701,11 @@ class DialogManager:
                 'check_in': check_in.strftime('%Y-%m-%d'),
                 'check_out': check_out.strftime('%Y-%m-%d')
             }
-            logger.info(f"Multiple date result: {result}")
+            logger.info("Multiple date result: %s", result)
             return result
 
         except Exception as e:
-            logger.error(f"Date extraction error: {str(e)}")
+            logger.error("Date extraction error: %s", e)
             return None
 
     def extract_booking_info(self, message: str, current_info: Optional[Dict] = None) -> Dict:
@@ -681,7 +717,7 @@ class DialogManager:
         # Handle standalone email
         if self.single_email_pattern.match(message_clean):
             info['email'] = message_clean
-            logger.info(f"Extracted standalone email: {info['email']}")
+            turn_logger.debug("Extracted standalone email: %s", info['email'])
             return info
 
         # Handle standalone phone (Malaysian + International patterns)
@@ -702,7 +738,7 @@ class DialogManager:
             phone_match = re.match(pattern, message_clean)
             if phone_match:
                 info['phone'] = phone_match.group(1).strip()
-                logger.info(f"Extracted standalone phone: {info['phone']}")
+                turn_logger.debug("Extracted standalone phone: %s", info['phone'])
                 return info
 
         # Enhanced name extraction patterns
@@ -722,13 +758,13 @@ class DialogManager:
                     # Validate name (no numbers, reasonable length)
                     if re.match(r'^[A-Za-z\s]{2,30}$', potential_name) and not any(word in potential_name.lower() for word in ['email', 'phone', 'room', 'book', 'hotel']):
                         info['guest_name'] = potential_name
-                        logger.info(f"Extracted name: {info['guest_name']}")
+                        logger.info("Extracted name: %s", info['guest_name'])
                         break
 
             # If no pattern matched and it looks like a simple name
             if 'guest_name' not in info and re.match(r'^[A-Za-z\s]{2,30}$', message_clean):
                 info['guest_name'] = message_clean
-                logger.info(f"Using entire message as name: {info['guest_name']}")
+                logger.info("Using entire message as name: %s", info['guest_name'])
 
         # Extract email with improved pattern
         email_patterns = [
@@ -740,7 +776,7 @@ class DialogManager:
             email_match = re.search(pattern, message, re.IGNORECASE)
             if email_match:
                 info['email'] = email_match.group(1)
-                logger.info(f"Extracted email: {info['email']}")
+                turn_logger.debug("Extracted email: %s", info['email'])
                 break
 
         # Extract phone with improved patterns (Malaysian + International)
@@ -761,7 +797,7 @@ class DialogManager:
             phone_match = re.search(pattern, message, re.IGNORECASE)
             if phone_match:
                 info['phone'] = phone_match.group(1).strip()
-                logger.info(f"Extracted phone: {info['phone']}")
+                turn_logger.debug("Extracted phone: %s", info['phone'])
                 break
 
         # Extract dates
@@ -783,7 +819,7 @@ class DialogManager:
         for pattern, room_type in room_type_patterns:
             if re.search(pattern, message, re.IGNORECASE):
                 info['room_type'] = room_type
-                logger.info(f"Extracted room type: {info['room_type']}")
+                logger.info("Extracted room type: %s", info['room_type'])
                 break
 
         return info
@@ -913,11 +949,11 @@ Please let me know which room type you'd like!"""
                         actual_booking_id = self.create_booking_record(self.user_data)
                         if actual_booking_id:
                             self.user_data['booking_id'] = actual_booking_id
-                            logger.info(f"Booking record created successfully: {actual_booking_id}")
+                            logger.info("Booking record created successfully: %s", actual_booking_id)
                         else:
                             logger.warning("Failed to create booking record, using generated ID")
                     except Exception as e:
-                        logger.error(f"Error creating booking record: {str(e)}")
+                        logger.error("Error creating booking record: %s", e)
 
                     # Set up delayed success message with addon offer
                     self.delayed_messages = [{
@@ -941,11 +977,11 @@ Please let me know which room type you'd like!"""
                         actual_booking_id = self.create_booking_record(self.user_data)
                         if actual_booking_id:
                             self.user_data['booking_id'] = actual_booking_id
-                            logger.info(f"Booking record created successfully: {actual_booking_id}")
+                            logger.info("Booking record created successfully: %s", actual_booking_id)
                         else:
                             logger.warning("Failed to create booking record, using generated ID")
                     except Exception as e:
-                        logger.error(f"Error creating booking record: {str(e)}")
+                        logger.error("Error creating booking record: %s", e)
 
                     # Set up delayed success message with addon offer
                     self.delayed_messages = [{
@@ -958,7 +994,7 @@ Please let me know which room type you'd like!"""
                     self.state = "collecting_booking_info"
                     return self.ask_for_missing_info(self.user_data)
         except Exception as e:
-            logger.error(f"Error handling booking intent: {str(e)}")
+            logger.error("Error handling booking intent: %s", e)
             return "Sorry, I encountered an error while processing your booking request." if lang == 'en' else "抱歉，处理您的预订请求时遇到错误。"
 
     def check_returning_customer(self) -> bool:
@@ -1010,7 +1046,7 @@ Please let me know which room type you'd like!"""
                 # 修改这里：将中文提示改为英文
                 return "To cancel your booking, please provide your booking ID (format: BK-XXXXX) or the email address used for booking." if lang == 'en' else "To cancel your booking, please provide your booking ID (format: BK-XXXXX) or the email address used for booking."
         except Exception as e:
-            logger.error(f"Error handling cancel booking intent: {str(e)}")
+            logger.error("Error handling cancel booking intent: %s", e)
             return "Sorry, I encountered an error while processing your cancellation request." if lang == 'en' else "抱歉，处理您的取消请求时遇到错误。"
 
     def handle_upgrade_room_intent(self, user_input: str, lang: str = 'en') -> str:
@@ -1042,7 +1078,7 @@ Please let me know which room type you'd like!"""
             else:
                 return "To upgrade your room, please provide your booking ID (format: BK-XXXXX) or the email address used for booking." if lang == 'en' else "要升级房间，请提供您的预订ID（格式：BK-XXXXX）或预订时使用的邮箱地址。"
         except Exception as e:
-            logger.error(f"Error handling upgrade room intent: {str(e)}")
+            logger.error("Error handling upgrade room intent: %s", e)
             return "Sorry, I encountered an error while processing your upgrade request." if lang == 'en' else "抱歉，处理您的升级请求时遇到错误。"
 
     def handle_change_date_intent(self, user_input: str, lang: str = 'en') -> str:
@@ -1080,7 +1116,7 @@ Please let me know which room type you'd like!"""
                 # 修改这里：将中文提示改为英文
                 return "To change your booking dates, please provide your booking ID (format: BK-XXXXX) or the email address used for booking." if lang == 'en' else "To change your booking dates, please provide your booking ID (format: BK-XXXXX) or the email address used for booking."
         except Exception as e:
-            logger.error(f"Error handling change date intent: {str(e)}")
+            logger.error("Error handling change date intent: %s", e)
             return "Sorry, I encountered an error while processing your date change request." if lang == 'en' else "抱歉，处理您的日期更改请求时遇到错误。"
 
     def handle_extend_stay_intent(self, user_input: str, lang: str = 'en') -> str:
@@ -1137,7 +1173,7 @@ Please let me know which room type you'd like!"""
             else:
                 return "To extend your stay, please provide your booking ID (format: BK-XXXXX) or the email address used for booking." if lang == 'en' else "要延长住宿，请提供您的预订ID（格式：BK-XXXXX）或预订时使用的邮箱地址。"
         except Exception as e:
-            logger.error(f"Error handling extend stay intent: {str(e)}")
+            logger.error("Error handling extend stay intent: %s", e)
             return "Sorry, I encountered an error while processing your extend stay request." if lang == 'en' else "抱歉，处理您的延长住宿请求时遇到错误。"
 
     def handle_gratitude_intent(self, user_input: str, lang: str = 'en') -> str:
@@ -1204,7 +1240,7 @@ Please let me know which room type you'd like!"""
             return response
 
         except Exception as e:
-            logger.error(f"Error handling gratitude intent: {str(e)}")
+            logger.error("Error handling gratitude intent: %s", e)
             # Fallback to simple response
             return "You're welcome! Let me know if you need help with room booking or hotel info."
 
@@ -1237,7 +1273,7 @@ Please let me know which room type you'd like!"""
             responses = self.intents.get(intent, self.intents.get('unknown', {})).get('responses', {}).get(lang, ["I'm not sure I understand."])
             return random.choice(responses) if responses else "I'm not sure I understand."
         except Exception as e:
-            logger.error(f"Error handling intent {intent}: {str(e)}")
+            logger.error("Error handling intent %s: %s", intent, e)
             return self.intents.get('unknown', {}).get('responses', {}).get(lang, ["I'm not sure I understand."])[0]
 
     def respond_with_advanced_nlp(self, user_input: str, context: Dict = None) -> str:
@@ -1291,7 +1327,7 @@ Please let me know which room type you'd like!"""
             return response
 
         except Exception as e:
-            logger.error(f"Error in advanced NLP processing: {str(e)}")
+            logger.error("Error in advanced NLP processing: %s", e)
             return self.respond(user_input)
 
     def _is_hotel_info_inquiry(self, analysis: Dict) -> bool:
@@ -1500,7 +1536,7 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
     def respond(self, user_input: str, lang: Optional[str] = None) -> str:
         """Main response method to process user input and generate a reply."""
         try:
-            logger.info(f"Processing input: {user_input}")
+            logger.info("Processing input: %s", user_input)
 
             # Auto-detect language if not specified
             if lang is None:
@@ -1511,11 +1547,12 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                 except Exception:
                     lang = 'en'
 
-            logger.info(f"Using language: {lang}")
+            logger.info("Using language: %s", lang)
 
             # First check for booking intent to start the collection process
             intent = self.detect_intent(user_input)
-            logger.info(f"Detected intent: {intent}")
+            self.last_intent = intent
+            logger.info("Detected intent: %s", intent)
 
             # Check for room service requests FIRST (before booking intent)
             if self.detect_room_service_request(user_input):
@@ -1659,7 +1696,7 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                 booking_info = self.extract_booking_info(user_input, self.user_data)
                 if booking_info:
                     self.user_data.update(booking_info)
-                    logger.info(f"Updated user data: {self.user_data}")
+                    turn_logger.debug("Updated user data: %s", self.user_data)
 
                 # Check if we have all required information
                 if self.is_booking_info_complete(self.user_data):
@@ -1673,11 +1710,11 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                         actual_booking_id = self.create_booking_record(self.user_data)
                         if actual_booking_id:
                             self.user_data['booking_id'] = actual_booking_id
-                            logger.info(f"Booking record created successfully: {actual_booking_id}")
+                            logger.info("Booking record created successfully: %s", actual_booking_id)
                         else:
                             logger.warning("Failed to create booking record, using generated ID")
                     except Exception as e:
-                        logger.error(f"Error creating booking record: {str(e)}")
+                        logger.error("Error creating booking record: %s", e)
 
                     # Set up delayed success message with addon offer
                     self.delayed_messages = [{
@@ -1702,11 +1739,11 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                     if advanced_response and len(advanced_response) > 20:  # Ensure we got a substantial response
                         return advanced_response
                 except Exception as e:
-                    logger.warning(f"Advanced NLP failed, falling back to basic: {str(e)}")
+                    logger.warning("Advanced NLP failed, falling back to basic: %s", e)
 
             # Handle sentiment analysis
             sentiment, confidence = self.analyze_sentiment(user_input)
-            logger.info(f"Sentiment analysis: {sentiment} (confidence: {confidence:.2f})")
+            logger.info("Sentiment analysis: %s (confidence: %.2f)", sentiment, confidence)
 
             if sentiment == "Negative" and confidence > 0.7:
                 apology = "I'm sorry to hear that. How can I better assist you? " if lang == 'en' else "很抱歉听到这个。我怎样才能更好地帮助您？"
@@ -1718,11 +1755,11 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                 return prefix + regular_response
 
             response = self.handle_intent(intent, user_input, lang)
-            logger.info(f"Generated response: {response}")
+            logger.info("Generated response: %s", response)
             return response
 
         except Exception as e:
-            logger.error(f"Error in response generation: {str(e)}")
+            logger.error("Error in response generation: %s", e)
             return "Sorry, I encountered an error. Please try again later." if lang == 'en' else "抱歉，我遇到了一个错误。请稍后再试。"
 
     def create_booking_record(self, user_data: Dict) -> Optional[str]:
@@ -1735,11 +1772,11 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
 
             # Find the room by type
             room_type = user_data.get('room_type', '')
-            room = Room.objects.filter(name__icontains=room_type).first()
+            room = find_room(room_type)
             if not room:
                 # Default to first available room if specific type not found
-                room = Room.objects.first()
-                logger.warning(f"Room type '{room_type}' not found, using default room: {room.name if room else 'None'}")
+                room = get_room_catalog().first()
+                logger.warning("Room type '%s' not found, using default room: %s", room_type, room.name if room else 'None')
 
             if not room:
                 logger.error("No rooms available in the database")
@@ -1766,7 +1803,7 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                     return None
 
             except Exception as e:
-                logger.error(f"Error parsing dates: {str(e)}")
+                logger.error("Error parsing dates: %s", e)
                 return None
 
             # Create booking record
@@ -1782,11 +1819,12 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                 user=user_data.get('user')  # Associate with the current user
             )
 
-            logger.info(f"Booking created successfully: ID={booking.id}, Booking_ID={booking.booking_id}")
+            remember_booking(booking)
+            logger.info("Booking created successfully: ID=%s, Booking_ID=%s", booking.id, booking.booking_id)
             return booking.booking_id or f"BK-{booking.id}"
 
         except Exception as e:
-            logger.error(f"Error creating booking record: {str(e)}")
+            logger.error("Error creating booking record: %s", e)
             import traceback
             logger.error(traceback.format_exc())
             return None
@@ -1820,7 +1858,7 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                 return "Would you like to add:\n🍳 **Breakfast service** (RM20/person)\n\nOr type 'no thanks' if you don't need any additional services."
 
         except Exception as e:
-            logger.error(f"Error handling addon request: {str(e)}")
+            logger.error("Error handling addon request: %s", e)
             return "Sorry, I encountered an error processing your addon request. Please try again."
 
     def handle_breakfast_count(self, user_input: str, lang: str = 'en') -> str:
@@ -1857,7 +1895,7 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                 return "Please tell me how many guests would like breakfast service. For example, type '2' for 2 guests."
 
         except Exception as e:
-            logger.error(f"Error handling breakfast count: {str(e)}")
+            logger.error("Error handling breakfast count: %s", e)
             return "Sorry, I encountered an error. Please tell me how many guests need breakfast service."
     def handle_breakfast_confirmation(self, user_input: str, lang: str = 'en') -> str:
         """Handle breakfast booking confirmation."""
@@ -1900,7 +1938,7 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                 return "Please reply 'Yes' (or A) to confirm the breakfast booking or 'No' (or B) to cancel."
 
         except Exception as e:
-            logger.error(f"Error handling breakfast confirmation: {str(e)}")
+            logger.error("Error handling breakfast confirmation: %s", e)
             return "Sorry, I encountered an error. Please reply 'Yes' to confirm or 'No' to cancel."
     def detect_breakfast_request(self, user_input: str) -> bool:
         """Detect if user is requesting breakfast service."""
@@ -1931,7 +1969,7 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
             return "I'd be happy to help you add breakfast service! To add this service to your reservation, please provide your booking ID."
 
         except Exception as e:
-            logger.error(f"Error handling breakfast request: {str(e)}")
+            logger.error("Error handling breakfast request: %s", e)
             return "I'd be happy to help you add breakfast service! Please provide your booking ID first so I can add this service to your reservation."
 
     def handle_breakfast_booking_id(self, user_input: str, lang: str = 'en') -> str:
@@ -1943,30 +1981,30 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
             booking_id_match = re.search(r'\b([A-Z]{2,}-[A-Z0-9-]+)\b', user_input, re.IGNORECASE)
             if booking_id_match:
                 booking_id = booking_id_match.group(1)
-                logger.info(f"Extracted booking ID: {booking_id}")
+                logger.info("Extracted booking ID: %s", booking_id)
 
                 # Verify booking exists
                 from hotel_booking.models import Booking
-                booking = Booking.objects.filter(booking_id=booking_id).first()
-                logger.info(f"Booking found: {booking is not None}")
+                booking = find_booking(booking_id)
+                logger.info("Booking found: %s", booking is not None)
 
                 if booking:
                     # Store booking info
                     self.user_data['booking_id'] = booking_id
-                    logger.info(f"Stored booking ID in user_data: {booking_id}")
+                    logger.info("Stored booking ID in user_data: %s", booking_id)
 
                     # Move to breakfast count collection
                     self.state = "collecting_breakfast_count"
                     return f"Great! I found your booking (ID: {booking_id}) for guest {booking.guest_name}. Breakfast service is RM20/person. How many guests do you need to add breakfast for?"
                 else:
-                    logger.warning(f"Booking not found: {booking_id}")
+                    logger.warning("Booking not found: %s", booking_id)
                     return f"I couldn't find a booking with ID '{booking_id}'. Please check your booking ID and try again."
             else:
-                logger.warning(f"No valid booking ID found in input: {user_input}")
+                logger.warning("No valid booking ID found in input: %s", user_input)
                 return "Please provide a valid booking ID (e.g., BK-12345 or HTL-ABC123)."
 
         except Exception as e:
-            logger.error(f"Error handling breakfast booking ID: {str(e)}")
+            logger.error("Error handling breakfast booking ID: %s", e)
             import traceback
             logger.error(traceback.format_exc())
             return "Sorry, I encountered an error. Please provide your booking ID again."
@@ -1988,9 +2026,9 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                 logger.error("No booking ID found for addon creation")
                 return False
 
-            booking = Booking.objects.filter(booking_id=booking_id).first()
+            booking = find_booking(booking_id)
             if not booking:
-                logger.error(f"Booking not found: {booking_id}")
+                logger.error("Booking not found: %s", booking_id)
                 return False
 
             # Create addon record
@@ -2005,11 +2043,12 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                 addon_data['breakfast_count'] = kwargs.get('breakfast_count')
 
             addon = BookingAddon.objects.create(**addon_data)
-            logger.info(f"Addon created successfully: {addon}")
+            related_changed(booking, 'addons')
+            logger.info("Addon created successfully: %s", addon)
             return True
 
         except Exception as e:
-            logger.error(f"Error creating addon record: {str(e)}")
+            logger.error("Error creating addon record: %s", e)
             return False
 
     def detect_cancel_intent(self, user_input: str) -> bool:
@@ -2055,7 +2094,7 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                 return "I'd be happy to help you cancel your booking. Please provide your booking ID or booking name, and I will help you check the booking information."
 
         except Exception as e:
-            logger.error(f"Error handling cancel intent: {str(e)}")
+            logger.error("Error handling cancel intent: %s", e)
             return "Sorry, I encountered an error processing your cancellation request. Please try again."
 
     def handle_cancel_booking_id(self, user_input: str, lang: str = 'en') -> str:
@@ -2075,7 +2114,7 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                 return "Please provide a valid booking ID. For example: BK-12345 or TEST-001"
 
         except Exception as e:
-            logger.error(f"Error handling cancel booking ID: {str(e)}")
+            logger.error("Error handling cancel booking ID: %s", e)
             return "Sorry, I encountered an error. Please provide your booking ID again."
 
     def verify_booking_for_cancel(self, booking_id: str, lang: str = 'en') -> str:
@@ -2084,7 +2123,7 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
             from hotel_booking.models import Booking
 
             # Find booking by ID
-            booking = Booking.objects.filter(booking_id=booking_id).first()
+            booking = find_booking(booking_id)
 
             if not booking:
                 self.state = "collecting_booking_id_for_cancel"
@@ -2110,7 +2149,7 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
             return f"I found your booking! You have booked a {booking.room.name} with check-in dates from {booking.check_in_date.strftime('%B %d')} to {booking.check_out_date.strftime('%B %d')}. Are you sure you want to cancel? (Reply 'Yes' to confirm)"
 
         except Exception as e:
-            logger.error(f"Error verifying booking for cancel: {str(e)}")
+            logger.error("Error verifying booking for cancel: %s", e)
             return "Sorry, I encountered an error checking your booking. Please try again."
 
     def handle_cancel_confirmation(self, user_input: str, lang: str = 'en') -> str:
@@ -2137,7 +2176,7 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                 return "Please reply 'Yes' to confirm the cancellation or 'No' to keep your booking."
 
         except Exception as e:
-            logger.error(f"Error handling cancel confirmation: {str(e)}")
+            logger.error("Error handling cancel confirmation: %s", e)
             return "Sorry, I encountered an error. Please reply 'Yes' to confirm or 'No' to cancel."
 
     def process_cancellation(self, lang: str = 'en') -> str:
@@ -2150,7 +2189,7 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                 return "Sorry, I lost track of your booking information. Please start the cancellation process again."
 
             # Find and update booking
-            booking = Booking.objects.get(id=booking_data['id'])
+            booking = get_booking(booking_data['id'])
             booking.status = 'cancelled'
             booking.save()
 
@@ -2163,7 +2202,7 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
             return f"Your reservation has been successfully canceled, order number {booking_id}. I hope to have the opportunity to serve you in the future!"
 
         except Exception as e:
-            logger.error(f"Error processing cancellation: {str(e)}")
+            logger.error("Error processing cancellation: %s", e)
             return "Sorry, I encountered an error while cancelling your booking. Please contact our support team for assistance."
 
     def detect_book_another_room_intent(self, user_input: str) -> bool:
@@ -2205,7 +2244,7 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
                 return "I'd be happy to help you book another room! To link it with your existing reservation, please provide your current booking ID."
 
         except Exception as e:
-            logger.error(f"Error handling book another room intent: {str(e)}")
+            logger.error("Error handling book another room intent: %s", e)
             return "Sorry, I encountered an error processing your additional room request. Please try again."
 
     def show_room_types_for_additional_booking(self, lang: str = 'en') -> str:
@@ -2214,9 +2253,9 @@ I'll personally ensure this is resolved promptly and take steps to prevent it fr
             from hotel_booking.models import Room
 
             # Get available room types
-            rooms = Room.objects.all().order_by('price')
+            rooms = get_room_catalog().by_price()
 
-            if not rooms.exists():
+            if not rooms:
                 return "Sorry, no rooms are currently available. Please contact our front desk for assistance."
 
             room_options = []
@@ -2237,7 +2276,7 @@ What room type would you like for the additional booking?
 Please select the room type (A, B, C, etc.) or tell me the room name."""
 
         except Exception as e:
-            logger.error(f"Error showing room types for additional booking: {str(e)}")
+            logger.error("Error showing room types for additional booking: %s", e)
             return "Sorry, I encountered an error loading room options. Please try again."
 
     def handle_parent_booking_id(self, user_input: str, lang: str = 'en') -> str:
@@ -2253,7 +2292,7 @@ Please select the room type (A, B, C, etc.) or tell me the room name."""
 
                 # Verify booking exists
                 from hotel_booking.models import Booking
-                booking = Booking.objects.filter(booking_id=booking_id).first()
+                booking = find_booking(booking_id)
 
                 if booking:
                     # Store parent booking info
@@ -2275,7 +2314,7 @@ Please select the room type (A, B, C, etc.) or tell me the room name."""
                 return "Please provide a valid booking ID (e.g., BK-12345)."
 
         except Exception as e:
-            logger.error(f"Error handling parent booking ID: {str(e)}")
+            logger.error("Error handling parent booking ID: %s", e)
             return "Sorry, I encountered an error. Please provide your booking ID again."
 
     def handle_additional_room_selection(self, user_input: str, lang: str = 'en') -> str:
@@ -2286,14 +2325,14 @@ Please select the room type (A, B, C, etc.) or tell me the room name."""
             user_input_lower = user_input.lower().strip()
 
             # Try to match room selection by letter (A, B, C) or name
-            rooms = Room.objects.all().order_by('price')
+            rooms = get_room_catalog().by_price()
             selected_room = None
 
             # Check for letter selection (A, B, C, etc.)
             if len(user_input_lower) == 1 and user_input_lower.isalpha():
                 room_index = ord(user_input_lower.upper()) - ord('A')
-                if 0 <= room_index < rooms.count():
-                    selected_room = list(rooms)[room_index]
+                if 0 <= room_index < len(rooms):
+                    selected_room = rooms[room_index]
 
             # Check for room name match
             if not selected_room:
@@ -2323,7 +2362,7 @@ B. No (select different dates)"""
                 return "I didn't understand your room selection. Please choose a room type by letter (A, B, C) or tell me the room name."
 
         except Exception as e:
-            logger.error(f"Error handling additional room selection: {str(e)}")
+            logger.error("Error handling additional room selection: %s", e)
             return "Sorry, I encountered an error processing your room selection. Please try again."
 
     def handle_additional_dates_confirmation(self, user_input: str, lang: str = 'en') -> str:
@@ -2352,7 +2391,7 @@ B. No (select different dates)"""
                 return "Please choose:\nA. Yes (use same dates)\nB. No (select different dates)"
 
         except Exception as e:
-            logger.error(f"Error handling additional dates confirmation: {str(e)}")
+            logger.error("Error handling additional dates confirmation: %s", e)
             return "Sorry, I encountered an error. Please choose A for same dates or B for different dates."
 
     def handle_additional_dates_collection(self, user_input: str, lang: str = 'en') -> str:
@@ -2395,7 +2434,7 @@ B. No (select different dates)"""
             return self.show_additional_booking_summary()
 
         except Exception as e:
-            logger.error(f"Error handling additional dates collection: {str(e)}")
+            logger.error("Error handling additional dates collection: %s", e)
             return "Sorry, I encountered an error processing the dates. Please provide the check-in and check-out dates again (e.g., 'June 15 to June 18')."
 
     def show_additional_booking_summary(self) -> str:
@@ -2442,7 +2481,7 @@ A. Confirm
 B. Cancel"""
 
         except Exception as e:
-            logger.error(f"Error showing additional booking summary: {str(e)}")
+            logger.error("Error showing additional booking summary: %s", e)
             return "Sorry, I encountered an error preparing your booking summary. Please try again."
 
     def handle_additional_booking_confirmation(self, user_input: str, lang: str = 'en') -> str:
@@ -2502,7 +2541,7 @@ Is there anything else I can help you with?"""
                 return "Please reply 'Confirm' (or A) to proceed with the additional booking or 'Cancel' (or B) to abort."
 
         except Exception as e:
-            logger.error(f"Error handling additional booking confirmation: {str(e)}")
+            logger.error("Error handling additional booking confirmation: %s", e)
             return "Sorry, I encountered an error. Please reply 'Confirm' to proceed or 'Cancel' to abort."
 
     def create_additional_booking_record(self) -> bool:
@@ -2515,9 +2554,9 @@ Is there anything else I can help you with?"""
 
             # Get room by type
             room_type = self.user_data.get('additional_room_type', '')
-            room = Room.objects.filter(name__icontains=room_type).first()
+            room = find_room(room_type)
             if not room:
-                logger.error(f"Room type '{room_type}' not found")
+                logger.error("Room type '%s' not found", room_type)
                 return False
 
             # Parse dates
@@ -2544,9 +2583,9 @@ Is there anything else I can help you with?"""
             parent_booking_obj = None
             if parent_booking.get('id'):
                 try:
-                    parent_booking_obj = Booking.objects.get(id=parent_booking['id'])
+                    parent_booking_obj = get_booking(parent_booking['id'])
                 except Booking.DoesNotExist:
-                    logger.warning(f"Parent booking not found: {parent_booking.get('id')}")
+                    logger.warning("Parent booking not found: %s", parent_booking.get('id'))
 
             # Get user object if user_id is available
             user_obj = None
@@ -2557,7 +2596,7 @@ Is there anything else I can help you with?"""
                     from django.contrib.auth.models import User
                     user_obj = User.objects.get(id=self.user_data.get('user_id'))
                 except User.DoesNotExist:
-                    logger.warning(f"User with ID {self.user_data.get('user_id')} not found")
+                    logger.warning("User with ID %s not found", self.user_data.get('user_id'))
 
             # Create additional booking record
             booking = Booking.objects.create(
@@ -2572,16 +2611,18 @@ Is there anything else I can help you with?"""
                 user=user_obj
             )
 
+            remember_booking(booking)
+
             # Store the new booking ID for reference
             self.user_data['additional_booking_id'] = booking.booking_id or f"BK-{booking.id}"
 
-            logger.info(f"Additional booking created successfully: ID={booking.id}, Booking_ID={booking.booking_id}")
-            logger.info(f"Linked to parent booking: {parent_booking.get('booking_id', 'N/A')}")
+            logger.info("Additional booking created successfully: ID=%s, Booking_ID=%s", booking.id, booking.booking_id)
+            logger.info("Linked to parent booking: %s", parent_booking.get('booking_id', 'N/A'))
 
             return True
 
         except Exception as e:
-            logger.error(f"Error creating additional booking record: {str(e)}")
+            logger.error("Error creating additional booking record: %s", e)
             import traceback
             logger.error(traceback.format_exc())
             return False
@@ -2623,7 +2664,7 @@ Is there anything else I can help you with?"""
             return "I'd be happy to help you upgrade your room! Please provide your booking ID so I can check your current reservation and show you available upgrade options."
 
         except Exception as e:
-            logger.error(f"Error handling upgrade intent: {str(e)}")
+            logger.error("Error handling upgrade intent: %s", e)
             return "Sorry, I encountered an error processing your upgrade request. Please try again."
 
     def handle_upgrade_booking_id(self, user_input: str, lang: str = 'en') -> str:
@@ -2641,7 +2682,7 @@ Is there anything else I can help you with?"""
                 return "Please provide a valid booking ID. For example: BK-12345"
 
         except Exception as e:
-            logger.error(f"Error handling upgrade booking ID: {str(e)}")
+            logger.error("Error handling upgrade booking ID: %s", e)
             return "Sorry, I encountered an error. Please provide your booking ID again."
 
     def show_upgrade_options(self, booking_id: str, lang: str = 'en') -> str:
@@ -2650,7 +2691,7 @@ Is there anything else I can help you with?"""
             from hotel_booking.models import Booking, Room
 
             # Find booking by ID
-            booking = Booking.objects.filter(booking_id=booking_id).first()
+            booking = find_booking(booking_id)
 
             if not booking:
                 self.state = "collecting_booking_id_for_upgrade"
@@ -2674,9 +2715,9 @@ Is there anything else I can help you with?"""
 
             # Get available room types for upgrade (higher price than current)
             current_price = booking.room.price
-            upgrade_rooms = Room.objects.filter(price__gt=current_price).order_by('price')
+            upgrade_rooms = get_room_catalog().priced_above(current_price)
 
-            if not upgrade_rooms.exists():
+            if not upgrade_rooms:
                 self.state = "greeting"
                 return f"You are currently booking a {booking.room.name} for stays from {booking.check_in_date.strftime('%B %d')} to {booking.check_out_date.strftime('%B %d')}. Unfortunately, there are no higher-tier rooms available for upgrade."
 
@@ -2695,7 +2736,7 @@ Is there anything else I can help you with?"""
             return options_text
 
         except Exception as e:
-            logger.error(f"Error showing upgrade options: {str(e)}")
+            logger.error("Error showing upgrade options: %s", e)
             return "Sorry, I encountered an error checking upgrade options. Please try again."
 
     def handle_upgrade_selection(self, user_input: str, lang: str = 'en') -> str:
@@ -2712,7 +2753,7 @@ Is there anything else I can help you with?"""
 
             # Try to match room name with improved logic
             selected_room = None
-            rooms = Room.objects.filter(price__gt=booking_data['current_price'])
+            rooms = get_room_catalog().priced_above(booking_data['current_price'])
 
             # First try exact match
             for room in rooms:
@@ -2745,7 +2786,7 @@ Is there anything else I can help you with?"""
                     return "Sorry, no upgrade options are available for your current booking."
 
             # Process the upgrade
-            booking = Booking.objects.get(id=booking_data['id'])
+            booking = get_booking(booking_data['id'])
             old_room = booking.room.name
             old_price = booking.room.price
 
@@ -2764,7 +2805,7 @@ Is there anything else I can help you with?"""
             return f"Your room type has been successfully upgraded to {selected_room.name} and the total price has been adjusted. Additional cost: RM{total_additional} (RM{price_diff}/night × {booking_data['duration']} nights). We look forward to your more comfortable stay!"
 
         except Exception as e:
-            logger.error(f"Error processing upgrade selection: {str(e)}")
+            logger.error("Error processing upgrade selection: %s", e)
             return "Sorry, I encountered an error while processing your upgrade. Please contact our support team for assistance."
 
     def detect_extend_intent(self, user_input: str) -> bool:
@@ -2807,7 +2848,7 @@ Is there anything else I can help you with?"""
             return "I'd be happy to help you change your check-in date! Please provide your booking ID so that I can help you change the date."
 
         except Exception as e:
-            logger.error(f"Error handling change date intent: {str(e)}")
+            logger.error("Error handling change date intent: %s", e)
             return "Sorry, I encountered an error processing your date change request. Please try again."
 
     def handle_change_date_booking_id(self, user_input: str, lang: str = 'en') -> str:
@@ -2825,7 +2866,7 @@ Is there anything else I can help you with?"""
                 return "Please provide a valid booking ID. For example: BK-12345"
 
         except Exception as e:
-            logger.error(f"Error handling change date booking ID: {str(e)}")
+            logger.error("Error handling change date booking ID: %s", e)
             return "Sorry, I encountered an error. Please provide your booking ID again."
 
     def show_current_booking_dates(self, booking_id: str, lang: str = 'en') -> str:
@@ -2835,7 +2876,7 @@ Is there anything else I can help you with?"""
             from datetime import datetime, timedelta
 
             # Find booking by ID
-            booking = Booking.objects.filter(booking_id=booking_id).first()
+            booking = find_booking(booking_id)
 
             if not booking:
                 self.state = "collecting_booking_id_for_change_date"
@@ -2871,7 +2912,7 @@ Is there anything else I can help you with?"""
             return f"Your current check-in date is {booking.check_in_date.strftime('%B %d, %Y')}. Which day do you want to change it to? Please provide the new check-in date (e.g., 'June 15' or '15/06/2025')."
 
         except Exception as e:
-            logger.error(f"Error showing current booking dates: {str(e)}")
+            logger.error("Error showing current booking dates: %s", e)
             return "Sorry, I encountered an error checking your booking details. Please try again."
 
     def handle_new_check_in_date(self, user_input: str, lang: str = 'en') -> str:
@@ -2955,7 +2996,7 @@ Is there anything else I can help you with?"""
             return f"Are you sure to change the check-in time to {new_checkin_date.strftime('%B %d, %Y')}? Your new check-out date will be {new_checkout_date.strftime('%B %d, %Y')}. Please type 'Confirm' to proceed or 'Cancel' to abort."
 
         except Exception as e:
-            logger.error(f"Error handling new check-in date: {str(e)}")
+            logger.error("Error handling new check-in date: %s", e)
             return "Sorry, I encountered an error processing the new date. Please try again."
 
     def handle_date_change_confirmation(self, user_input: str, lang: str = 'en') -> str:
@@ -3008,7 +3049,7 @@ Is there anything else I can help you with?"""
                     self.user_data[change_key] = True
 
                     # Update the booking
-                    booking = Booking.objects.get(id=booking_data['id'])
+                    booking = get_booking(booking_data['id'])
                     new_checkin_date = dateutil.parser.parse(new_checkin_str).date()
                     new_checkout_date = dateutil.parser.parse(new_checkout_str).date()
 
@@ -3029,7 +3070,7 @@ Is there anything else I can help you with?"""
                 except Exception as db_error:
                     # Clear processing flag on error
                     self.user_data['processing_date_change'] = False
-                    logger.error(f"Database error during date change: {str(db_error)}")
+                    logger.error("Database error during date change: %s", str(db_error))
                     return "Sorry, I encountered an error while updating your booking. Please try again or contact our support team."
 
             # Enhanced cancellation keywords including common misspellings
@@ -3059,7 +3100,7 @@ Is there anything else I can help you with?"""
         except Exception as e:
             # Clear processing flag on any error
             self.user_data['processing_date_change'] = False
-            logger.error(f"Error handling date change confirmation: {str(e)}")
+            logger.error("Error handling date change confirmation: %s", e)
             return "Sorry, I encountered an error while processing your date change. Please contact our support team for assistance."
 
     def handle_extend_intent(self, user_input: str, lang: str = 'en') -> str:
@@ -3087,7 +3128,7 @@ Is there anything else I can help you with?"""
             return "I'd be happy to help you extend your stay! Please provide your booking ID so I can check your current reservation and available dates."
 
         except Exception as e:
-            logger.error(f"Error handling extend intent: {str(e)}")
+            logger.error("Error handling extend intent: %s", e)
             return "Sorry, I encountered an error processing your extension request. Please try again."
 
     def handle_extend_booking_id(self, user_input: str, lang: str = 'en') -> str:
@@ -3105,7 +3146,7 @@ Is there anything else I can help you with?"""
                 return "Please provide a valid booking ID. For example: BK-12345"
 
         except Exception as e:
-            logger.error(f"Error handling extend booking ID: {str(e)}")
+            logger.error("Error handling extend booking ID: %s", e)
             return "Sorry, I encountered an error. Please provide your booking ID again."
 
     def show_extend_options(self, booking_id: str, lang: str = 'en') -> str:
@@ -3115,7 +3156,7 @@ Is there anything else I can help you with?"""
             from datetime import datetime, timedelta
 
             # Find booking by ID
-            booking = Booking.objects.filter(booking_id=booking_id).first()
+            booking = find_booking(booking_id)
 
             if not booking:
                 self.state = "collecting_booking_id_for_extend"
@@ -3140,7 +3181,7 @@ Is there anything else I can help you with?"""
             return f"Your current booking is until {booking.check_out_date.strftime('%B %d (%A)')}. Which day do you want to extend it to? Please provide the new check-out date (e.g., 'June 15' or '15/06/2025')."
 
         except Exception as e:
-            logger.error(f"Error showing extend options: {str(e)}")
+            logger.error("Error showing extend options: %s", e)
             return "Sorry, I encountered an error checking extension options. Please try again."
 
     def handle_extend_date_selection(self, user_input: str, lang: str = 'en') -> str:
@@ -3203,7 +3244,7 @@ Is there anything else I can help you with?"""
             # For now, we'll assume the room is available
 
             # Update the booking
-            booking = Booking.objects.get(id=booking_data['id'])
+            booking = get_booking(booking_data['id'])
             booking.check_out_date = new_checkout_date
             booking.save()
 
@@ -3214,7 +3255,7 @@ Is there anything else I can help you with?"""
             return f"Good news! We have extended your stay to {new_checkout_date.strftime('%B %d')}, with an additional fee of RM{additional_cost} ({additional_nights} night{'s' if additional_nights > 1 else ''} × RM{booking_data['room_price']}/night). Looking forward to your continued stay!"
 
         except Exception as e:
-            logger.error(f"Error processing extend date selection: {str(e)}")
+            logger.error("Error processing extend date selection: %s", e)
             return "Sorry, I encountered an error while processing your extension. Please contact our support team for assistance."
 
     def detect_status_inquiry(self, user_input: str) -> bool:
@@ -3274,34 +3315,35 @@ Is there anything else I can help you with?"""
             return "I'd be happy to check your booking status! Do you remember the name, phone number, or booking ID used for the reservation? This will help me find your booking quickly."
 
         except Exception as e:
-            logger.error(f"Error handling status inquiry: {str(e)}")
+            logger.error("Error handling status inquiry: %s", e)
             return "Sorry, I encountered an error checking your booking status. Please try again."
 
+    @replica_reads()
     def search_booking_by_name(self, name: str, lang: str = 'en') -> str:
         """Search for bookings by guest name with fuzzy matching."""
         try:
-            from hotel_booking.models import Booking
             from django.db.models import Q
+            from hotel_booking.archive import search_bookings
 
-            # Try exact match first
-            bookings = Booking.objects.filter(guest_name__iexact=name).order_by('-created_at')
+            # Try exact match first (live bookings, then archived ones)
+            bookings = search_bookings(Q(guest_name__iexact=name), limit=5)
 
             # If no exact match, try partial matches
-            if not bookings.exists():
+            if not bookings:
                 name_parts = name.split()
                 query = Q()
                 for part in name_parts:
                     if len(part) >= 2:  # Only search for meaningful parts
                         query |= Q(guest_name__icontains=part)
-                bookings = Booking.objects.filter(query).order_by('-created_at')
+                bookings = search_bookings(query, limit=5) if query else []
 
-            if not bookings.exists():
+            if not bookings:
                 self.state = "collecting_booking_info_for_status"
                 return f"Sorry, I couldn't find any booking records for \"{name}\". Please confirm the name spelling or try providing your booking ID instead."
 
-            if bookings.count() == 1:
+            if len(bookings) == 1:
                 # Single booking found
-                booking = bookings.first()
+                booking = bookings[0]
                 return self.format_booking_status_response(booking, lang)
             else:
                 # Multiple bookings found
@@ -3312,9 +3354,10 @@ Is there anything else I can help you with?"""
                         'guest_name': booking.guest_name,
                         'room_name': booking.room.name,
                         'check_in': booking.check_in_date.strftime('%B %d, %Y'),
-                        'status': booking.status
+                        'status': booking.status,
+                        'archived': booking.is_archived
                     }
-                    for booking in bookings[:5]  # Limit to 5 most recent
+                    for booking in bookings  # At most 5, most recent first
                 ]
                 self.state = "selecting_booking_from_multiple"
 
@@ -3326,7 +3369,7 @@ Is there anything else I can help you with?"""
                 return f"I found multiple bookings for \"{name}\":\n\n{booking_list}\n\nPlease reply with the number (1-{len(self.user_data['found_bookings'])}) of the booking you'd like to check, or provide your booking ID for a more specific search."
 
         except Exception as e:
-            logger.error(f"Error searching booking by name: {str(e)}")
+            logger.error("Error searching booking by name: %s", e)
             return "Sorry, I encountered an error while searching for your booking. Please try again."
 
     def format_booking_status_response(self, booking, lang: str = 'en') -> str:
@@ -3394,6 +3437,10 @@ Is there anything else I can help you with?"""
 
             # Reset state but keep booking info for potential follow-up actions
             self.state = "greeting"
+            if booking.is_archived:
+                # Archived stays are over; there is nothing left to change
+                self.user_data = {'is_returning_customer': True}
+                return response
             self.user_data = {
                 'is_returning_customer': True,
                 'last_viewed_booking': {
@@ -3410,7 +3457,7 @@ Is there anything else I can help you with?"""
             return response
 
         except Exception as e:
-            logger.error(f"Error formatting booking status response: {str(e)}")
+            logger.error("Error formatting booking status response: %s", e)
             return "I found your booking but encountered an error displaying the details. Please try again."
 
     def handle_multiple_booking_selection(self, user_input: str, lang: str = 'en') -> str:
@@ -3427,8 +3474,11 @@ Is there anything else I can help you with?"""
                 if 1 <= selection <= len(found_bookings):
                     selected_booking_data = found_bookings[selection - 1]
                     # Get the full booking object
-                    from hotel_booking.models import Booking
-                    booking = Booking.objects.get(id=selected_booking_data['id'])
+                    if selected_booking_data.get('archived'):
+                        from hotel_booking.archive import get_archived_booking
+                        booking = get_archived_booking(selected_booking_data['id'])
+                    else:
+                        booking = get_booking(selected_booking_data['id'])
                     return self.format_booking_status_response(booking, lang)
                 else:
                     return f"Please select a number between 1 and {len(found_bookings)}."
@@ -3436,7 +3486,7 @@ Is there anything else I can help you with?"""
                 return "Please reply with the number of the booking you'd like to check (e.g., '1', '2', etc.)."
 
         except Exception as e:
-            logger.error(f"Error handling multiple booking selection: {str(e)}")
+            logger.error("Error handling multiple booking selection: %s", e)
             return "Sorry, I encountered an error. Please try again."
 
     def handle_booking_info_collection_for_status(self, user_input: str, lang: str = 'en') -> str:
@@ -3478,24 +3528,24 @@ Is there anything else I can help you with?"""
             return "Please provide your booking ID, full name, or phone number so I can locate your reservation."
 
         except Exception as e:
-            logger.error(f"Error handling booking info collection: {str(e)}")
+            logger.error("Error handling booking info collection: %s", e)
             return "Sorry, I encountered an error. Please provide your booking ID or name."
 
+    @replica_reads()
     def search_booking_by_phone(self, phone: str, lang: str = 'en') -> str:
         """Search for bookings by phone number."""
         try:
-            from hotel_booking.models import Booking
+            from django.db.models import Q
+            from hotel_booking.archive import search_bookings
 
-            # Try exact match and partial matches
-            bookings = Booking.objects.filter(
-                guest_phone__icontains=phone
-            ).order_by('-created_at')
+            # Try exact match and partial matches (live bookings, then archived ones)
+            bookings = search_bookings(Q(guest_phone__icontains=phone), limit=5)
 
-            if not bookings.exists():
+            if not bookings:
                 return f"Sorry, I couldn't find any booking records with phone number ending in {phone[-4:]}. Please try providing your booking ID or full name instead."
 
-            if bookings.count() == 1:
-                booking = bookings.first()
+            if len(bookings) == 1:
+                booking = bookings[0]
                 return self.format_booking_status_response(booking, lang)
             else:
                 # Multiple bookings found - use the same multiple selection logic
@@ -3506,9 +3556,10 @@ Is there anything else I can help you with?"""
                         'guest_name': booking.guest_name,
                         'room_name': booking.room.name,
                         'check_in': booking.check_in_date.strftime('%B %d, %Y'),
-                        'status': booking.status
+                        'status': booking.status,
+                        'archived': booking.is_archived
                     }
-                    for booking in bookings[:5]
+                    for booking in bookings
                 ]
                 self.state = "selecting_booking_from_multiple"
 
@@ -3520,7 +3571,7 @@ Is there anything else I can help you with?"""
                 return f"I found multiple bookings with that phone number:\n\n{booking_list}\n\nPlease reply with the number (1-{len(self.user_data['found_bookings'])}) of the booking you'd like to check."
 
         except Exception as e:
-            logger.error(f"Error searching booking by phone: {str(e)}")
+            logger.error("Error searching booking by phone: %s", e)
             return "Sorry, I encountered an error while searching for your booking. Please try again."
 
     def handle_status_booking_id(self, user_input: str, lang: str = 'en') -> str:
@@ -3537,16 +3588,17 @@ Is there anything else I can help you with?"""
                 return "Please provide a valid booking ID. For example: BK-12345"
 
         except Exception as e:
-            logger.error(f"Error handling status booking ID: {str(e)}")
+            logger.error("Error handling status booking ID: %s", e)
             return "Sorry, I encountered an error. Please provide your booking ID again."
 
+    @replica_reads()
     def show_booking_status(self, booking_id: str, lang: str = 'en') -> str:
         """Show detailed booking status using the enhanced formatter."""
         try:
-            from hotel_booking.models import Booking
+            from hotel_booking.archive import find_archived_booking
 
-            # Find booking by ID
-            booking = Booking.objects.filter(booking_id=booking_id).first()
+            # Find booking by ID, falling back to archived bookings
+            booking = find_booking(booking_id) or find_archived_booking(booking_id)
 
             if not booking:
                 self.state = "collecting_booking_info_for_status"
@@ -3578,7 +3630,7 @@ Is there anything else I can help you with?"""
             return response
 
         except Exception as e:
-            logger.error(f"Error showing booking status: {str(e)}")
+            logger.error("Error showing booking status: %s", e)
             return "Sorry, I encountered an error checking your booking details. Please try again."
 
     def detect_hotel_info_question(self, user_input: str) -> bool:
@@ -3646,7 +3698,7 @@ Is there anything else I can help you with?"""
                 return "🏨 **Hotel Information:**\n\n🕐 **Check-in:** 2:00 PM\n🕐 **Check-out:** 12:00 PM\n🍳 **Breakfast:** 6:00 AM - 11:00 AM (First floor restaurant)\n📶 **Wi-Fi:** Free in all rooms (Password on room card)"
 
         except Exception as e:
-            logger.error(f"Error handling hotel info question: {str(e)}")
+            logger.error("Error handling hotel info question: %s", e)
             return "Sorry, I encountered an error. Please ask your question again."
 
     def detect_feedback_intent(self, user_input: str) -> bool:
@@ -3677,7 +3729,7 @@ Is there anything else I can help you with?"""
             return "🌟 **We Value Your Feedback!**\n\nAre you satisfied with your stay? Please rate your experience from 1-5 stars and leave valuable comments.\n\n⭐ 1 = Very Dissatisfied\n⭐⭐ 2 = Dissatisfied\n⭐⭐⭐ 3 = Neutral\n⭐⭐⭐⭐ 4 = Satisfied\n⭐⭐⭐⭐⭐ 5 = Very Satisfied\n\nPlease type your rating (1-5):"
 
         except Exception as e:
-            logger.error(f"Error handling feedback intent: {str(e)}")
+            logger.error("Error handling feedback intent: %s", e)
             return "Sorry, I encountered an error processing your feedback request. Please try again."
 
     def handle_feedback_rating(self, user_input: str, lang: str = 'en') -> str:
@@ -3698,7 +3750,7 @@ Is there anything else I can help you with?"""
                 return "Please provide a numeric rating from 1 to 5. For example, type '4' for 4 stars."
 
         except Exception as e:
-            logger.error(f"Error handling feedback rating: {str(e)}")
+            logger.error("Error handling feedback rating: %s", e)
             return "Sorry, I encountered an error. Please provide your rating (1-5)."
 
     def process_feedback_rating(self, rating: int, lang: str = 'en') -> str:
@@ -3714,7 +3766,7 @@ Is there anything else I can help you with?"""
                 return f"😔 Thank you for the {rating}-star rating. We're sorry that we didn't fully meet your expectations this time.\n\nIs there anything specific we can improve? We value your suggestions very much and would appreciate your detailed feedback:"
 
         except Exception as e:
-            logger.error(f"Error processing feedback rating: {str(e)}")
+            logger.error("Error processing feedback rating: %s", e)
             return "Thank you for your rating. Would you like to leave any comments?"
 
     def handle_feedback_comment(self, user_input: str, lang: str = 'en') -> str:
@@ -3731,7 +3783,7 @@ Is there anything else I can help you with?"""
             }
 
             # Log feedback for now (in production, save to database)
-            logger.info(f"Customer feedback received: {feedback_data}")
+            logger.info("Customer feedback received: %s", feedback_data)
 
             # Reset state
             self.state = "greeting"
@@ -3743,7 +3795,7 @@ Is there anything else I can help you with?"""
                 return f"🙏 Thank you for your {rating}-star rating and detailed feedback. We sincerely apologize for not meeting your expectations and truly appreciate your suggestions.\n\nWe will review your feedback carefully and work on improvements. We hope to have the opportunity to provide you with a better experience in the future. Is there anything else I can help you with today?"
 
         except Exception as e:
-            logger.error(f"Error handling feedback comment: {str(e)}")
+            logger.error("Error handling feedback comment: %s", e)
             return "Thank you for your feedback. Is there anything else I can help you with?"
 
     def detect_room_service_request(self, user_input: str) -> bool:
@@ -4071,7 +4123,7 @@ Which service do you need?"""
             return f"{response}\n{service_menu}"
 
         except Exception as e:
-            logger.error(f"Error handling invalid input redirect: {str(e)}")
+            logger.error("Error handling invalid input redirect: %s", e)
             # Fallback response
             if lang == 'zh':
                 return "我不太明白您的意思。我可以帮您预订房间、查询信息或处理其他酒店服务。您需要什么帮助？"
@@ -4341,7 +4393,7 @@ Which service interests you?"""
 What would you like to do?"""
 
         except Exception as e:
-            logger.error(f"Error handling off-topic redirect: {str(e)}")
+            logger.error("Error handling off-topic redirect: %s", e)
             return "I'm here to help with hotel services like booking, cancellation, breakfast, and airport transfers. What can I assist you with today?"
 
     def detect_service_menu_response(self, user_input: str) -> tuple[bool, str]:
@@ -4454,7 +4506,7 @@ What would you like to do?"""
                 return "I'd be happy to help! Please specify which room service you need:\n🧹 Housekeeping\n🔕 Do Not Disturb\n🍳 Room Service\n🛠️ Maintenance"
 
         except Exception as e:
-            logger.error(f"Error handling room service menu response: {str(e)}")
+            logger.error("Error handling room service menu response: %s", e)
             return "I'd be happy to help! Please specify which room service you need."
 
     def handle_service_menu_response(self, user_input: str, service_type: str, lang: str = 'en') -> str:
@@ -4480,7 +4532,7 @@ What would you like to do?"""
                 return "I'd be happy to help! Could you please specify which service you need? You can say 'book a room', 'cancel booking', 'upgrade room', 'extend stay', or 'add services'."
 
         except Exception as e:
-            logger.error(f"Error handling service menu response: {str(e)}")
+            logger.error("Error handling service menu response: %s", e)
             return "I'd be happy to help! Could you please specify which service you need?"
 
     def handle_room_service_request(self, user_input: str, lang: str = 'en') -> str:
@@ -4550,7 +4602,7 @@ You can say "housekeeping", "do not disturb", or describe what you need."""
                     return "I'll set up Do Not Disturb for you! Please provide your booking ID so I can update your room status."
 
         except Exception as e:
-            logger.error(f"Error handling room service request: {str(e)}")
+            logger.error("Error handling room service request: %s", e)
             return "Sorry, I encountered an error processing your room service request. Please try again."
 
     def handle_room_service_booking_id(self, user_input: str, lang: str = 'en') -> str:
@@ -4569,7 +4621,7 @@ You can say "housekeeping", "do not disturb", or describe what you need."""
                 return "Please provide a valid booking ID. For example: BK-12345"
 
         except Exception as e:
-            logger.error(f"Error handling room service booking ID: {str(e)}")
+            logger.error("Error handling room service booking ID: %s", e)
             return "Sorry, I encountered an error. Please provide your booking ID again."
 
     def process_room_service_request(self, booking_id: str, service_type: str, lang: str = 'en') -> str:
@@ -4578,7 +4630,7 @@ You can say "housekeeping", "do not disturb", or describe what you need."""
             from hotel_booking.models import Booking
 
             # Find booking by ID
-            booking = Booking.objects.filter(booking_id=booking_id).first()
+            booking = find_booking(booking_id)
 
             if not booking:
                 self.state = "collecting_booking_id_for_room_service"
@@ -4605,7 +4657,7 @@ You can say "housekeeping", "do not disturb", or describe what you need."""
                 return "I'm not sure what type of room service you need. Please specify if you need room cleaning or want to set Do Not Disturb."
 
         except Exception as e:
-            logger.error(f"Error processing room service request: {str(e)}")
+            logger.error("Error processing room service request: %s", e)
             return "Sorry, I encountered an error processing your room service request. Please try again."
 
     def handle_cleaning_request(self, booking, lang: str = 'en') -> str:
@@ -4615,7 +4667,7 @@ You can say "housekeeping", "do not disturb", or describe what you need."""
             return f"OK, we will arrange for the cleaner to clean your room as soon as possible.\nWhen would you like the cleaning service to be performed?\nA. Now\nB. After 2 pm\nC. Tomorrow morning"
 
         except Exception as e:
-            logger.error(f"Error handling cleaning request: {str(e)}")
+            logger.error("Error handling cleaning request: %s", e)
             return "Sorry, I encountered an error setting up your cleaning request. Please try again."
 
     def handle_cleaning_time_selection(self, user_input: str, lang: str = 'en') -> str:
@@ -4668,7 +4720,7 @@ You can say "housekeeping", "do not disturb", or describe what you need."""
                 return "Sorry, there was an error recording your cleaning request. Please contact the front desk for assistance."
 
         except Exception as e:
-            logger.error(f"Error handling cleaning time selection: {str(e)}")
+            logger.error("Error handling cleaning time selection: %s", e)
             return "Sorry, I encountered an error processing your time selection. Please try again."
 
     def handle_dnd_request(self, booking, lang: str = 'en') -> str:
@@ -4687,7 +4739,7 @@ You can say "housekeeping", "do not disturb", or describe what you need."""
                 return "Sorry, there was an error setting up Do Not Disturb. Please contact the front desk for assistance."
 
         except Exception as e:
-            logger.error(f"Error handling DND request: {str(e)}")
+            logger.error("Error handling DND request: %s", e)
             return "Sorry, I encountered an error setting up Do Not Disturb. Please try again."
 
     def create_room_service_record(self, service_type: str, booking_id: int, **kwargs) -> bool:
@@ -4697,7 +4749,7 @@ You can say "housekeeping", "do not disturb", or describe what you need."""
             from django.utils import timezone
 
             # Find the booking
-            booking = Booking.objects.get(id=booking_id)
+            booking = get_booking(booking_id)
 
             # Create room service request
             service_data = {
@@ -4715,11 +4767,12 @@ You can say "housekeeping", "do not disturb", or describe what you need."""
                 service_data['dnd_start_time'] = timezone.now()
 
             room_service = RoomServiceRequest.objects.create(**service_data)
-            logger.info(f"Room service request created: {room_service}")
+            related_changed(booking, 'room_services')
+            logger.info("Room service request created: %s", room_service)
             return True
 
         except Exception as e:
-            logger.error(f"Error creating room service record: {str(e)}")
+            logger.error("Error creating room service record: %s", e)
             return False
 
     def process(self, user_message: str, session_data: Optional[Dict] = None, user_history: Optional[List] = None) -> Tuple[str, Dict]:
@@ -4735,7 +4788,8 @@ You can say "housekeeping", "do not disturb", or describe what you need."""
             Tuple[str, Dict]: Response text and updated session data.
         """
         try:
-            logger.info(f"Processing message: {user_message}")
+            turn_logger.info("Processing message: %s", user_message)
+            self.last_intent = None
             session_data = session_data or {}
             lang = session_data.get('lang', None)
 
@@ -4745,7 +4799,9 @@ You can say "housekeeping", "do not disturb", or describe what you need."""
                 if 'user_data' in session_data:
                     self.user_data = session_data['user_data']
 
-            response = self.respond(user_message, lang)
+            # Bookings and rooms are loaded at most once per turn
+            with booking_cache():
+                response = self.respond(user_message, lang)
             session_data['state'] = self.state
             session_data['user_data'] = self.user_data
             session_data['lang'] = lang if lang else detect(user_message) if user_message else 'en'
@@ -4774,11 +4830,12 @@ You can say "housekeeping", "do not disturb", or describe what you need."""
             #     session_data['delayed_response'] = confirmation_message
             #     session_data['delay_time'] = 5
 
-            logger.info(f"Dialog manager process completed - State: {self.state}, User data: {self.user_data}")
+            turn_logger.info("Dialog manager process completed - State: %s", self.state)
+            turn_logger.debug("User data: %s", self.user_data)
 
             return response, session_data
         except Exception as e:
-            logger.error(f"Error in process method: {str(e)}")
+            logger.error("Error in process method: %s", e)
             error_msg = "Sorry, I encountered an error. Please try again later." if lang == 'en' else "抱故，我遇到了一个错误。请稍后再试。"
             return error_msg, session_data or {}
 
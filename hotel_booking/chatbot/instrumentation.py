@@ -0,0 +1,178 @@
+"""
+Per-transition SQL instrumentation for the chatbot.
+
+Every chat turn moves the conversation from one ``state`` to another (or
+keeps it where it is). ``track_transition`` counts the SQL queries and the
+time spent in the database while a turn runs, and ``transition_metrics``
+keeps running totals per ``from_state -> to_state`` pair for the process.
+
+The starting state comes from the session the client sends back, so states
+a DialogManager never enters are all recorded as ``other``; otherwise every
+made-up state would add a key to the totals and a series to the metrics.
+Intents are bounded the same way (``intent_label``).
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+from hotel_booking.metrics import chat_turn_seconds, chat_turns
+
+logger = logging.getLogger(__name__)
+
+# Every state DialogManager (dialog_manager.py) moves a conversation into
+DIALOG_STATES = frozenset({
+    'booking_confirmed', 'cancelling_booking', 'changing_date', 'collecting_additional_dates',
+    'collecting_booking_id_for_breakfast', 'collecting_booking_id_for_cancel',
+    'collecting_booking_id_for_change_date', 'collecting_booking_id_for_extend',
+    'collecting_booking_id_for_room_service', 'collecting_booking_id_for_status',
+    'collecting_booking_id_for_upgrade', 'collecting_booking_info', 'collecting_booking_info_for_status',
+    'collecting_breakfast_count', 'collecting_feedback_comment', 'collecting_feedback_rating',
+    'collecting_new_check_in_date', 'collecting_parent_booking_id', 'confirming_additional_booking',
+    'confirming_additional_dates', 'confirming_breakfast', 'confirming_cancellation', 'confirming_date_change',
+    'extending_stay', 'greeting', 'offering_addons', 'selecting_additional_room_type',
+    'selecting_booking_from_multiple', 'selecting_cleaning_time', 'selecting_extend_date',
+    'selecting_upgrade_room', 'upgrading_room',
+})
+OTHER_STATE = 'other'
+# Intents DialogManager.detect_intent() returns on top of its intents file tags
+DETECTED_INTENTS = frozenset({
+    'attractions', 'book_another_room', 'booking', 'cancel_booking', 'change_date', 'express_gratitude',
+    'extend_stay', 'food', 'greeting', 'invalid_input', 'location', 'off_topic', 'prices', 'transport',
+    'unknown', 'upgrade_room',
+})
+
+
+def state_label(state):
+    """``state`` if a DialogManager can be in it, else ``OTHER_STATE``."""
+    state = str(state)
+    return state if state in DIALOG_STATES else OTHER_STATE
+
+
+def intent_label(intent, known=()):
+    """
+    ``intent`` if DialogManager can detect it (``known`` adds the tags of its
+    intents file), ``'none'`` without one and ``OTHER_STATE`` otherwise.
+    """
+    if intent is None:
+        return 'none'
+    intent = str(intent)
+    return intent if intent in DETECTED_INTENTS or intent in known else OTHER_STATE
+
+
+class TransitionTrace:
+    """Queries executed during one chat turn."""
+
+    def __init__(self, from_state):
+        self.from_state = from_state
+        self.to_state = from_state
+        # Intent the DialogManager detected, if it ran intent detection, and
+        # the tags of its intents file (see intent_label)
+        self.intent = None
+        self.known_intents = ()
+        self.queries = []
+        self.db_time = 0.0
+        self.duration = 0.0
+
+    @property
+    def key(self):
+        return f"{self.from_state}->{self.to_state}"
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.db_time += elapsed
+            self.queries.append({'sql': sql, 'time': elapsed})
+
+
+class TransitionMetrics:
+    """Thread-safe running totals of queries and time per state transition."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._transitions = {}
+
+    def record(self, trace):
+        with self._lock:
+            stats = self._transitions.setdefault(trace.key, {
+                'from_state': trace.from_state,
+                'to_state': trace.to_state,
+                'turns': 0,
+                'queries_total': 0,
+                'queries_max': 0,
+                'db_time_total': 0.0,
+                'duration_total': 0.0,
+            })
+            stats['turns'] += 1
+            stats['queries_total'] += trace.query_count
+            stats['queries_max'] = max(stats['queries_max'], trace.query_count)
+            stats['db_time_total'] += trace.db_time
+            stats['duration_total'] += trace.duration
+
+    def snapshot(self):
+        """Copy of the current totals with per-turn averages, keyed by ``from->to``."""
+        with self._lock:
+            snapshot = {}
+            for key, stats in self._transitions.items():
+                entry = dict(stats)
+                entry['queries_mean'] = round(stats['queries_total'] / stats['turns'], 2)
+                entry['db_time_mean_ms'] = round(stats['db_time_total'] / stats['turns'] * 1000, 3)
+                entry['duration_mean_ms'] = round(stats['duration_total'] / stats['turns'] * 1000, 3)
+                snapshot[key] = entry
+            return snapshot
+
+    def reset(self):
+        with self._lock:
+            self._transitions.clear()
+
+
+transition_metrics = TransitionMetrics()
+
+# Listeners get every finished TransitionTrace (used by the test helpers)
+_listeners = []
+
+
+def add_transition_listener(listener):
+    _listeners.append(listener)
+
+
+def remove_transition_listener(listener):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+@contextmanager
+def track_transition(from_state):
+    """
+    Record the SQL queries run inside the block as one state transition.
+
+    The caller sets ``trace.to_state`` once the new state is known; if it
+    doesn't, the turn is recorded as staying in ``from_state``. Unknown
+    states are recorded as ``OTHER_STATE``.
+    """
+    trace = TransitionTrace(state_label(from_state or 'greeting'))
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(trace):
+            yield trace
+    finally:
+        trace.duration = time.perf_counter() - start
+        trace.to_state = state_label(trace.to_state)
+        trace.intent = intent_label(trace.intent, trace.known_intents)
+        transition_metrics.record(trace)
+        chat_turns.inc(trace.intent, trace.to_state)
+        chat_turn_seconds.observe(trace.duration, trace.from_state)
+        for listener in list(_listeners):
+            listener(trace)
+        logger.debug("Chat transition %s: %d queries, %.1f ms in database",
+                     trace.key, trace.query_count, trace.db_time * 1000)
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    path('hotel_booking/ws/chatbot/', consumers.ChatConsumer.as_asgi(), name='chatbot_ws'),
+]
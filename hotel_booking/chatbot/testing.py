@@ -0,0 +1,50 @@
+"""
+Test helpers for the chatbot.
+"""
+from contextlib import contextmanager
+
+from .instrumentation import add_transition_listener, remove_transition_listener
+
+
+class TransitionQueryBudgetMixin:
+    """
+    TestCase mixin asserting how many SQL queries each chat state transition may run.
+
+    Example::
+
+        with self.assertTransitionQueryBudget({'greeting->collecting_booking_id_for_cancel': 2}, default=5):
+            process_chat_message("cancel my booking", session)
+    """
+
+    @contextmanager
+    def assertTransitionQueryBudget(self, budgets=None, default=None):
+        """
+        Fail if a transition recorded inside the block runs more queries than its budget.
+
+        Args:
+            budgets (dict): Maximum queries keyed by ``"from_state->to_state"``.
+            default (int): Budget for transitions not listed in ``budgets``; unlisted
+                transitions are not checked when this is None.
+
+        Yields:
+            list: The TransitionTrace objects recorded inside the block.
+        """
+        budgets = budgets or {}
+        traces = []
+        add_transition_listener(traces.append)
+        try:
+            yield traces
+        finally:
+            remove_transition_listener(traces.append)
+
+        if not traces:
+            self.fail("No chat state transitions were recorded")
+
+        for trace in traces:
+            budget = budgets.get(trace.key, default)
+            if budget is not None and trace.query_count > budget:
+                queries = '\n'.join(
+                    f"{index}. {query['sql']}" for index, query in enumerate(trace.queries, start=1)
+                )
+                self.fail(f"Transition {trace.key} ran {trace.query_count} queries, "
+                          f"budget is {budget}:\n{queries}")
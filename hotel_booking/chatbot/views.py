@@ -1,26 +1,39 @@
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.shortcuts import render, get_object_or_404
 from django.core.mail import send_mail
 from django.conf import settings
 from django.db.models import Q
-from django.db import connection
 from django.db.utils import OperationalError
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from ..db_routing import conversation
+from ..guest_profiles import find_guest_profile, guest_payload, name_key, normalize_email, normalize_phone
+from ..metrics import availability_check_seconds, cache_lookup, email_queue_depth
 from ..models import Room, Booking
+from ..request_timing import current_timing, resume_request, timed
+from ..room_catalog import get_room_catalog
 from django.contrib.auth.models import User
 from .dialog_manager import DialogManager
+from .booking_cache import booking_cache, find_booking, find_booking_by_email, find_room, remember_booking
+from .instrumentation import track_transition, transition_metrics
 import json
 import re
 from datetime import datetime, date, timedelta
 import dateutil.parser
 import logging
 import uuid
+import copy
+from contextlib import nullcontext
 from django.utils.crypto import get_random_string
 
 # Configure logging
 logger = logging.getLogger(__name__)
+# Per-turn trace lines; high volume, so sampled in production (see LOG_SAMPLING)
+turn_logger = logging.getLogger('hotel_booking.chatbot.turns')
 
 @csrf_exempt
 @require_POST
@@ -29,176 +42,346 @@ def chatbot_api(request):
     session_data = {}  # Initialize session_data at the beginning
 
     try:
-        # Test database connection
-        connection.ensure_connection()
-        logger.info("Database connection successful")
+        # Log request with proper datetime import
+        turn_logger.info("Received chat request")
+        turn_logger.debug("Request headers: %s", request.headers)
+        turn_logger.debug("Request body: %r", request.body)
+
+        data, error_response = _load_chat_payload(request)
+        if error_response is not None:
+            return error_response
+
+        # Get user message and session data
+        user_message = data.get('message', '').strip()
+        session_data = data.get('session', {})
+        user_id = data.get('user_id')
+
+        turn_logger.info("User input: %s", user_message)
+        turn_logger.info("Current session state: %s", session_data.get('state'))
+        turn_logger.debug("Current user data: %s", session_data.get('user_data'))
+
+        user = resolve_chat_user(request.user, user_id, session_data)
+        booking_user = request.user if request.user.is_authenticated else None
+
+        response_data = process_chat_message(user_message, session_data, user=user, booking_user=booking_user)
+        return JsonResponse(response_data)
+
     except OperationalError as e:
-        logger.error(f"Database connection error: {str(e)}")
+        # Stale connections are handled by hotel_booking.db_health; this is the database being down
+        logger.error("Database connection error: %s", e)
         return JsonResponse({
             'error': 'Database connection error',
             'message': 'Sorry, we are experiencing technical difficulties. Please try again later.',
-            'session': session_data
+            'session': clean_session_for_response(session_data)
+        }, status=500)
+
+    except Exception as e:
+        logger.error("Unhandled exception in chatbot_api: %s", e)
+        import traceback
+        logger.error(traceback.format_exc())
+
+        # Clean session data for error response too
+        clean_error_session = clean_session_for_response(session_data)
+
+        return JsonResponse({
+            'message': 'Sorry, I am temporarily unable to process your request. Please provide more details such as check-in date, check-out date, and room type.',
+            'session': clean_error_session
         }, status=500)
 
+
+
+@csrf_exempt
+@require_POST
+def chatbot_stream_api(request):
+    """
+    Streaming variant of chatbot_api that sends the reply as Server-Sent Events.
+
+    A ``start`` event is flushed before the dialog turn runs so the first byte
+    reaches the guest immediately, then the reply follows as ``chunk`` events
+    and a final ``done`` event carries the session and delayed messages.
+    ASGI servers buffer synchronous bodies, so under ASGI the events come from
+    an async generator that runs the turn in a worker thread.
+    """
+    data, error_response = _load_chat_payload(request)
+    if error_response is not None:
+        return error_response
+
+    user_message = data.get('message', '').strip()
+    session_data = data.get('session', {})
+    user = resolve_chat_user(request.user, data.get('user_id'), session_data)
+    booking_user = request.user if request.user.is_authenticated else None
+
+    stream = _astream_chat_events if isinstance(request, ASGIRequest) else _stream_chat_events
+    response = StreamingHttpResponse(
+        stream(user_message, session_data, user, booking_user),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
+
+
+def _sse_event(event, payload):
+    """Encode one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def split_reply_chunks(message):
+    """Split a bot reply into line-sized chunks that keep HTML tags intact."""
+    if not message:
+        return []
+    return str(message).splitlines(keepends=True)
+
+
+def _stream_chat_events(user_message, session_data, user, booking_user):
+    """Yield the SSE events for one chat turn."""
+    yield _sse_event('start', {})
+
     try:
-        # Log request with proper datetime import
-        logger.info(f"Received chat request at {datetime.now()}")
-        logger.debug(f"Request headers: {dict(request.headers)}")
-        logger.debug(f"Request body: {request.body.decode('utf-8')}")
-
-        if not request.body:
-            logger.warning("Empty request body")
-            return JsonResponse({
-                'error': 'Bad request',
-                'message': 'Please provide a message to continue our conversation.',
-                'session': session_data
-            }, status=400)
-
-        # Parse JSON data
-        try:
-            data = json.loads(request.body)
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error: {str(e)}")
-            return JsonResponse({
-                'error': 'Invalid JSON',
-                'message': 'Sorry, there was an error processing your request. Please try again.',
-                'session': session_data
-            }, status=400)
-
-        # Validate required fields
-        if 'message' not in data:
-            logger.warning("Missing 'message' field in request")
-            return JsonResponse({
-                'error': 'Bad request',
-                'message': 'Please provide a message to continue our conversation.',
-                'session': session_data
-            }, status=400)
+        response_data = process_chat_message(user_message, session_data, user=user, booking_user=booking_user)
+    except Exception as e:
+        yield _failed_turn_event(e, session_data)
+        return
 
-        # Get user message and session data
-        user_message = data.get('message', '').strip()
-        session_data = data.get('session', {})
-        user_id = data.get('user_id')
+    yield from _reply_events(response_data)
 
-        logger.info(f"User input: {user_message}")
-        logger.info(f"Current session state: {session_data.get('state')}")
-        logger.info(f"Current user data: {session_data.get('user_data')}")
 
-        # Get current user (if authenticated)
-        user = None
-        if request.user.is_authenticated:
-            user = request.user
-            if 'user_data' not in session_data:
-                session_data['user_data'] = {}
-            session_data['user_data']['username'] = user.username
-        elif user_id:
-            try:
-                user = User.objects.get(id=user_id)
-                if 'user_data' not in session_data:
-                    session_data['user_data'] = {}
-                session_data['user_data']['username'] = user.username
-                logger.info(f"Found user by ID: {user.username} (ID: {user.id})")
-            except User.DoesNotExist:
-                logger.warning(f"User with ID {user_id} not found")
-                pass
-            except Exception as e:
-                logger.error(f"Error getting user by ID {user_id}: {str(e)}")
-                pass
+async def _astream_chat_events(user_message, session_data, user, booking_user):
+    """``_stream_chat_events`` for ASGI, with the turn run by ``sync_to_async``."""
+    yield _sse_event('start', {})
+
+    # SQL in the worker thread counts towards the request timing too
+    timing = current_timing()
+
+    def run_turn():
+        with resume_request(timing) if timing is not None else nullcontext():
+            return process_chat_message(user_message, session_data, user=user, booking_user=booking_user)
+
+    try:
+        response_data = await sync_to_async(run_turn)()
+    except Exception as e:
+        yield _failed_turn_event(e, session_data)
+        return
+
+    for event in _reply_events(response_data):
+        yield event
+
+
+def _failed_turn_event(error, session_data):
+    logger.error("Unhandled exception in chatbot_stream_api: %s", error)
+    return _sse_event('error', {
+        'message': 'Sorry, I am temporarily unable to process your request. Please try again.',
+        'session': clean_session_for_response(session_data)
+    })
+
+
+def _reply_events(response_data):
+    for chunk in split_reply_chunks(response_data['message']):
+        yield _sse_event('chunk', {'text': chunk})
+
+    yield _sse_event('done', {
+        'session': response_data['session'],
+        'delayed_messages': response_data.get('delayed_messages', [])
+    })
 
-        # Initialize DialogManager
-        dialog_manager = DialogManager()
 
-        # Check if user is a returning customer before processing
+def _load_chat_payload(request):
+    """Parse and validate the JSON body of a chat request.
+
+    Returns a ``(data, error_response)`` tuple; ``error_response`` is a
+    ready-to-return JsonResponse when the body is unusable.
+    """
+    session_data = {}
+
+    if not request.body:
+        logger.warning("Empty request body")
+        return None, JsonResponse({
+            'error': 'Bad request',
+            'message': 'Please provide a message to continue our conversation.',
+            'session': session_data
+        }, status=400)
+
+    # Parse JSON data
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError as e:
+        logger.error("JSON decode error: %s", e)
+        return None, JsonResponse({
+            'error': 'Invalid JSON',
+            'message': 'Sorry, there was an error processing your request. Please try again.',
+            'session': session_data
+        }, status=400)
+
+    # Validate required fields
+    if 'message' not in data:
+        logger.warning("Missing 'message' field in request")
+        return None, JsonResponse({
+            'error': 'Bad request',
+            'message': 'Please provide a message to continue our conversation.',
+            'session': session_data
+        }, status=400)
+
+    return data, None
+
+
+def resolve_chat_user(request_user, user_id, session_data):
+    """Return the user driving this conversation, recording the username in the session."""
+    user = None
+    if request_user.is_authenticated:
+        user = request_user
         if 'user_data' not in session_data:
             session_data['user_data'] = {}
+        session_data['user_data']['username'] = user.username
+    elif user_id:
+        try:
+            user = User.objects.get(id=user_id)
+            if 'user_data' not in session_data:
+                session_data['user_data'] = {}
+            session_data['user_data']['username'] = user.username
+            logger.info("Found user by ID: %s (ID: %s)", user.username, user.id)
+        except User.DoesNotExist:
+            logger.warning("User with ID %s not found", user_id)
+            pass
+        except Exception as e:
+            logger.error("Error getting user by ID %s: %s", user_id, e)
+            pass
 
-        # Check for returning customer by looking for previous successful bookings
-        returning_customer_info = check_returning_customer_by_context(user_message, session_data)
-        if returning_customer_info:
-            session_data['user_data']['is_returning_customer'] = True
-            # Pre-fill guest information from previous booking
-            session_data['user_data'].update({
-                'guest_name': returning_customer_info['guest_name'],
-                'email': returning_customer_info['email'],
-                'phone': returning_customer_info['phone']
-            })
-        else:
-            session_data['user_data']['is_returning_customer'] = False
-
-        # Add user information to session data for dialog manager
-        if user:
-            session_data['user_data']['user_id'] = user.id
-            session_data['user_data']['user'] = user  # Keep for dialog manager use
-
-        # Process message
-        response, updated_session = dialog_manager.process(user_message, session_data)
-
-        logger.info(f"Updated session state: {updated_session.get('state')}")
-        logger.info(f"Updated user data: {updated_session.get('user_data')}")
-        logger.info(f"Generated response: {response}")
-
-        # 只在新预订 booking_confirmed 时处理 confirmation - 更严格的重复检查
-        booking_id = updated_session.get('user_data', {}).get('booking_id')
-        previous_booking_id = session_data.get('user_data', {}).get('booking_id')
-        confirmation_already_sent = (
-            updated_session.get('user_data', {}).get('confirmation_sent', False) or
-            session_data.get('user_data', {}).get('confirmation_sent', False)
-        )
+    return user
 
-        # 检查是否是新的预订确认（不是重复的消息）
-        # 额外检查：确保这个booking_id没有被确认过
-        confirmed_booking_id = session_data.get('user_data', {}).get('confirmation_booking_id')
-
-        is_new_booking_confirmation = (
-            updated_session.get('state') == 'booking_confirmed' and
-            booking_id and
-            not confirmation_already_sent and
-            not (session_data.get('state') in ['extending_stay', 'upgrading_room', 'cancelling_booking']) and
-            (not previous_booking_id or booking_id != previous_booking_id or
-             session_data.get('state') != 'booking_confirmed') and  # 确保不是重复的确认状态
-            booking_id != confirmed_booking_id  # 确保这个booking_id没有被确认过
-        )
 
-        logger.info(f"Booking confirmation check - State: {updated_session.get('state')}, "
-                   f"Booking ID: {booking_id}, Previous ID: {previous_booking_id}, "
-                   f"Confirmation sent: {confirmation_already_sent}, "
-                   f"Will show confirmation: {is_new_booking_confirmation}")
+def clean_session_for_response(session_data):
+    """Return a JSON-serializable copy of the session (User objects removed)."""
+    clean_session = copy.deepcopy(session_data)
+    if 'user_data' in clean_session and 'user' in clean_session['user_data']:
+        del clean_session['user_data']['user']
+        turn_logger.debug("Removed User object from session for JSON serialization")
+    return clean_session
 
-        show_booking_confirmation = is_new_booking_confirmation
-        if show_booking_confirmation:
-            user_data = updated_session.get('user_data', {})
-            booking_id = user_data.get('booking_id')
 
-            logger.info(f"Sending booking confirmation for booking ID: {booking_id}")
+def process_chat_message(user_message, session_data, user=None, booking_user=None, dialog_manager=None):
+    """
+    Run one chat turn through the DialogManager and apply its booking side effects.
 
-            # 立即标记确认消息已发送，防止重复发送
-            updated_session['user_data']['confirmation_sent'] = True
-            updated_session['user_data']['confirmation_booking_id'] = booking_id  # 记录已确认的booking_id
+    Shared by the JSON API and the streaming endpoint so that both transports
+    get identical behaviour.
 
-            room_type = user_data.get('room_type')
-            room = Room.objects.filter(name__icontains=room_type).first() or Room.objects.first()
+    Args:
+        user_message (str): The guest's message.
+        session_data (dict): Conversation state sent back by the client.
+        user (User): User driving the conversation, if known.
+        booking_user (User): Authenticated user new bookings are attached to.
+        dialog_manager (DialogManager): Reuse an existing manager instead of creating one.
 
-            if room:
-                try:
-                    check_in = dateutil.parser.parse(user_data.get('check_in_date')).date()
-                    check_out = dateutil.parser.parse(user_data.get('check_out_date')).date()
-
-                    # Create booking record
-                    booking = Booking.objects.create(
-                        room=room,
-                        guest_name=user_data.get('guest_name'),
-                        guest_email=user_data.get('email'),
-                        guest_phone=user_data.get('phone', ''),
-                        check_in_date=check_in,
-                        check_out_date=check_out,
-                        status='approved',  # 使用正确的状态值
-                        user=request.user if request.user.is_authenticated else None,
-                        booking_id=booking_id  # 直接使用booking_id变量
-                    )
-
-                    logger.info(f"Created booking record: {booking.id} for booking_id: {booking_id}")
-
-                    # 生成确认消息（只发送一次）
-                    confirmation_message = f"""Your booking has been confirmed. Your booking ID is: {booking_id}. You can use this ID to check your booking status or make changes. Here are your booking details:
+    Returns:
+        dict: Response payload with ``message``, ``session`` and optional ``delayed_messages``.
+    """
+    # Queries and time are recorded per state transition (see instrumentation.py);
+    # the booking cache lets the DialogManager and the post-processing below share objects
+    # Writes during the turn keep this conversation's status lookups on the primary (db_routing.py)
+    with track_transition(session_data.get('state')) as transition, booking_cache(), conversation(session_data):
+        if dialog_manager is None:
+            dialog_manager = DialogManager()
+        response_data = _run_chat_turn(user_message, session_data, user, booking_user, dialog_manager)
+        transition.to_state = response_data['session'].get('state')
+        transition.intent = getattr(dialog_manager, 'last_intent', None)
+        transition.known_intents = getattr(dialog_manager, 'intents', ())
+    return response_data
+
+
+def _run_chat_turn(user_message, session_data, user, booking_user, dialog_manager):
+    # Check if user is a returning customer before processing
+    if 'user_data' not in session_data:
+        session_data['user_data'] = {}
+
+    # Check for returning customer by looking for previous successful bookings
+    returning_customer_info = check_returning_customer_by_context(user_message, session_data)
+    if returning_customer_info:
+        session_data['user_data']['is_returning_customer'] = True
+        # Pre-fill guest information from previous booking
+        session_data['user_data'].update({
+            'guest_name': returning_customer_info['guest_name'],
+            'email': returning_customer_info['email'],
+            'phone': returning_customer_info['phone']
+        })
+    else:
+        session_data['user_data']['is_returning_customer'] = False
+
+    # Add user information to session data for dialog manager
+    if user:
+        session_data['user_data']['user_id'] = user.id
+        session_data['user_data']['user'] = user  # Keep for dialog manager use
+
+    # Process message
+    response, updated_session = dialog_manager.process(user_message, session_data)
+
+    turn_logger.info("Updated session state: %s", updated_session.get('state'))
+    turn_logger.debug("Updated user data: %s", updated_session.get('user_data'))
+    turn_logger.info("Generated response: %s", response)
+
+    # 只在新预订 booking_confirmed 时处理 confirmation - 更严格的重复检查
+    booking_id = updated_session.get('user_data', {}).get('booking_id')
+    previous_booking_id = session_data.get('user_data', {}).get('booking_id')
+    confirmation_already_sent = (
+        updated_session.get('user_data', {}).get('confirmation_sent', False) or
+        session_data.get('user_data', {}).get('confirmation_sent', False)
+    )
+
+    # 检查是否是新的预订确认（不是重复的消息）
+    # 额外检查：确保这个booking_id没有被确认过
+    confirmed_booking_id = session_data.get('user_data', {}).get('confirmation_booking_id')
+
+    is_new_booking_confirmation = (
+        updated_session.get('state') == 'booking_confirmed' and
+        booking_id and
+        not confirmation_already_sent and
+        not (session_data.get('state') in ['extending_stay', 'upgrading_room', 'cancelling_booking']) and
+        (not previous_booking_id or booking_id != previous_booking_id or
+         session_data.get('state') != 'booking_confirmed') and  # 确保不是重复的确认状态
+        booking_id != confirmed_booking_id  # 确保这个booking_id没有被确认过
+    )
+
+    turn_logger.info("Booking confirmation check - State: %s, Booking ID: %s, Previous ID: %s, "
+                     "Confirmation sent: %s, Will show confirmation: %s",
+                     updated_session.get('state'), booking_id, previous_booking_id,
+                     confirmation_already_sent, is_new_booking_confirmation)
+
+    show_booking_confirmation = is_new_booking_confirmation
+    if show_booking_confirmation:
+        user_data = updated_session.get('user_data', {})
+        booking_id = user_data.get('booking_id')
+
+        logger.info("Sending booking confirmation for booking ID: %s", booking_id)
+
+        # 立即标记确认消息已发送，防止重复发送
+        updated_session['user_data']['confirmation_sent'] = True
+        updated_session['user_data']['confirmation_booking_id'] = booking_id  # 记录已确认的booking_id
+
+        room_type = user_data.get('room_type')
+        room = find_room(room_type) or get_room_catalog().first()
+
+        if room:
+            try:
+                check_in = dateutil.parser.parse(user_data.get('check_in_date')).date()
+                check_out = dateutil.parser.parse(user_data.get('check_out_date')).date()
+
+                # Create booking record
+                booking = Booking.objects.create(
+                    room=room,
+                    guest_name=user_data.get('guest_name'),
+                    guest_email=user_data.get('email'),
+                    guest_phone=user_data.get('phone', ''),
+                    check_in_date=check_in,
+                    check_out_date=check_out,
+                    status='approved',  # 使用正确的状态值
+                    user=booking_user,
+                    booking_id=booking_id  # 直接使用booking_id变量
+                )
+
+                remember_booking(booking)
+                logger.info("Created booking record: %s for booking_id: %s", booking.id, booking_id)
+
+                # 生成确认消息（只发送一次）
+                confirmation_message = f"""Your booking has been confirmed. Your booking ID is: {booking_id}. You can use this ID to check your booking status or make changes. Here are your booking details:
 Room Type: {room_type}
 Check-in Date: {check_in}
 Check-out Date: {check_out}
@@ -207,285 +390,270 @@ Email: {user_data.get('email')}
 Phone: {user_data.get('phone', '')}
 Is there anything else I can help you with?"""
 
-                    response = confirmation_message
-
-                    logger.info(f"Booking confirmation sent successfully for booking ID: {booking_id}")
+                response = confirmation_message
 
-                    # 重置状态，准备下次预订，但保留确认标记
-                    updated_session['state'] = 'greeting'
-                    updated_session['user_data'] = {
-                        'is_returning_customer': True,  # 保留回头客标记
-                        'confirmation_sent': True,  # 保留确认标记
-                        'confirmation_booking_id': booking_id  # 保留已确认的booking_id
-                    }
-                    dialog_manager.state = 'greeting'
-                    dialog_manager.user_data = {
-                        'is_returning_customer': True,
-                        'confirmation_sent': True,
-                        'confirmation_booking_id': booking_id
-                    }
+                logger.info("Booking confirmation sent successfully for booking ID: %s", booking_id)
 
-                    # Send confirmation email
-                    try:
-                        send_booking_confirmation(user_data)
-                    except Exception as e:
-                        logger.error(f"Failed to send confirmation email: {str(e)}")
-                except Exception as e:
-                    logger.error(f"Error creating booking record: {str(e)}")
-                    import traceback
-                    logger.error(f"Full traceback: {traceback.format_exc()}")
-                    # 如果预订创建失败，不要发送确认消息
-                    show_booking_confirmation = False
-
-        # Handle booking cancellation
-        if updated_session.get('state') == 'cancelling_booking':
-            user_data = updated_session.get('user_data', {})
-            booking_id = user_data.get('cancel_booking_id')
-            email = user_data.get('cancel_email')
-
-            try:
-                booking = None
-                if booking_id:
-                    booking = Booking.objects.filter(booking_id=booking_id).first()
-                elif email:
-                    booking = Booking.objects.filter(guest_email=email).first()
-
-                if booking:
-                    booking.status = 'cancelled'
-                    booking.save()
-                    response = f"Your booking {booking.booking_id or booking.id} has been successfully cancelled. You will receive a confirmation email shortly."
-                    logger.info(f"Booking cancelled: {booking.id}")
-                else:
-                    response = "Sorry, we couldn't find your booking. Please check your booking ID or email address and try again."
-
-                # 添加状态重置逻辑
+                # 重置状态，准备下次预订，但保留确认标记
                 updated_session['state'] = 'greeting'
-                updated_session['user_data'] = {}
+                updated_session['user_data'] = {
+                    'is_returning_customer': True,  # 保留回头客标记
+                    'confirmation_sent': True,  # 保留确认标记
+                    'confirmation_booking_id': booking_id  # 保留已确认的booking_id
+                }
                 dialog_manager.state = 'greeting'
-                dialog_manager.user_data = {}
+                dialog_manager.user_data = {
+                    'is_returning_customer': True,
+                    'confirmation_sent': True,
+                    'confirmation_booking_id': booking_id
+                }
 
+                # Send confirmation email
+                try:
+                    send_booking_confirmation(user_data)
+                except Exception as e:
+                    logger.error("Failed to send confirmation email: %s", e)
             except Exception as e:
-                logger.error(f"Error cancelling booking: {str(e)}")
-                response = "Sorry, there was an error processing your cancellation. Please try again later or contact customer service."
-                # 即使出错也要重置状态
-                updated_session['state'] = 'greeting'
-                updated_session['user_data'] = {}
-                dialog_manager.state = 'greeting'
-                dialog_manager.user_data = {}
+                logger.error("Error creating booking record: %s", e)
+                import traceback
+                logger.error("Full traceback: %s", traceback.format_exc())
+                # 如果预订创建失败，不要发送确认消息
+                show_booking_confirmation = False
+
+    # Handle booking cancellation
+    if updated_session.get('state') == 'cancelling_booking':
+        user_data = updated_session.get('user_data', {})
+        booking_id = user_data.get('cancel_booking_id')
+        email = user_data.get('cancel_email')
 
-        # Handle room upgrade
-        if updated_session.get('state') == 'upgrading_room':
-            user_data = updated_session.get('user_data', {})
-            booking_id = user_data.get('upgrade_booking_id')
-            email = user_data.get('upgrade_email')
-            new_room_type = user_data.get('new_room_type')
+        try:
+            booking = None
+            if booking_id:
+                booking = find_booking(booking_id)
+            elif email:
+                booking = find_booking_by_email(email)
+
+            if booking:
+                booking.status = 'cancelled'
+                booking.save()
+                response = f"Your booking {booking.booking_id or booking.id} has been successfully cancelled. You will receive a confirmation email shortly."
+                logger.info("Booking cancelled: %s", booking.id)
+            else:
+                response = "Sorry, we couldn't find your booking. Please check your booking ID or email address and try again."
+
+            # 添加状态重置逻辑
+            updated_session['state'] = 'greeting'
+            updated_session['user_data'] = {}
+            dialog_manager.state = 'greeting'
+            dialog_manager.user_data = {}
+
+        except Exception as e:
+            logger.error("Error cancelling booking: %s", e)
+            response = "Sorry, there was an error processing your cancellation. Please try again later or contact customer service."
+            # 即使出错也要重置状态
+            updated_session['state'] = 'greeting'
+            updated_session['user_data'] = {}
+            dialog_manager.state = 'greeting'
+            dialog_manager.user_data = {}
+
+    # Handle room upgrade
+    if updated_session.get('state') == 'upgrading_room':
+        user_data = updated_session.get('user_data', {})
+        booking_id = user_data.get('upgrade_booking_id')
+        email = user_data.get('upgrade_email')
+        new_room_type = user_data.get('new_room_type')
 
-            try:
-                booking = None
-                if booking_id:
-                    booking = Booking.objects.filter(booking_id=booking_id).first()
-                elif email:
-                    booking = Booking.objects.filter(guest_email=email).first()
-
-                if booking and new_room_type:
-                    new_room = Room.objects.filter(name__icontains=new_room_type).first()
-                    if new_room:
-                        old_room = booking.room.name
-                        booking.room = new_room
-                        booking.save()
-                        response = f"Your room has been successfully upgraded from {old_room} to {new_room.name}. You will receive a confirmation email shortly."
-                        logger.info(f"Room upgraded for booking: {booking.id}")
-                    else:
-                        response = f"Sorry, we don't have {new_room_type} rooms available. Please choose from our available room types."
+        try:
+            booking = None
+            if booking_id:
+                booking = find_booking(booking_id)
+            elif email:
+                booking = find_booking_by_email(email)
+
+            if booking and new_room_type:
+                new_room = find_room(new_room_type)
+                if new_room:
+                    old_room = booking.room.name
+                    booking.room = new_room
+                    booking.save()
+                    response = f"Your room has been successfully upgraded from {old_room} to {new_room.name}. You will receive a confirmation email shortly."
+                    logger.info("Room upgraded for booking: %s", booking.id)
                 else:
-                    response = "Sorry, we couldn't find your booking. Please check your booking ID or email address and try again."
-            except Exception as e:
-                logger.error(f"Error upgrading room: {str(e)}")
-                response = "Sorry, there was an error processing your room upgrade. Please try again later or contact customer service."
-                # 即使出错也要重置状态
-                updated_session['state'] = 'greeting'
-                updated_session['user_data'] = {}
-                dialog_manager.state = 'greeting'
-                dialog_manager.user_data = {}
-
-        # Handle date change
-        if updated_session.get('state') == 'changing_date':
-            user_data = updated_session.get('user_data', {})
-            booking_id = user_data.get('change_booking_id')
-            email = user_data.get('change_email')
-            new_check_in = user_data.get('new_check_in_date')  # 字段名已经正确
-            new_check_out = user_data.get('new_check_out_date')  # 添加check_out_date支持
+                    response = f"Sorry, we don't have {new_room_type} rooms available. Please choose from our available room types."
+            else:
+                response = "Sorry, we couldn't find your booking. Please check your booking ID or email address and try again."
+        except Exception as e:
+            logger.error("Error upgrading room: %s", e)
+            response = "Sorry, there was an error processing your room upgrade. Please try again later or contact customer service."
+            # 即使出错也要重置状态
+            updated_session['state'] = 'greeting'
+            updated_session['user_data'] = {}
+            dialog_manager.state = 'greeting'
+            dialog_manager.user_data = {}
+
+    # Handle date change
+    if updated_session.get('state') == 'changing_date':
+        user_data = updated_session.get('user_data', {})
+        booking_id = user_data.get('change_booking_id')
+        email = user_data.get('change_email')
+        new_check_in = user_data.get('new_check_in_date')  # 字段名已经正确
+        new_check_out = user_data.get('new_check_out_date')  # 添加check_out_date支持
 
-            try:
-                booking = None
-                if booking_id:
-                    booking = Booking.objects.filter(booking_id=booking_id).first()
-                elif email:
-                    booking = Booking.objects.filter(guest_email=email).first()
-
-                if booking and new_check_in:
-                    today = date.today()
-                    days_until_checkin = (booking.check_in_date - today).days
-
-                    if days_until_checkin >= 3:
-                        try:
-                            new_check_in_date = dateutil.parser.parse(new_check_in).date()
-                            # 如果提供了新的check_out日期，使用它；否则保持原有的住宿天数
-                            if new_check_out:
-                                new_check_out_date = dateutil.parser.parse(new_check_out).date()
-                            else:
-                                duration = (booking.check_out_date - booking.check_in_date).days
-                                new_check_out_date = new_check_in_date + timedelta(days=duration)
+        try:
+            booking = None
+            if booking_id:
+                booking = find_booking(booking_id)
+            elif email:
+                booking = find_booking_by_email(email)
 
-                            # Check room availability for new dates
-                            available, message = check_room_availability(booking.room.name, new_check_in_date, new_check_out_date)
+            if booking and new_check_in:
+                today = date.today()
+                days_until_checkin = (booking.check_in_date - today).days
 
-                            if available:
-                                booking.check_in_date = new_check_in_date
-                                booking.check_out_date = new_check_out_date
-                                booking.save()
-                                response = f"Your check-in date has been successfully changed to {new_check_in_date}. Your new check-out date is {new_check_out_date}."
-                                logger.info(f"Check-in date changed for booking: {booking.id}")
-                            else:
-                                response = f"Sorry, your room is not available for the new dates. {message}"
-                        except Exception as e:
-                            logger.error(f"Error parsing new date: {str(e)}")
-                            response = "Sorry, please provide a valid date in the format YYYY-MM-DD."
-                    else:
-                        response = "Sorry, check-in date changes are only allowed at least 3 days before your original check-in date."
+                if days_until_checkin >= 3:
+                    try:
+                        new_check_in_date = dateutil.parser.parse(new_check_in).date()
+                        # 如果提供了新的check_out日期，使用它；否则保持原有的住宿天数
+                        if new_check_out:
+                            new_check_out_date = dateutil.parser.parse(new_check_out).date()
+                        else:
+                            duration = (booking.check_out_date - booking.check_in_date).days
+                            new_check_out_date = new_check_in_date + timedelta(days=duration)
+
+                        # Check room availability for new dates
+                        available, message = check_room_availability(booking.room.name, new_check_in_date, new_check_out_date)
+
+                        if available:
+                            booking.check_in_date = new_check_in_date
+                            booking.check_out_date = new_check_out_date
+                            booking.save()
+                            response = f"Your check-in date has been successfully changed to {new_check_in_date}. Your new check-out date is {new_check_out_date}."
+                            logger.info("Check-in date changed for booking: %s", booking.id)
+                        else:
+                            response = f"Sorry, your room is not available for the new dates. {message}"
+                    except Exception as e:
+                        logger.error("Error parsing new date: %s", e)
+                        response = "Sorry, please provide a valid date in the format YYYY-MM-DD."
                 else:
-                    response = "Sorry, we couldn't find your booking. Please check your booking ID or email address and try again."
+                    response = "Sorry, check-in date changes are only allowed at least 3 days before your original check-in date."
+            else:
+                response = "Sorry, we couldn't find your booking. Please check your booking ID or email address and try again."
+
+            # 添加状态重置逻辑
+            updated_session['state'] = 'greeting'
+            updated_session['user_data'] = {}
+            dialog_manager.state = 'greeting'
+            dialog_manager.user_data = {}
+
+        except Exception as e:
+            logger.error("Error changing date: %s", e)
+            response = "Sorry, there was an error processing your date change. Please try again later or contact customer service."
+            # 即使出错也要重置状态
+            updated_session['state'] = 'greeting'
+            updated_session['user_data'] = {}
+            dialog_manager.state = 'greeting'
+            dialog_manager.user_data = {}
+
+    # Handle stay extension
+    if updated_session.get('state') == 'extending_stay':
+        user_data = updated_session.get('user_data', {})
+        booking_id = user_data.get('extend_booking_id')
+        email = user_data.get('extend_email')
+        additional_nights = user_data.get('additional_nights')
+        # 修复：同时检查两个字段名
+        new_checkout_date = user_data.get('new_checkout_date') or user_data.get('extend_until_date')
 
-                # 添加状态重置逻辑
-                updated_session['state'] = 'greeting'
-                updated_session['user_data'] = {}
-                dialog_manager.state = 'greeting'
-                dialog_manager.user_data = {}
+        try:
+            booking = None
+            if booking_id:
+                booking = find_booking(booking_id)
+            elif email:
+                booking = find_booking_by_email(email)
 
-            except Exception as e:
-                logger.error(f"Error changing date: {str(e)}")
-                response = "Sorry, there was an error processing your date change. Please try again later or contact customer service."
-                # 即使出错也要重置状态
-                updated_session['state'] = 'greeting'
-                updated_session['user_data'] = {}
-                dialog_manager.state = 'greeting'
-                dialog_manager.user_data = {}
+            if booking:
+                today = date.today()
 
-        # Handle stay extension
-        if updated_session.get('state') == 'extending_stay':
-            user_data = updated_session.get('user_data', {})
-            booking_id = user_data.get('extend_booking_id')
-            email = user_data.get('extend_email')
-            additional_nights = user_data.get('additional_nights')
-            # 修复：同时检查两个字段名
-            new_checkout_date = user_data.get('new_checkout_date') or user_data.get('extend_until_date')
+                # Check if guest is currently checked in or will check in soon
+                if booking.check_in_date <= today <= booking.check_out_date or booking.check_in_date > today:
+                    try:
+                        if not additional_nights and not new_checkout_date:
+                            response = "Please specify either the number of additional nights or your new checkout date."
+                        else:
+                            if additional_nights:
+                                nights = int(additional_nights)
+                                new_checkout = booking.check_out_date + timedelta(days=nights)
+                            elif new_checkout_date:
+                                new_checkout = dateutil.parser.parse(new_checkout_date).date()
+                                nights = (new_checkout - booking.check_out_date).days
+
+                            # Check room availability for extended period
+                            available, message = check_room_availability(booking.room.name, booking.check_out_date, new_checkout)
 
-            try:
-                booking = None
-                if booking_id:
-                    booking = Booking.objects.filter(booking_id=booking_id).first()
-                elif email:
-                    booking = Booking.objects.filter(guest_email=email).first()
-
-                if booking:
-                    today = date.today()
-
-                    # Check if guest is currently checked in or will check in soon
-                    if booking.check_in_date <= today <= booking.check_out_date or booking.check_in_date > today:
-                        try:
-                            if not additional_nights and not new_checkout_date:
-                                response = "Please specify either the number of additional nights or your new checkout date."
+                            if available:
+                                additional_cost = booking.room.price * nights
+                                booking.check_out_date = new_checkout
+                                booking.save()
+                                response = f"Your stay has been successfully extended to {new_checkout}. Additional cost: RM{additional_cost}. You will receive a confirmation email shortly."
+                                logger.info("Stay extended for booking: %s", booking.id)
                             else:
-                                if additional_nights:
-                                    nights = int(additional_nights)
-                                    new_checkout = booking.check_out_date + timedelta(days=nights)
-                                elif new_checkout_date:
-                                    new_checkout = dateutil.parser.parse(new_checkout_date).date()
-                                    nights = (new_checkout - booking.check_out_date).days
-
-                                # Check room availability for extended period
-                                available, message = check_room_availability(booking.room.name, booking.check_out_date, new_checkout)
-
-                                if available:
-                                    additional_cost = booking.room.price * nights
-                                    booking.check_out_date = new_checkout
-                                    booking.save()
-                                    response = f"Your stay has been successfully extended to {new_checkout}. Additional cost: RM{additional_cost}. You will receive a confirmation email shortly."
-                                    logger.info(f"Stay extended for booking: {booking.id}")
-                                else:
-                                    response = f"Sorry, your room is not available for the extended period. {message}"
-                        except (ValueError, TypeError) as e:
-                            logger.error(f"Error parsing extension details: {str(e)}")
-                            response = "Sorry, please provide a valid number of nights or checkout date."
-                            # 即使出错也要重置状态
-                            updated_session['state'] = 'greeting'
-                            updated_session['user_data'] = {}
-                            dialog_manager.state = 'greeting'
-                            dialog_manager.user_data = {}
-                    else:
-                        response = "Sorry, stay extensions are only available for current guests or upcoming bookings."
-                        # 重置状态
+                                response = f"Sorry, your room is not available for the extended period. {message}"
+                    except (ValueError, TypeError) as e:
+                        logger.error("Error parsing extension details: %s", e)
+                        response = "Sorry, please provide a valid number of nights or checkout date."
+                        # 即使出错也要重置状态
                         updated_session['state'] = 'greeting'
                         updated_session['user_data'] = {}
                         dialog_manager.state = 'greeting'
                         dialog_manager.user_data = {}
                 else:
-                    response = "Sorry, we couldn't find your booking. Please check your booking ID or email address and try again."
+                    response = "Sorry, stay extensions are only available for current guests or upcoming bookings."
                     # 重置状态
                     updated_session['state'] = 'greeting'
                     updated_session['user_data'] = {}
                     dialog_manager.state = 'greeting'
                     dialog_manager.user_data = {}
-            except Exception as e:
-                logger.error(f"Error extending stay: {str(e)}")
-                response = "Sorry, there was an error processing your stay extension. Please try again later or contact customer service."
-                # 即使出错也要重置状态
+            else:
+                response = "Sorry, we couldn't find your booking. Please check your booking ID or email address and try again."
+                # 重置状态
                 updated_session['state'] = 'greeting'
                 updated_session['user_data'] = {}
                 dialog_manager.state = 'greeting'
                 dialog_manager.user_data = {}
+        except Exception as e:
+            logger.error("Error extending stay: %s", e)
+            response = "Sorry, there was an error processing your stay extension. Please try again later or contact customer service."
+            # 即使出错也要重置状态
+            updated_session['state'] = 'greeting'
+            updated_session['user_data'] = {}
+            dialog_manager.state = 'greeting'
+            dialog_manager.user_data = {}
 
-        # Clean session data for JSON serialization (remove User objects)
-        import copy
-        clean_session = copy.deepcopy(updated_session)
-        if 'user_data' in clean_session and 'user' in clean_session['user_data']:
-            del clean_session['user_data']['user']
-            logger.info("Removed User object from session for JSON serialization")
+    # Prepare response data
+    response_data = {
+        'message': response,
+        'session': clean_session_for_response(updated_session)
+    }
 
-        # Prepare response data
-        response_data = {
-            'message': response,
-            'session': clean_session
-        }
+    # Add delayed messages if present
+    if hasattr(dialog_manager, 'delayed_messages') and dialog_manager.delayed_messages:
+        response_data['delayed_messages'] = dialog_manager.delayed_messages
 
-        # Add delayed messages if present
-        if hasattr(dialog_manager, 'delayed_messages') and dialog_manager.delayed_messages:
-            response_data['delayed_messages'] = dialog_manager.delayed_messages
+    return response_data
 
-        return JsonResponse(response_data)
-
-    except Exception as e:
-        logger.error(f"Unhandled exception in chatbot_api: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
-
-        # Clean session data for error response too
-        import copy
-        clean_error_session = copy.deepcopy(session_data)
-        if 'user_data' in clean_error_session and 'user' in clean_error_session['user_data']:
-            del clean_error_session['user_data']['user']
-
-        return JsonResponse({
-            'message': 'Sorry, I am temporarily unable to process your request. Please provide more details such as check-in date, check-out date, and room type.',
-            'session': clean_error_session
-        }, status=500)
 
 @login_required
 def chatbot_view(request):
     """Render the chatbot interface - requires user authentication"""
-    rooms = Room.objects.all()
+    rooms = get_room_catalog().all()
     return render(request, 'hotel_booking/chatbot.html', {'rooms': rooms})
 
+
+@staff_member_required
+def chatbot_metrics(request):
+    """Per state-transition SQL query counts and timings for this process (staff only)"""
+    return JsonResponse({'transitions': transition_metrics.snapshot()})
+
+
 def send_booking_confirmation(session):
     """Send booking confirmation email"""
     try:
@@ -506,21 +674,23 @@ We look forward to welcoming you to our hotel.
 Best regards,
 Hotel Management
 """
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [session['email']],
-            fail_silently=False,
-        )
+        with timed('email'), email_queue_depth.track_inprogress():
+            send_mail(
+                subject,
+                message,
+                settings.DEFAULT_FROM_EMAIL,
+                [session['email']],
+                fail_silently=False,
+            )
     except Exception as e:
-        logger.error(f"Error sending email: {str(e)}")
+        logger.error("Error sending email: %s", e)
 
+@availability_check_seconds.time()
 def check_room_availability(room_type, check_in_date, check_out_date):
     """Check if rooms of the specified type are available for the given dates"""
     try:
-        rooms = Room.objects.filter(name__icontains=room_type)
-        if not rooms.exists():
+        rooms = get_room_catalog().rooms_of_type(room_type)
+        if not rooms:
             return False, "No rooms of this type found"
 
         overlapping_bookings = Booking.objects.filter(
@@ -530,7 +700,7 @@ def check_room_availability(room_type, check_in_date, check_out_date):
             Q(check_in_date__lt=check_out_date) & Q(check_out_date__gt=check_in_date)
         )
 
-        available_count = rooms.count() - overlapping_bookings.count()
+        available_count = len(rooms) - overlapping_bookings.count()
         if available_count > 0:
             return True, f"{available_count} {room_type} room(s) available"
         else:
@@ -542,7 +712,7 @@ def create_booking(session, user=None):
     """Create a booking from session data"""
     try:
         room_type = session.get('room_type')
-        room = Room.objects.filter(name__icontains=room_type).first() or Room.objects.first()
+        room = find_room(room_type) or get_room_catalog().first()
         if not room:
             raise Exception("No rooms available")
 
@@ -575,72 +745,70 @@ def create_booking(session, user=None):
         session['total_cost'] = total_cost
         return booking.booking_id
     except Exception as e:
-        logger.error(f"Error creating booking: {str(e)}")
+        logger.error("Error creating booking: %s", e)
         return f"BK-ERR-{uuid.uuid4().hex[:8].upper()}"
 
 
-def check_returning_customer_by_context(user_message, session_data):
-    """
-    Check if user is a returning customer by analyzing the message context
-    and looking for previous bookings in the database.
-    """
-    import re
+# Per-conversation returning-customer lookups, kept in the session the client sends back
+RETURNING_CUSTOMER_SESSION_KEY = 'returning_customer'
+# Identifiers remembered as already looked up, per conversation
+MAX_CHECKED_IDENTIFIERS = 20
 
-    # Extract email from user message if present
-    email_pattern = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
-    email_match = email_pattern.search(user_message)
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+# International (+60...) or local (01...) numbers; dates and booking IDs don't start with either
+PHONE_PATTERN = re.compile(r'(?<!\w)(\+\d[\d\s-]{6,16}\d|0\d[\d\s-]{5,15}\d)(?!\w)')
+NAME_PATTERNS = [
+    re.compile(r'\b(?:I am|I\'m|My name is|This is)\s+([A-Za-z]+(?:\s+[A-Za-z]+)?)\b', re.IGNORECASE),
+    re.compile(r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)\s+(?:here|speaking|again)\b', re.IGNORECASE),
+]
 
-    # Extract name patterns (common names that might indicate returning customer)
-    name_patterns = [
-        r'\b(?:I am|I\'m|My name is|This is)\s+([A-Za-z]+(?:\s+[A-Za-z]+)?)\b',
-        r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)\s+(?:here|speaking|again)\b'
-    ]
 
-    potential_name = None
-    for pattern in name_patterns:
-        name_match = re.search(pattern, user_message, re.IGNORECASE)
+def _guest_identifiers(user_message, session_data):
+    """(kind, value) pairs that could identify a returning guest, most specific first."""
+    identifiers = []
+    email_match = EMAIL_PATTERN.search(user_message)
+    if email_match:
+        identifiers.append(('email', normalize_email(email_match.group())))
+    phone_match = PHONE_PATTERN.search(user_message)
+    if phone_match and normalize_phone(phone_match.group(1)):
+        identifiers.append(('phone', normalize_phone(phone_match.group(1))))
+    for pattern in NAME_PATTERNS:
+        name_match = pattern.search(user_message)
         if name_match:
-            potential_name = name_match.group(1).strip()
+            identifiers.append(('name', name_key(name_match.group(1))))
             break
-
-    # Check database for previous bookings
-    if email_match:
-        email = email_match.group()
-        previous_booking = Booking.objects.filter(
-            guest_email=email,
-            status__in=['approved', 'completed']
-        ).first()
-        if previous_booking:
-            return {
-                'guest_name': previous_booking.guest_name,
-                'email': previous_booking.guest_email,
-                'phone': previous_booking.guest_phone or ''
-            }
-
-    if potential_name:
-        previous_booking = Booking.objects.filter(
-            guest_name__icontains=potential_name,
-            status__in=['approved', 'completed']
-        ).first()
-        if previous_booking:
-            return {
-                'guest_name': previous_booking.guest_name,
-                'email': previous_booking.guest_email,
-                'phone': previous_booking.guest_phone or ''
-            }
-
-    # Check session data for any stored user info that might indicate returning customer
-    stored_email = session_data.get('user_data', {}).get('email')
+    # Email collected earlier in the conversation (e.g. while booking)
+    stored_email = normalize_email(session_data.get('user_data', {}).get('email'))
     if stored_email:
-        previous_booking = Booking.objects.filter(
-            guest_email=stored_email,
-            status__in=['approved', 'completed']
-        ).first()
-        if previous_booking:
-            return {
-                'guest_name': previous_booking.guest_name,
-                'email': previous_booking.guest_email,
-                'phone': previous_booking.guest_phone or ''
-            }
-
-    return None
\ No newline at end of file
+        identifiers.append(('email', stored_email))
+    return identifiers
+
+
+def check_returning_customer_by_context(user_message, session_data):
+    """
+    Check if user is a returning customer by looking up the identifiers
+    (email, phone number, name) in the message in the GuestProfile table.
+
+    Each identifier is looked up once per conversation: identifiers already
+    checked and the guest found are kept in the session, so messages without
+    a new identifier cost no queries.
+    """
+    cached = session_data.get(RETURNING_CUSTOMER_SESSION_KEY)
+    if not isinstance(cached, dict):
+        cached = {'checked': [], 'guest': None}
+        session_data[RETURNING_CUSTOMER_SESSION_KEY] = cached
+
+    for kind, value in _guest_identifiers(user_message, session_data):
+        key = f"{kind}:{value}"
+        checked = key in cached['checked']
+        cache_lookup('returning_customer', checked)
+        if checked:
+            continue
+        cached['checked'] = (cached['checked'] + [key])[-MAX_CHECKED_IDENTIFIERS:]
+        profile = find_guest_profile(**{kind: value})
+        if profile:
+            cached['guest'] = guest_payload(profile)
+            logger.info("Recognised returning customer by %s", kind)
+            break
+
+    return cached['guest']
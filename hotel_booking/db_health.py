@@ -0,0 +1,98 @@
+"""
+Liveness checks for persistent database connections.
+
+Django's ``CONN_HEALTH_CHECKS`` pings a reused connection before the first
+query of every request, which on a MySQL/PostgreSQL server is one extra
+round trip per request. The server profiles in ``project/database.py`` turn
+that off and rely on this module instead, which only checks a connection
+when it may have gone stale:
+
+* after it sat idle between requests for more than ``DB_IDLE_CHECK_SECONDS``
+  (server ``wait_timeout``, failovers, firewalls dropping idle sockets);
+* after a query on it failed. Django's own request-start handler already
+  re-checks such connections (``errors_occurred``) and closes broken ones.
+
+A connection that drops between the check and the query can still fail a
+read; ``retry_read()`` reconnects and runs idempotent reads once more.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, InterfaceError, OperationalError, connections
+from django.dispatch import receiver
+
+from .metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IDLE_CHECK_SECONDS = 30.0
+
+reconnects = Counter(
+    'hotel_db_reconnects_total', 'Database connections dropped and reopened, by alias and reason.',
+    ('alias', 'reason'),
+)
+
+
+def _idle_limit():
+    return getattr(settings, 'DB_IDLE_CHECK_SECONDS', DEFAULT_IDLE_CHECK_SECONDS)
+
+
+def check_connection(conn, now=None, idle_limit=None):
+    """
+    Close ``conn`` if it was idle for longer than ``idle_limit`` and no longer answers.
+
+    Returns True when the connection was closed; the next query reconnects.
+    """
+    if conn.connection is None or conn.in_atomic_block:
+        return False
+    last_used = getattr(conn, 'health_last_used', None)
+    now = time.monotonic() if now is None else now
+    idle_limit = _idle_limit() if idle_limit is None else idle_limit
+    if last_used is None or now - last_used <= idle_limit:
+        return False
+    if conn.is_usable():
+        return False
+    logger.warning("Database connection %r went away after %.0fs idle; reconnecting", conn.alias, now - last_used)
+    conn.close()
+    reconnects.inc(conn.alias, 'idle')
+    return True
+
+
+@receiver(request_started, dispatch_uid='hotel_booking.db_health.check')
+def check_connections(**kwargs):
+    now = time.monotonic()
+    for conn in connections.all(initialized_only=True):
+        check_connection(conn, now)
+
+
+@receiver(request_finished, dispatch_uid='hotel_booking.db_health.idle')
+def mark_idle(**kwargs):
+    now = time.monotonic()
+    for conn in connections.all(initialized_only=True):
+        if conn.connection is not None:
+            conn.health_last_used = now
+
+
+def retry_read(func, *args, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    ``func(*args, **kwargs)``, run once more on a new connection if the first
+    attempt failed because the connection was lost.
+
+    Only for reads that are safe to repeat. ``using`` must be the alias the
+    read runs on (``queryset.db``; the router may pick the replica). Inside a
+    transaction, or when the connection still answers (a lock timeout, a bad
+    query), the error is raised as is.
+    """
+    try:
+        return func(*args, **kwargs)
+    except (InterfaceError, OperationalError) as e:
+        conn = connections[using]
+        if conn.in_atomic_block or (conn.connection is not None and conn.is_usable()):
+            raise
+        logger.warning("Database connection %r lost during a read (%s); retrying", using, e)
+        conn.close()
+        reconnects.inc(using, 'read_retry')
+        return func(*args, **kwargs)
+
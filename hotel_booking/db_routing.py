@@ -0,0 +1,115 @@
+"""
+Primary/replica routing for read-only lookups.
+
+Nothing reads from the replica unless it asks to: chatbot status inquiries,
+room listings and staff dashboards run inside ``replica_reads()``, and only
+for this app's models (sessions and users always use the primary). Every
+write goes to the primary, and once a block has written, its remaining reads
+do too.
+
+Read-your-writes across requests: writes inside a ``conversation(store)``
+block record a deadline in ``store`` (the chat session dict sent back by the
+client, or ``request.session`` for staff; see ``ReadYourWritesMiddleware``).
+Until it passes, ``replica_reads()`` for that conversation stays on the
+primary, so a guest asking for the status of the booking they just made
+doesn't miss it because of replication lag.
+
+Without a ``replica`` entry in DATABASES everything uses the primary.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_ALIAS = 'replica'
+# Key in the conversation store holding the time.time() until which reads stay on the primary
+PRIMARY_UNTIL_KEY = 'db_primary_until'
+ROUTED_APPS = frozenset({'hotel_booking'})
+DEFAULT_STICKY_SECONDS = 10.0
+
+
+class _Scope:
+    __slots__ = ('store', 'replica')
+
+    def __init__(self, store):
+        self.store = store
+        self.replica = False
+
+
+_scope = ContextVar('db_routing_scope', default=None)
+
+
+def replica_available():
+    return REPLICA_ALIAS in connections.settings
+
+
+def pinned_to_primary(store):
+    """Whether the conversation behind ``store`` wrote too recently to read from the replica."""
+    if store is None:
+        return False
+    # The chat session comes back from the client, so the deadline may be anything
+    try:
+        return float(store.get(PRIMARY_UNTIL_KEY, 0)) > time.time()
+    except (TypeError, ValueError):
+        return False
+
+
+def pin_to_primary(store):
+    """Keep the conversation behind ``store`` on the primary for REPLICA_STICKY_SECONDS."""
+    sticky = getattr(settings, 'REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS)
+    store[PRIMARY_UNTIL_KEY] = time.time() + sticky
+
+
+@contextmanager
+def conversation(store):
+    """Pin ``store`` to the primary whenever a routed model is written inside the block."""
+    token = _scope.set(_Scope(store))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+@contextmanager
+def replica_reads():
+    """
+    Send reads in the block to the replica, unless the current conversation
+    wrote recently. Also usable as a decorator.
+    """
+    outer = _scope.get()
+    scope = _Scope(outer.store if outer is not None else None)
+    scope.replica = replica_available() and not pinned_to_primary(scope.store)
+    token = _scope.set(scope)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Reads inside ``replica_reads()`` go to the replica; writes always go to the primary."""
+
+    def db_for_read(self, model, **hints):
+        scope = _scope.get()
+        if scope is not None and scope.replica and model._meta.app_label in ROUTED_APPS:
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS:
+            return None
+        scope = _scope.get()
+        if scope is not None:
+            scope.replica = False
+            if scope.store is not None:
+                pin_to_primary(scope.store)
+        # Explicit, or Django would save an instance read from the replica back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, REPLICA_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
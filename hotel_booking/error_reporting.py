@@ -0,0 +1,131 @@
+"""
+Grouping and rate limiting of unhandled exceptions.
+
+``ExceptionMiddleware`` (in ``middleware.py``) reports every unhandled
+exception here. Exceptions are grouped by a fingerprint of their type and the
+code locations in their traceback, which is computed from the frames without
+formatting anything. The first exception of a group is logged with its
+traceback; identical ones within ``EXCEPTION_LOG_INTERVAL`` seconds are only
+counted, and the next logged one says how many were skipped. During an error
+storm (e.g. "database is locked" on every request) that is one formatted
+traceback per group and interval instead of one per request.
+"""
+import hashlib
+import logging
+import threading
+import time
+import traceback
+
+from django.conf import settings
+
+from .metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_INTERVAL = 60.0
+# Groups kept in memory; the least recently seen are dropped beyond this
+DEFAULT_MAX_GROUPS = 500
+
+# Fingerprints are unbounded, so they are only in the logs and exception_report
+exceptions_total = Counter(
+    'hotel_exceptions_total', 'Unhandled exceptions by type.',
+    ('type',),
+)
+
+
+def fingerprint(exception):
+    """Short hash of the exception type and the (file, function, line) of each traceback frame."""
+    parts = [f'{type(exception).__module__}.{type(exception).__qualname__}']
+    for frame, lineno in traceback.walk_tb(exception.__traceback__):
+        parts.append(f'{frame.f_code.co_filename}:{frame.f_code.co_name}:{lineno}')
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:12]
+
+
+def format_exception(exception):
+    return ''.join(traceback.format_exception(type(exception), exception, exception.__traceback__))
+
+
+class ExceptionGroups:
+    """Thread-safe counters per exception fingerprint for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groups = {}
+
+    def record(self, exception, fingerprint):
+        """
+        Count ``exception`` in its group.
+
+        Returns:
+            int or None: Exceptions of the group skipped since it was last
+            logged, or None if this one should not be logged either.
+        """
+        interval = getattr(settings, 'EXCEPTION_LOG_INTERVAL', DEFAULT_LOG_INTERVAL)
+        now = time.monotonic()
+        with self._lock:
+            group = self._groups.pop(fingerprint, None)
+            if group is None:
+                group = {
+                    'type': type(exception).__name__,
+                    'message': str(exception)[:200],
+                    'count': 0,
+                    'suppressed': 0,
+                    'first_seen': time.time(),
+                    'logged_at': None,
+                }
+            # Re-inserted so the dict stays ordered by last occurrence
+            self._groups[fingerprint] = group
+            group['count'] += 1
+            group['last_seen'] = time.time()
+            self._evict()
+
+            if group['logged_at'] is not None and now - group['logged_at'] < interval:
+                group['suppressed'] += 1
+                return None
+            suppressed, group['suppressed'] = group['suppressed'], 0
+            group['logged_at'] = now
+            return suppressed
+
+    def _evict(self):
+        limit = getattr(settings, 'EXCEPTION_MAX_GROUPS', DEFAULT_MAX_GROUPS)
+        while len(self._groups) > limit:
+            del self._groups[next(iter(self._groups))]
+
+    def snapshot(self):
+        """Groups keyed by fingerprint, most recently seen first."""
+        with self._lock:
+            return {
+                key: {name: value for name, value in group.items() if name != 'logged_at'}
+                for key, group in reversed(self._groups.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._groups.clear()
+
+
+exception_groups = ExceptionGroups()
+
+
+def report_exception(exception, request=None):
+    """
+    Count an unhandled exception and log it unless rate limited.
+
+    Returns:
+        tuple: ``(fingerprint, formatted traceback or None)``; the traceback is
+        only formatted when it was logged.
+    """
+    key = fingerprint(exception)
+    exceptions_total.inc(type(exception).__name__)
+    suppressed = exception_groups.record(exception, key)
+    if suppressed is None:
+        return key, None
+
+    formatted = format_exception(exception)
+    where = f" in {request.method} {request.path}" if request is not None else ""
+    if suppressed:
+        logger.error("Unhandled %s [%s]%s (%d similar since last report)\n%s",
+                     type(exception).__name__, key, where, suppressed, formatted)
+    else:
+        logger.error("Unhandled %s [%s]%s\n%s", type(exception).__name__, key, where, formatted)
+    return key, formatted
@@ -0,0 +1,96 @@
+"""
+Returning-guest lookups over ``GuestProfile``.
+
+A profile is upserted whenever a booking reaches one of RETURNING_STATUSES
+(Booking post_save signal, the bulk importer and the 0012 backfill), so
+recognising a returning guest is one indexed lookup by email, phone or name
+instead of a scan of every booking. The 0012 migration keeps its own copy of
+the normalizers below; changes here don't apply to it.
+"""
+import re
+
+from django.db.models import Q
+
+from .models import GuestProfile
+
+# Bookings in these statuses make their guest a returning customer
+RETURNING_STATUSES = ['approved', 'completed']
+# Shorter digit strings are too ambiguous to identify a guest by
+MIN_PHONE_DIGITS = 7
+MIN_NAME_LENGTH = 2
+
+PROFILE_UPDATE_FIELDS = ['guest_name', 'name_key', 'phone', 'phone_key', 'last_booking_id', 'updated_at']
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def normalize_phone(phone):
+    """Digits of ``phone``, or '' when too short to identify anyone."""
+    digits = re.sub(r'\D', '', phone or '')
+    return digits if len(digits) >= MIN_PHONE_DIGITS else ''
+
+
+def name_key(name):
+    return ' '.join((name or '').lower().split())
+
+
+def guest_payload(profile):
+    """The guest fields the chatbot pre-fills for a returning customer."""
+    return {'guest_name': profile.guest_name, 'email': profile.email, 'phone': profile.phone}
+
+
+def record_guests(bookings):
+    """
+    Upsert the GuestProfile of every booking in ``bookings`` that is in RETURNING_STATUSES.
+
+    When several bookings share an email the last one wins. Returns the
+    number of profiles written.
+    """
+    profiles = {}
+    for booking in bookings:
+        email = normalize_email(booking.guest_email)
+        if booking.status not in RETURNING_STATUSES or not email:
+            continue
+        profiles[email] = GuestProfile(
+            email=email,
+            guest_name=booking.guest_name,
+            name_key=name_key(booking.guest_name),
+            phone=booking.guest_phone or '',
+            phone_key=normalize_phone(booking.guest_phone),
+            last_booking_id=booking.booking_id or '',
+        )
+    if profiles:
+        GuestProfile.objects.bulk_create(
+            profiles.values(), update_conflicts=True, unique_fields=['email'], update_fields=PROFILE_UPDATE_FIELDS,
+        )
+    return len(profiles)
+
+
+def find_guest_profile(email=None, phone=None, name=None):
+    """
+    GuestProfile matching ``email``, ``phone`` or ``name`` (tried in that order), or None.
+
+    A name matches a profile whose name is the same or starts with it, so
+    "Alice" finds "Alice Tan". Every lookup is on an indexed column.
+    """
+    email = normalize_email(email)
+    if email:
+        profile = GuestProfile.objects.filter(email=email).first()
+        if profile:
+            return profile
+
+    phone_key = normalize_phone(phone)
+    if phone_key:
+        profile = GuestProfile.objects.filter(phone_key=phone_key).first()
+        if profile:
+            return profile
+
+    key = name_key(name)
+    if len(key) >= MIN_NAME_LENGTH:
+        # A range instead of LIKE, so SQLite can use the index
+        return GuestProfile.objects.filter(
+            Q(name_key=key) | Q(name_key__gte=key + ' ', name_key__lt=key + ' \uffff')
+        ).first()
+    return None
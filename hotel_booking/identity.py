@@ -0,0 +1,67 @@
+"""
+In-process cache of the users the session middleware resolves on every request.
+
+The admin-panel middleware needs the active superuser and the hotel booking
+helpers load the user stored under ``hotel_user_id`` in the session; both
+used to query ``auth_user`` on every call. ``get_admin_user()`` and
+``get_user()`` keep the result (including "no such user") for at most
+``IDENTITY_CACHE_TTL`` seconds. Saving or deleting a User (see
+``signals.py``) drops this process's entries straight away; other processes
+pick the change up when their entries expire.
+
+Callers get their own copy of the cached User, so ``auth.login()`` updating
+``last_login`` on it doesn't leak into other requests.
+
+Bulk ``QuerySet.update()``/``delete()`` calls on users do not send signals;
+call ``invalidate_identity()`` after them.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+
+DEFAULT_TTL = 60.0
+
+_ADMIN = 'admin'
+_lock = threading.Lock()
+# key -> (expires at, User or None)
+_entries = {}
+
+
+def _ttl():
+    return getattr(settings, 'IDENTITY_CACHE_TTL', DEFAULT_TTL)
+
+
+def _cached(key, load):
+    now = time.monotonic()
+    entry = _entries.get(key)
+    if entry is None or entry[0] <= now:
+        user = load()
+        with _lock:
+            _entries[key] = (now + _ttl(), user)
+    else:
+        user = entry[1]
+    return copy.copy(user) if user is not None else None
+
+
+def get_admin_user():
+    """The first active superuser, or None."""
+    return _cached(_ADMIN, lambda: User.objects.filter(is_superuser=True, is_active=True).first())
+
+
+def get_user(pk):
+    """User by primary key, active or not, or None."""
+    # Session values may be strings
+    return _cached(('user', str(pk)), lambda: User.objects.filter(pk=pk).first())
+
+
+def invalidate_identity(pk=None):
+    """Drop the cached admin user and user ``pk``, or everything without ``pk``."""
+    with _lock:
+        if pk is None:
+            _entries.clear()
+        else:
+            _entries.pop(('user', str(pk)), None)
+            _entries.pop(_ADMIN, None)
@@ -0,0 +1,191 @@
+"""
+Logging setup used as ``LOGGING_CONFIG``.
+
+``settings.LOGGING`` is applied with ``dictConfig`` as usual. Then:
+
+* ``LOG_SAMPLING`` maps logger names to N: only 1 in N records at or below
+  ``LOG_SAMPLING_MAX_LEVEL`` from that logger (or its children) is kept.
+  Warnings and errors are never sampled.
+* With ``LOG_MODE = 'queued'`` the handlers of every logger in
+  ``LOGGING['loggers']`` move behind a ``QueueHandler``. A ``QueueListener``
+  thread formats the records and writes them, so a request thread only
+  builds the record and enqueues it. When the queue is full, records are
+  dropped rather than blocking the request; the listener logs how many.
+  Threads don't survive ``fork()``, so a forked child (gunicorn
+  ``--preload`` workers, multiprocessing) starts its own listeners.
+"""
+import atexit
+import itertools
+import logging
+import logging.config
+import logging.handlers
+import os
+import queue
+from logging.handlers import QueueHandler
+
+from django.conf import settings
+
+MODES = ('sync', 'queued')
+DEFAULT_QUEUE_SIZE = 10000
+
+# Listeners started by the last configure_logging() call
+_listeners = []
+_hooks_registered = False
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in N records at or below ``max_level`` for the loggers in ``rates``."""
+
+    def __init__(self, rates=None, max_level=logging.INFO):
+        super().__init__()
+        self.rates = {name: int(every) for name, every in (rates or {}).items() if int(every) > 1}
+        self.max_level = logging.getLevelName(max_level) if isinstance(max_level, str) else max_level
+        self._rate_for = {}
+        self._counters = {}
+
+    def _rate(self, logger_name):
+        """(configured logger name, N) for the closest configured ancestor of ``logger_name``."""
+        rate = self._rate_for.get(logger_name)
+        if rate is None:
+            rate = (None, 1)
+            name = logger_name
+            while name:
+                if name in self.rates:
+                    rate = (name, self.rates[name])
+                    break
+                name = name.rpartition('.')[0]
+            self._rate_for[logger_name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+        name, every = self._rate(record.name)
+        if every == 1:
+            return True
+        counter = self._counters.get(name)
+        if counter is None:
+            counter = self._counters.setdefault(name, itertools.count())
+        return next(counter) % every == 0
+
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Size-rotated log file that checks its size with ``tell()``.
+
+    The stdlib handler formats every record a second time (and stats the
+    file) to decide whether to roll over, which nearly doubles the cost of a
+    record. Here the file may pass ``maxBytes`` by one record before rotating.
+    """
+
+    def shouldRollover(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        return 0 < self.maxBytes <= self.stream.tell()
+
+
+class AsyncQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener's handlers.
+
+    The stock ``prepare()`` copies the record and runs the formatter in the
+    calling thread; here only the message arguments are merged, in place (they
+    may change once the call returns, and ``getMessage()`` stays the same for
+    any other handler).
+    """
+
+    def __init__(self, queue_):
+        super().__init__(queue_)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class QueueListener(logging.handlers.QueueListener):
+    """Listener for an ``AsyncQueueHandler`` that logs how many records it dropped."""
+
+    def __init__(self, queue_handler, *handlers):
+        super().__init__(queue_handler.queue, *handlers, respect_handler_level=True)
+        self.queue_handler = queue_handler
+        self.reported = 0
+
+    def handle(self, record):
+        self.report_dropped()
+        super().handle(record)
+
+    def stop(self):
+        super().stop()
+        self.report_dropped()
+
+    def report_dropped(self):
+        dropped = self.queue_handler.dropped - self.reported
+        if dropped > 0:
+            self.reported += dropped
+            super().handle(logging.LogRecord(
+                __name__, logging.WARNING, __file__, 0,
+                "%d log records dropped: the logging queue was full", (dropped,), None,
+            ))
+
+    def restart_in_child(self):
+        """Start a new thread on a new queue after ``fork()``; the parent's queue may be mid-use."""
+        self.queue = self.queue_handler.queue = queue.Queue(self.queue.maxsize)
+        self.queue_handler.dropped = self.reported = 0
+        self._thread = None
+        self.start()
+
+
+def stop_logging():
+    """Flush the queued records and stop the listener threads."""
+    while _listeners:
+        _listeners.pop().stop()
+
+
+def _restart_in_child():
+    for listener in _listeners:
+        listener.restart_in_child()
+
+
+def _register_hooks():
+    global _hooks_registered
+    if not _hooks_registered:
+        _hooks_registered = True
+        atexit.register(stop_logging)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def configure_logging(config):
+    """``LOGGING_CONFIG`` callable; see the module docstring."""
+    stop_logging()
+    logging.config.dictConfig(config)
+
+    sampling = SamplingFilter(getattr(settings, 'LOG_SAMPLING', None),
+                              getattr(settings, 'LOG_SAMPLING_MAX_LEVEL', logging.INFO))
+    mode = getattr(settings, 'LOG_MODE', 'sync')
+    if mode not in MODES:
+        raise ValueError(f"LOG_MODE must be one of {', '.join(MODES)}, not {mode!r}")
+
+    for name in config.get('loggers', {}):
+        logger = logging.getLogger(name)
+        if not logger.handlers:
+            continue
+        if mode == 'sync':
+            for handler in logger.handlers:
+                handler.addFilter(sampling)
+            continue
+        queue_handler = AsyncQueueHandler(queue.Queue(getattr(settings, 'LOG_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)))
+        queue_handler.addFilter(sampling)
+        listener = QueueListener(queue_handler, *logger.handlers)
+        logger.handlers = [queue_handler]
+        _register_hooks()
+        listener.start()
+        _listeners.append(listener)
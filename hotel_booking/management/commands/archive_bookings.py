@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hotel_booking.archive import ARCHIVABLE_STATUSES, DEFAULT_BATCH_SIZE, archivable, archive_bookings, archive_cutoff
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 1.0
+
+
+class Command(BaseCommand):
+    help = ("Move completed and cancelled bookings whose stay ended more than --months ago "
+            "into the booking archive, in batches.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=12,
+                            help='Archive stays that ended more than this many (30-day) months ago')
+        parser.add_argument('--status', action='append', choices=ARCHIVABLE_STATUSES,
+                            help='Status to archive; repeat for several (default: completed and cancelled)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Bookings moved per transaction')
+        parser.add_argument('--limit', type=int, help='Stop after this many bookings')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the bookings that would move')
+
+    def handle(self, *args, **options):
+        if options['months'] < 0:
+            raise CommandError("--months must not be negative")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        if options['limit'] is not None and options['limit'] < 1:
+            raise CommandError("--limit must be at least 1")
+
+        before = archive_cutoff(options['months'])
+        if options['dry_run']:
+            count = archivable(before, options['status']).count()
+            self.stdout.write(f"{count} bookings that ended before {before} would be archived")
+            return
+
+        started = time.perf_counter()
+        moved = archive_bookings(before, statuses=options['status'], batch_size=options['batch_size'],
+                                 limit=options['limit'], progress=self._progress(started))
+        elapsed = time.perf_counter() - started
+        rate = moved / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {moved} bookings that ended before {before} in {elapsed:.2f}s ({rate:.0f} rows/s)"
+        ))
+
+    def _progress(self, started):
+        last = [started]
+
+        def report(moved):
+            now = time.perf_counter()
+            if now - last[0] < PROGRESS_INTERVAL:
+                return
+            last[0] = now
+            self.stdout.write(f"  {moved} archived, {moved / (now - started):.0f} rows/sec")
+        return report
@@ -0,0 +1,73 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from hotel_booking.archive import archive_bookings, search_bookings
+from hotel_booking.benchmarking import bulk_seed_bookings, isolated_database, seed_rooms, summarize, write_results
+from hotel_booking.models import Booking, Room
+
+
+class Command(BaseCommand):
+    help = ("Time the hot booking queries (availability, returning-guest and status lookups) "
+            "before and after archiving finished bookings.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000, help='Bookings to seed')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Bookings archived per transaction')
+        parser.add_argument('--iterations', type=int, default=20, help='Runs per query')
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            self.stdout.write(f"Seeding {options['rows']} bookings...")
+            bulk_seed_bookings(seed_rooms(), options['rows'])
+            # Seeded stays start two weeks after they were made; archive every finished one
+            before = timezone.localdate()
+            results = {'rows': options['rows']}
+            results['before'] = self._measure(options['iterations'])
+
+            started = time.perf_counter()
+            moved = archive_bookings(before, batch_size=options['batch_size'])
+            elapsed = time.perf_counter() - started
+            results['archive'] = {
+                'rows': moved,
+                'seconds': round(elapsed, 3),
+                'rows_per_second': round(moved / elapsed) if elapsed else None,
+            }
+            results['after'] = self._measure(options['iterations'])
+            results['live_rows'] = Booking.objects.count()
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\nArchived {moved} of {options['rows']} bookings in {results['archive']['seconds']}s "
+            f"({results['archive']['rows_per_second']} rows/s)"
+        ))
+        for query in results['before']:
+            self.stdout.write(f"  {query:<26} p50 {results['before'][query]['p50_ms']:>9} ms before   "
+                              f"{results['after'][query]['p50_ms']:>9} ms after")
+
+        if options['output']:
+            write_results(options['output'], 'booking_archive', results)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _measure(self, iterations):
+        today = timezone.localdate()
+        # New guests: the lookups that have to scan every live booking
+        queries = {
+            'available_rooms': lambda: Room.get_available_rooms(today + timedelta(days=3), today + timedelta(days=5)),
+            'new_guest_email': lambda: Booking.objects.filter(guest_email='new.guest@example.com').exists(),
+            'new_guest_name': lambda: Booking.objects.filter(guest_name__iexact='New Guest').exists(),
+            'pending_count': lambda: Booking.objects.filter(status='pending').count(),
+            'name_search_with_archive': lambda: search_bookings(Q(guest_name__iexact='New Guest'), limit=5),
+        }
+        results = {}
+        for name, query in queries.items():
+            samples = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                query()
+                samples.append((time.perf_counter() - start) * 1000)
+            results[name] = summarize(samples)
+        return results
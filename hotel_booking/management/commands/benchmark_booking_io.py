@@ -0,0 +1,138 @@
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from hotel_booking.benchmarking import isolated_database, seed_rooms, write_results
+from hotel_booking.booking_io import BookingImporter, export_rows, read_rows, write_rows
+from hotel_booking.models import Booking, Room
+from hotel_booking.room_catalog import invalidate_room_catalog
+
+
+class Command(BaseCommand):
+    help = ("Import and export a generated booking file through the batched pipeline and compare "
+            "the import rate with row-by-row get_or_create.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Bookings in the generated file')
+        parser.add_argument('--rooms', type=int, default=1000, help='Rooms the bookings are spread across')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--update-pass', action='store_true',
+                            help='Import the file a second time, updating every booking')
+        parser.add_argument('--baseline-rows', type=int, default=500,
+                            help='Rows imported one by one with get_or_create for comparison')
+        parser.add_argument('--trace-memory', action='store_true',
+                            help="Also record the importer's peak Python heap with tracemalloc (slower)")
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+
+    def handle(self, *args, **options):
+        results = {'rows': options['rows'], 'rooms': options['rooms'], 'batch_size': options['batch_size'],
+                   'format': options['format']}
+        with tempfile.TemporaryDirectory() as tmp, isolated_database():
+            rooms = self._seed_rooms(options['rooms'])
+            source = os.path.join(tmp, f"bookings.{options['format']}")
+            self._generate(source, options['format'], rooms, options['rows'])
+            results['file_mb'] = round(os.path.getsize(source) / 1e6, 1)
+
+            results['import'] = self._import(source, options)
+            if options['update_pass']:
+                results['update'] = self._import(source, options)
+
+            exported = os.path.join(tmp, f"export.{options['format']}")
+            started = time.perf_counter()
+            with open(exported, 'w', newline='', encoding='utf-8') as f:
+                count = write_rows(f, options['format'], export_rows(Booking.objects.all()))
+            results['export'] = self._rate(count, time.perf_counter() - started)
+
+            results['get_or_create'] = self._baseline(rooms, options['baseline_rows'])
+
+        for phase in ('import', 'update', 'export', 'get_or_create'):
+            if phase in results:
+                result = results[phase]
+                self.stdout.write(f"  {phase:<14} {result['rows']:>9} rows in {result['seconds']:>8}s "
+                                  f"= {result['rows_per_sec']:>9} rows/sec")
+        # The test database lives in memory, so RSS growth includes the imported rows themselves
+        self.stdout.write(f"  peak RSS grew {results['import']['rss_growth_mb']} MB during the import "
+                          f"of a {results['file_mb']} MB file (includes the in-memory test database)")
+        if results['import']['heap_peak_mb'] is not None:
+            self.stdout.write(f"  importer peak Python heap {results['import']['heap_peak_mb']} MB")
+
+        if options['output']:
+            write_results(options['output'], 'booking_io', results)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _seed_rooms(self, count):
+        rooms = seed_rooms()
+        extra = max(0, count - len(rooms))
+        Room.objects.bulk_create([
+            Room(name=f"Benchmark Room {i}", description='', price=Decimal('120.00') + i % 50, capacity=2)
+            for i in range(extra)
+        ])
+        # bulk_create sends no signals
+        invalidate_room_catalog()
+        return list(Room.objects.order_by('pk'))
+
+    def _generate(self, path, fmt, rooms, count):
+        """Write ``count`` non-overlapping upcoming stays, cycling through the rooms."""
+        start = timezone.now().date() + timedelta(days=1)
+
+        def rows():
+            for i in range(count):
+                check_in = start + timedelta(days=3 * (i // len(rooms)))
+                yield {
+                    'booking_id': f"IM-{i:07d}", 'room_id': rooms[i % len(rooms)].pk, 'room_name': None,
+                    'guest_name': f"Guest {i}", 'guest_email': f"guest{i}@example.com",
+                    'guest_phone': f"01{i:08d}", 'check_in_date': check_in,
+                    'check_out_date': check_in + timedelta(days=2), 'status': 'approved',
+                    'username': None, 'created_at': None,
+                }
+
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            write_rows(f, fmt, rows())
+
+    def _import(self, path, options):
+        importer = BookingImporter(batch_size=options['batch_size'])
+        # Peak RSS before the import; the chatbot stack loaded at startup dominates it
+        baseline_rss = _peak_rss_mb()
+        if options['trace_memory']:
+            tracemalloc.start()
+        with open(path, newline='', encoding='utf-8') as f:
+            result = importer.run(read_rows(f, options['format']))
+        heap_peak = None
+        if options['trace_memory']:
+            heap_peak = round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+            tracemalloc.stop()
+        if result.failed:
+            self.stderr.write(f"{result.failed} rows rejected, first: {result.errors[0]}")
+        summary = self._rate(result.processed, result.elapsed)
+        summary.update(created=result.created, updated=result.updated, failed=result.failed,
+                       peak_rss_mb=_peak_rss_mb(), rss_growth_mb=round(_peak_rss_mb() - baseline_rss, 1),
+                       heap_peak_mb=heap_peak)
+        return summary
+
+    def _baseline(self, rooms, count):
+        """What create_test_data.py-style scripts do: one get_or_create per row."""
+        start = timezone.now().date() + timedelta(days=20000)
+        started = time.perf_counter()
+        for i in range(count):
+            check_in = start + timedelta(days=3 * (i // len(rooms)))
+            Booking.objects.get_or_create(booking_id=f"GC-{i:07d}", defaults={
+                'room': rooms[i % len(rooms)], 'guest_name': f"Guest {i}", 'guest_email': f"guest{i}@example.com",
+                'check_in_date': check_in, 'check_out_date': check_in + timedelta(days=2), 'status': 'approved',
+            })
+        return self._rate(count, time.perf_counter() - started)
+
+    def _rate(self, rows, seconds):
+        return {'rows': rows, 'seconds': round(seconds, 2), 'rows_per_sec': round(rows / seconds) if seconds else 0}
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
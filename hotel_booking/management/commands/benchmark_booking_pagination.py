@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from hotel_booking.benchmarking import bulk_seed_bookings, isolated_database, seed_rooms, summarize, write_results
+from hotel_booking.models import Booking
+from hotel_booking.pagination import encode_cursor, paginate_keyset
+
+
+class Command(BaseCommand):
+    help = "Compare keyset and OFFSET pagination of the booking list at increasing depths."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500000, help='Bookings to seed')
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--pages', default='1,10,100,1000,5000',
+                            help='Comma-separated page numbers to fetch (capped at the last full page)')
+        parser.add_argument('--iterations', type=int, default=20, help='Fetches per page and method')
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        with isolated_database():
+            self.stdout.write(f"Seeding {options['rows']} bookings...")
+            bulk_seed_bookings(seed_rooms(), options['rows'])
+
+            pages = [int(page) for page in options['pages'].split(',')]
+            results = {
+                'rows': options['rows'],
+                'page_size': page_size,
+                'all': self._measure(Booking.objects.for_listing(), pages, page_size, options['iterations']),
+                'status=approved': self._measure(Booking.objects.for_listing().filter(status='approved'),
+                                                 pages, page_size, options['iterations']),
+            }
+
+        for scope in ('all', 'status=approved'):
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{scope}"))
+            for page, result in results[scope].items():
+                self.stdout.write(f"  page {page:>6}: keyset p50 {result['keyset']['p50_ms']:>9} ms   "
+                                  f"offset p50 {result['offset']['p50_ms']:>9} ms")
+
+        if options['output']:
+            write_results(options['output'], 'booking_pagination', results)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _measure(self, queryset, pages, page_size, iterations):
+        ordered = queryset.order_by('-created_at', '-id')
+        last_page = max(1, ordered.count() // page_size)
+        results = {}
+        for page in sorted({min(page, last_page) for page in pages}):
+            offset = (page - 1) * page_size
+            cursor = encode_cursor(ordered[offset - 1]) if offset else None
+
+            keyset_samples, offset_samples = [], []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                keyset_rows = list(paginate_keyset(queryset, cursor, page_size))
+                keyset_samples.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                offset_rows = list(ordered[offset:offset + page_size])
+                offset_samples.append((time.perf_counter() - start) * 1000)
+
+            if [row.pk for row in keyset_rows] != [row.pk for row in offset_rows]:
+                self.stderr.write(f"Page {page}: keyset and offset pages differ")
+            results[page] = {'keyset': summarize(keyset_samples), 'offset': summarize(offset_samples)}
+        return results
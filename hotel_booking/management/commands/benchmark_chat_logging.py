@@ -0,0 +1,94 @@
+import copy
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from hotel_booking.benchmarking import isolated_database, seed_bookings, seed_rooms, summarize, write_results
+from hotel_booking.log_config import configure_logging, stop_logging
+
+from .benchmark_chat_replay import CONVERSATIONS_FILE, Command as ReplayCommand, _ClientRunner
+
+# name: (LOG_MODE, sample the per-turn logger)
+CONFIGURATIONS = {
+    'sync': ('sync', False),
+    'sync+sampling': ('sync', True),
+    'queued+sampling': ('queued', True),
+}
+
+
+class Command(BaseCommand):
+    help = ("Replay the scripted chatbot conversations through /chatbot/api/ under each logging "
+            "configuration and report request latency with the logging cost included.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help='Times each conversation is replayed')
+        parser.add_argument('--config', action='append', choices=list(CONFIGURATIONS),
+                            help='Only run the named configuration(s)')
+        parser.add_argument('--conversations-file', default=CONVERSATIONS_FILE)
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+
+    def handle(self, *args, **options):
+        replay = ReplayCommand()
+        conversations = replay._load_conversations(options['conversations_file'], None)
+
+        results = {}
+        try:
+            with isolated_database(), tempfile.TemporaryDirectory() as log_dir:
+                for name in options['config'] or CONFIGURATIONS:
+                    mode, sampled = CONFIGURATIONS[name]
+                    log_file = os.path.join(log_dir, f"{name}.log")
+                    sampling = settings.LOG_SAMPLING if sampled else {}
+                    with override_settings(LOG_MODE=mode, LOG_SAMPLING=sampling):
+                        configure_logging(self._logging_config(log_file))
+                        results[name] = self._replay(replay, conversations, options['repeat'])
+                        # Time to write out whatever is still queued
+                        start = time.perf_counter()
+                        stop_logging()
+                        results[name]['drain_ms'] = round((time.perf_counter() - start) * 1000, 3)
+                    with open(log_file, 'rb') as f:
+                        lines = f.read().count(b'\n')
+                    results[name]['log_lines_per_turn'] = round(lines / results[name]['latency']['count'], 1)
+                    results[name]['log_bytes'] = os.path.getsize(log_file)
+        finally:
+            configure_logging(settings.LOGGING)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\nChat request latency, logging included"))
+        for name, result in results.items():
+            latency = result['latency']
+            self.stdout.write(f"  {name:<16} p50 {latency['p50_ms']:>8} ms  p95 {latency['p95_ms']:>8} ms  "
+                              f"mean {latency['mean_ms']:>8} ms  {result['log_lines_per_turn']:>5} log lines/turn  "
+                              f"drain {result['drain_ms']} ms")
+
+        if options['output']:
+            write_results(options['output'], 'chat_logging', results)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _logging_config(self, log_file):
+        """settings.LOGGING writing to ``log_file``, with the console sent to /dev/null."""
+        config = copy.deepcopy(settings.LOGGING)
+        for handler in config['handlers'].values():
+            if handler['class'] == 'logging.StreamHandler':
+                handler.update({'class': 'logging.FileHandler', 'filename': os.devnull})
+            elif 'filename' in handler:
+                handler['filename'] = log_file
+        return config
+
+    def _replay(self, replay, conversations, repeat):
+        samples = []
+        for _ in range(repeat):
+            for conversation in conversations:
+                with transaction.atomic():
+                    seed_bookings(seed_rooms(), 'John Smith', 4, prefix='BK')
+                    runner = _ClientRunner(reverse('chatbot_api'))
+                    for message in replay._render_turns(conversation['turns']):
+                        start = time.perf_counter()
+                        runner.send(message)
+                        samples.append((time.perf_counter() - start) * 1000)
+                    transaction.set_rollback(True)
+        return {'latency': summarize(samples)}
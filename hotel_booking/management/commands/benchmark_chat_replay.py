@@ -0,0 +1,203 @@
+import json
+import os
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from hotel_booking.benchmarking import isolated_database, seed_bookings, seed_rooms, summarize, write_results
+
+CONVERSATIONS_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'chatbot', 'benchmark_conversations.json'
+)
+DRIVERS = ('dialog', 'client')
+
+
+class Command(BaseCommand):
+    help = ("Replay the scripted chatbot conversations in-process and report per-turn and "
+            "per-state latency percentiles, DB queries and allocations.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--driver', choices=DRIVERS + ('all',), default='all',
+                            help="'dialog' calls DialogManager.process, 'client' posts to /chatbot/api/")
+        parser.add_argument('--repeat', type=int, default=3, help='Times each conversation is replayed')
+        parser.add_argument('--conversation', action='append', help='Only replay the named conversation(s)')
+        parser.add_argument('--conversations-file', default=CONVERSATIONS_FILE)
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+        parser.add_argument('--compare', help='Previous results JSON to compare against')
+
+    def handle(self, *args, **options):
+        conversations = self._load_conversations(options['conversations_file'], options['conversation'])
+        drivers = DRIVERS if options['driver'] == 'all' else (options['driver'],)
+
+        results = {}
+        with isolated_database():
+            for driver in drivers:
+                results[driver] = self._replay(driver, conversations, options['repeat'])
+
+        self._report(results)
+
+        if options['compare']:
+            self._compare(options['compare'], results)
+        if options['output']:
+            write_results(options['output'], 'chat_replay', results)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _load_conversations(self, path, names):
+        with open(path, encoding='utf-8') as f:
+            conversations = json.load(f)['conversations']
+        if names:
+            conversations = [c for c in conversations if c['name'] in names]
+            if not conversations:
+                raise CommandError(f"No conversations named {', '.join(names)}")
+        return conversations
+
+    def _render_turns(self, turns):
+        """Fill in relative dates so scripted bookings never fall in the past."""
+        today = timezone.now().date()
+        dates = {
+            'check_in': today + timedelta(days=30),
+            'check_out': today + timedelta(days=32),
+            'extend_to': today + timedelta(days=40),
+        }
+        return [turn.format(**dates) for turn in turns]
+
+    def _replay(self, driver, conversations, repeat):
+        turn_samples = defaultdict(lambda: {'latency': [], 'queries': [], 'alloc_kb': []})
+        state_samples = defaultdict(list)
+        all_latency, all_queries, all_alloc = [], [], []
+
+        for _ in range(repeat):
+            for conversation in conversations:
+                # Each replay starts from the same seeded data and leaves nothing behind
+                with transaction.atomic():
+                    rooms = seed_rooms()
+                    seed_bookings(rooms, 'John Smith', 4, prefix='BK')
+                    runner = self._dialog_runner() if driver == 'dialog' else self._client_runner()
+
+                    for index, message in enumerate(self._render_turns(conversation['turns'])):
+                        state_before = runner.state
+
+                        tracemalloc.start()
+                        with CaptureQueriesContext(connection) as queries:
+                            start = time.perf_counter()
+                            runner.send(message)
+                            elapsed = (time.perf_counter() - start) * 1000
+                        _, peak = tracemalloc.get_traced_memory()
+                        tracemalloc.stop()
+
+                        key = f"{conversation['name']}[{index}] {message}"
+                        turn_samples[key]['latency'].append(elapsed)
+                        turn_samples[key]['queries'].append(len(queries))
+                        turn_samples[key]['alloc_kb'].append(peak / 1024)
+                        state_samples[state_before].append(elapsed)
+                        all_latency.append(elapsed)
+                        all_queries.append(len(queries))
+                        all_alloc.append(peak / 1024)
+
+                    transaction.set_rollback(True)
+
+        return {
+            'overall': {
+                'latency': summarize(all_latency),
+                'queries_per_turn': _stats(all_queries),
+                'peak_alloc_kb_per_turn': _stats(all_alloc),
+            },
+            'per_state': {state: summarize(samples) for state, samples in sorted(state_samples.items())},
+            'per_turn': {
+                key: {
+                    'latency': summarize(samples['latency']),
+                    'queries': _stats(samples['queries']),
+                    'peak_alloc_kb': _stats(samples['alloc_kb']),
+                }
+                for key, samples in turn_samples.items()
+            },
+        }
+
+    def _dialog_runner(self):
+        return _DialogRunner()
+
+    def _client_runner(self):
+        return _ClientRunner(reverse('chatbot_api'))
+
+    def _report(self, results):
+        for driver, result in results.items():
+            overall = result['overall']
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n[{driver}]"))
+            self.stdout.write(f"  turns: {overall['latency']['count']}, latency p50 {overall['latency'].get('p50_ms')} ms, "
+                              f"p95 {overall['latency'].get('p95_ms')} ms, "
+                              f"queries/turn mean {overall['queries_per_turn']['mean']}")
+            self.stdout.write("  per state:")
+            for state, summary in result['per_state'].items():
+                self.stdout.write(f"    {state:<40} n={summary['count']:<4} p50 {summary['p50_ms']:>9} ms  "
+                                  f"p95 {summary['p95_ms']:>9} ms")
+
+    def _compare(self, path, results):
+        with open(path, encoding='utf-8') as f:
+            previous = json.load(f)
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nCompared with {previous.get('revision') or path}"))
+        for driver, result in results.items():
+            before = previous['results'].get(driver)
+            if not before:
+                continue
+            for metric in ('p50_ms', 'p95_ms'):
+                old = before['overall']['latency'].get(metric)
+                new = result['overall']['latency'].get(metric)
+                if old:
+                    self.stdout.write(f"  [{driver}] {metric}: {old} -> {new} ({(new - old) / old * 100:+.1f}%)")
+            old_q = before['overall']['queries_per_turn']['mean']
+            new_q = result['overall']['queries_per_turn']['mean']
+            self.stdout.write(f"  [{driver}] queries/turn: {old_q} -> {new_q}")
+
+
+def _stats(values):
+    """Mean and max of a list of counts."""
+    if not values:
+        return {'mean': 0, 'max': 0}
+    return {'mean': round(sum(values) / len(values), 2), 'max': round(max(values), 2)}
+
+
+class _DialogRunner:
+    """Drives DialogManager.process directly, carrying the session between turns."""
+
+    def __init__(self):
+        from hotel_booking.chatbot.dialog_manager import DialogManager
+
+        self.dialog_manager = DialogManager()
+        self.session = {}
+
+    @property
+    def state(self):
+        return self.session.get('state', 'greeting')
+
+    def send(self, message):
+        _, self.session = self.dialog_manager.process(message, self.session)
+
+
+class _ClientRunner:
+    """Posts each turn to the chat API with the Django test client, like the live-server scripts."""
+
+    def __init__(self, url):
+        self.client = Client()
+        self.url = url
+        self.session = {}
+
+    @property
+    def state(self):
+        return self.session.get('state', 'greeting')
+
+    def send(self, message):
+        response = self.client.post(
+            self.url,
+            data=json.dumps({'message': message, 'session': self.session}),
+            content_type='application/json'
+        )
+        self.session = json.loads(response.content).get('session', self.session)
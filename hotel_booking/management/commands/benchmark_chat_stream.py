@@ -0,0 +1,80 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from hotel_booking.benchmarking import isolated_database, seed_bookings, seed_rooms, summarize, write_results
+
+# Messages whose replies are long enough for streaming to matter
+BENCHMARK_MESSAGES = [
+    "Please check booking status for John Smith",  # multi-booking listing
+    "What time is check-in?",                      # hotel info answer
+    "I want to book a room",                       # booking prompt
+]
+
+
+class Command(BaseCommand):
+    help = "Compare time-to-first-byte of the JSON chat API and the streaming (SSE) chat API."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5, help='Requests per message and endpoint')
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        with isolated_database():
+            rooms = seed_rooms()
+            seed_bookings(rooms, 'John Smith', 4)
+            client = Client()
+
+            results = {}
+            for message in BENCHMARK_MESSAGES:
+                results[message] = {
+                    'json': self._measure_json(client, message, iterations),
+                    'stream': self._measure_stream(client, message, iterations),
+                }
+
+        for message, result in results.items():
+            self.stdout.write(f"\n{message}")
+            self.stdout.write(f"  /chatbot/api/         TTFB p50 {result['json']['ttfb']['p50_ms']} ms")
+            self.stdout.write(f"  /chatbot/api/stream/  TTFB p50 {result['stream']['ttfb']['p50_ms']} ms, "
+                              f"first reply chunk p50 {result['stream']['first_chunk']['p50_ms']} ms, "
+                              f"total p50 {result['stream']['total']['p50_ms']} ms")
+
+        if options['output']:
+            write_results(options['output'], 'chat_stream_ttfb', results)
+            self.stdout.write(self.style.SUCCESS(f"\nResults written to {options['output']}"))
+
+    def _payload(self, message):
+        return json.dumps({'message': message, 'session': {}})
+
+    def _measure_json(self, client, message, iterations):
+        url = reverse('chatbot_api')
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            client.post(url, data=self._payload(message), content_type='application/json')
+            # The buffered endpoint only sends its first byte once the reply is complete
+            samples.append((time.perf_counter() - start) * 1000)
+        return {'ttfb': summarize(samples), 'total': summarize(samples)}
+
+    def _measure_stream(self, client, message, iterations):
+        url = reverse('chatbot_stream_api')
+        ttfb, first_chunk, total = [], [], []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            response = client.post(url, data=self._payload(message), content_type='application/json')
+            chunk_seen = False
+            for i, part in enumerate(response.streaming_content):
+                elapsed = (time.perf_counter() - start) * 1000
+                if i == 0:
+                    ttfb.append(elapsed)
+                if not chunk_seen and part.startswith(b'event: chunk'):
+                    first_chunk.append(elapsed)
+                    chunk_seen = True
+            response.close()
+            total.append((time.perf_counter() - start) * 1000)
+        return {'ttfb': summarize(ttfb), 'first_chunk': summarize(first_chunk), 'total': summarize(total)}
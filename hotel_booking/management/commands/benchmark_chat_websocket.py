@@ -0,0 +1,94 @@
+import asyncio
+import time
+import tracemalloc
+
+from channels.auth import AuthMiddlewareStack
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+
+from hotel_booking.benchmarking import isolated_database, seed_rooms, summarize, write_results
+from hotel_booking.chatbot.routing import websocket_urlpatterns
+
+WS_PATH = '/hotel_booking/ws/chatbot/'
+BENCHMARK_MESSAGE = "What time is check-in?"
+
+
+class Command(BaseCommand):
+    help = "Measure memory per idle chatbot WebSocket connection and chat messages per second."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=1000, help='Idle connections to open')
+        parser.add_argument('--active', type=int, default=20, help='Connections that send messages')
+        parser.add_argument('--messages', type=int, default=10, help='Messages sent by each active connection')
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            seed_rooms()
+            results = asyncio.run(self._run(options))
+
+        idle = results['idle']
+        throughput = results['throughput']
+        self.stdout.write(f"Idle connections: {idle['connections']}, "
+                          f"{idle['bytes_per_connection']} bytes/connection (Python heap)")
+        self.stdout.write(f"Throughput: {throughput['messages_per_second']} messages/sec over "
+                          f"{throughput['messages']} messages, turn latency p50 {throughput['latency']['p50_ms']} ms")
+
+        if options['output']:
+            write_results(options['output'], 'chat_websocket', results)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    async def _run(self, options):
+        application = AuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+
+        # Warm up so shared NLP models are not counted against the connections
+        warmup = WebsocketCommunicator(application, WS_PATH)
+        await warmup.connect()
+        await warmup.send_json_to({'message': BENCHMARK_MESSAGE})
+        await warmup.receive_json_from(timeout=60)
+        await warmup.disconnect()
+
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+        communicators = []
+        for _ in range(options['connections']):
+            communicator = WebsocketCommunicator(application, WS_PATH)
+            connected, _ = await communicator.connect()
+            if connected:
+                communicators.append(communicator)
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        idle = {
+            'connections': len(communicators),
+            'bytes_per_connection': (current - baseline) // max(len(communicators), 1),
+        }
+
+        latencies = []
+
+        async def chat(communicator):
+            for _ in range(options['messages']):
+                start = time.perf_counter()
+                await communicator.send_json_to({'message': BENCHMARK_MESSAGE})
+                await communicator.receive_json_from(timeout=60)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        active = communicators[:options['active']]
+        start = time.perf_counter()
+        await asyncio.gather(*(chat(communicator) for communicator in active))
+        elapsed = time.perf_counter() - start
+
+        for communicator in communicators:
+            await communicator.disconnect()
+
+        return {
+            'idle': idle,
+            'throughput': {
+                'active_connections': len(active),
+                'messages': len(latencies),
+                'seconds': round(elapsed, 3),
+                'messages_per_second': round(len(latencies) / elapsed, 2) if elapsed else 0,
+                'latency': summarize(latencies),
+            },
+        }
@@ -0,0 +1,126 @@
+import multiprocessing
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from hotel_booking.benchmarking import summarize, write_results
+from hotel_booking.metrics import Counter, Gauge, Histogram, Registry
+
+# Events timed per sample; single events are too fast to time individually
+BATCH = 10000
+STATES = ['greeting', 'collecting_dates', 'booking_confirmed', 'cancelling_booking']
+
+
+def _metrics(registry):
+    return (
+        Counter('bench_turns_total', 'Turns.', ('intent', 'state'), registry=registry),
+        Histogram('bench_turn_seconds', 'Turn latency.', ('state',), registry=registry),
+        Gauge('bench_in_progress', 'In progress.', registry=registry),
+    )
+
+
+def _worker(directory, events):
+    # Run in a separate process, as a gunicorn worker would
+    registry = Registry(directory)
+    counter, histogram, _ = _metrics(registry)
+    for i in range(events):
+        counter.inc('booking', STATES[i % len(STATES)])
+        histogram.observe(0.001 * (i % 100), STATES[i % len(STATES)])
+    registry.flush()
+
+
+class Command(BaseCommand):
+    help = "Measure the per-event cost of the /metrics counters and the multiprocess scrape."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Samples per operation')
+        parser.add_argument('--workers', type=int, default=4, help='Processes aggregated by the scrape')
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+
+    def handle(self, *args, **options):
+        results = self._events(options['iterations'])
+        results.update(self._multiprocess(options['workers'], options['iterations']))
+
+        self.stdout.write(f"Per-event cost (mean of {BATCH} events per sample):")
+        for operation in ('counter_inc', 'histogram_observe', 'histogram_time', 'gauge_inprogress'):
+            summary = results[operation]
+            self.stdout.write(f"  {operation:<18} p50 {summary['p50_us']:>6} us  p95 {summary['p95_us']:>6} us")
+        self.stdout.write(f"Flush: p50 {results['flush']['p50_ms']} ms; scrape of {options['workers']} workers: "
+                          f"p50 {results['scrape']['p50_ms']} ms; counts match: {results['counts_match']}")
+
+        if options['output']:
+            write_results(options['output'], 'metrics', results)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _events(self, iterations):
+        counter, histogram, gauge = _metrics(Registry())
+        labels = [STATES[i % len(STATES)] for i in range(BATCH)]
+
+        def per_event(run):
+            samples = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                run()
+                samples.append((time.perf_counter() - start) * 1000 * 1000 / BATCH)
+            summary = summarize(samples)
+            # summarize() labels in ms; these are microseconds per event
+            return {key.replace('_ms', '_us'): value for key, value in summary.items()}
+
+        def inc():
+            for state in labels:
+                counter.inc('booking', state)
+
+        def observe():
+            for state in labels:
+                histogram.observe(0.042, state)
+
+        def timed():
+            for state in labels:
+                with histogram.time(state):
+                    pass
+
+        def inprogress():
+            for _ in labels:
+                with gauge.track_inprogress():
+                    pass
+
+        return {
+            'counter_inc': per_event(inc),
+            'histogram_observe': per_event(observe),
+            'histogram_time': per_event(timed),
+            'gauge_inprogress': per_event(inprogress),
+        }
+
+    def _multiprocess(self, workers, iterations):
+        events = 1000
+        with tempfile.TemporaryDirectory() as directory:
+            processes = [multiprocessing.Process(target=_worker, args=(directory, events)) for _ in range(workers)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+
+            registry = Registry(directory)
+            counter, _, _ = _metrics(registry)
+            for _ in range(events):
+                counter.inc('booking', 'greeting')
+
+            flush_samples, scrape_samples = [], []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                registry.flush()
+                flush_samples.append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                text = registry.render()
+                scrape_samples.append((time.perf_counter() - start) * 1000)
+
+        total = sum(
+            float(line.rsplit(' ', 1)[1]) for line in text.splitlines()
+            if line.startswith('bench_turns_total{')
+        )
+        return {
+            'flush': summarize(flush_samples),
+            'scrape': summarize(scrape_samples),
+            'counts_match': total == events * (workers + 1),
+        }
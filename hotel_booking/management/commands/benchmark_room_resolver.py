@@ -0,0 +1,97 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from hotel_booking.benchmarking import isolated_database, seed_rooms, summarize, write_results
+from hotel_booking.models import Room
+from hotel_booking.room_catalog import get_room_catalog, normalize_room_name
+from hotel_booking.room_resolver import RoomTypeResolver
+
+# What guests actually type, including prefixes, typos and unknown types
+QUERIES = [
+    'Standard Room', 'standard', 'deluxe', 'Delux', 'dleuxe room', 'Deluxe Room please',
+    'executive suite', 'exec', 'suite', 'room', 'penthouse',
+]
+# Lookups timed per sample; single lookups are too fast to time individually
+BATCH = 1000
+
+
+class Command(BaseCommand):
+    help = "Compare the room-type resolver against Room.objects.filter(name__icontains=...).first()."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Samples per method')
+        parser.add_argument('--extra-rooms', type=int, default=0,
+                            help='Additional rooms per type, to simulate a larger catalog')
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            rooms = seed_rooms()
+            for i in range(options['extra_rooms']):
+                for room in rooms:
+                    Room.objects.create(name=room.name, description=room.description,
+                                        price=room.price + Decimal(i + 1), capacity=room.capacity)
+            results = self._run(options['iterations'])
+
+        self.stdout.write(f"Lookups per sample: {BATCH} ({len(QUERIES)} distinct queries)")
+        for method in ('icontains_query', 'resolver_cold', 'resolver_warm'):
+            summary = results[method]
+            self.stdout.write(f"  {method:<16} p50 {summary['p50_ms']:>10} ms  p95 {summary['p95_ms']:>10} ms "
+                              f"per {BATCH} lookups")
+        self.stdout.write(f"  resolver build   {results['resolver_build_ms']} ms")
+        self.stdout.write("Resolved room types:")
+        for query, matches in results['matches'].items():
+            self.stdout.write(f"  {query!r:<24} icontains={matches['icontains']!r:<20} resolver={matches['resolver']!r}")
+
+        if options['output']:
+            write_results(options['output'], 'room_resolver', results)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _run(self, iterations):
+        queries = [QUERIES[i % len(QUERIES)] for i in range(BATCH)]
+        rooms = list(Room.objects.all())
+
+        like_samples, cold_samples, warm_samples = [], [], []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            for query in queries:
+                Room.objects.filter(name__icontains=query).first()
+            like_samples.append((time.perf_counter() - start) * 1000)
+
+        build_start = time.perf_counter()
+        resolver = RoomTypeResolver(rooms, normalize_room_name)
+        build_ms = (time.perf_counter() - build_start) * 1000
+
+        for _ in range(iterations):
+            # A fresh resolver per sample, so only the first lookup of each query is uncached
+            cold = RoomTypeResolver(rooms, normalize_room_name)
+            start = time.perf_counter()
+            for query in queries:
+                cold.resolve(query)
+            cold_samples.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            for query in queries:
+                resolver.resolve(query)
+            warm_samples.append((time.perf_counter() - start) * 1000)
+
+        catalog = get_room_catalog()
+        matches = {}
+        for query in QUERIES:
+            like_room = Room.objects.filter(name__icontains=query).first()
+            resolved = catalog.resolve(query)
+            matches[query] = {
+                'icontains': like_room.name if like_room else None,
+                'resolver': resolved.name if resolved else None,
+            }
+
+        return {
+            'rooms': len(rooms),
+            'icontains_query': summarize(like_samples),
+            'resolver_cold': summarize(cold_samples),
+            'resolver_warm': summarize(warm_samples),
+            'resolver_build_ms': round(build_ms, 3),
+            'matches': matches,
+        }
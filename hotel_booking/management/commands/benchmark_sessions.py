@@ -0,0 +1,92 @@
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from hotel_booking.benchmarking import isolated_database, seed_bookings, seed_rooms, summarize, write_results
+
+SESSION_TABLE = 'django_session'
+
+
+class Command(BaseCommand):
+    help = ("Compare the session profiles (see SESSION_PROFILE in settings) by django_session "
+            "reads/writes, queries and latency per request on the booking and chat pages.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', choices=sorted(settings.SESSION_ENGINES),
+                            help='Profile to measure; repeat for several (default: all)')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per page and profile')
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+
+    def handle(self, *args, **options):
+        profiles = options['profile'] or list(settings.SESSION_ENGINES)
+        results = {}
+        with isolated_database():
+            rooms = seed_rooms()
+            user = User.objects.create_user('bench_guest', 'bench@example.com', 'bench-password')
+            seed_bookings(rooms, 'Bench Guest', 5)
+            pages = {
+                'index': ('get', reverse('index'), None),
+                'profile': ('get', reverse('user_profile'), None),
+                'chat': ('post', reverse('chatbot_api'), json.dumps({'message': 'hello', 'session': {}})),
+            }
+            for profile in profiles:
+                with override_settings(SESSION_ENGINE=settings.SESSION_ENGINES[profile]):
+                    caches[settings.SESSION_CACHE_ALIAS].clear()
+                    results[profile] = self._run(user, pages, options['requests'])
+
+        self.stdout.write(f"Per request, averaged over {options['requests']} requests per page:")
+        self.stdout.write(f"  {'profile':<15} {'page':<13} {'sess reads':>10} {'sess writes':>11} "
+                          f"{'queries':>8} {'p50 ms':>8}")
+        for profile, pages_result in results.items():
+            for page, result in pages_result.items():
+                self.stdout.write(f"  {profile:<15} {page:<13} {result['session_reads']:>10} "
+                                  f"{result['session_writes']:>11} {result['queries']:>8} "
+                                  f"{result['latency']['p50_ms']:>8}"
+                                  + (f"  ({result['errors']} errors)" if result['errors'] else ''))
+
+        if options['output']:
+            write_results(options['output'], 'sessions', results)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _run(self, user, pages, requests):
+        client = Client()
+        client.force_login(user)
+        results = {}
+        for page, (method, url, body) in pages.items():
+            reads = writes = queries = errors = 0
+            samples = []
+            for _ in range(requests):
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    if method == 'post':
+                        response = client.post(url, data=body, content_type='application/json')
+                    else:
+                        response = client.get(url)
+                    samples.append((time.perf_counter() - start) * 1000)
+                if response.status_code >= 400:
+                    errors += 1
+                for query in captured.captured_queries:
+                    sql = query['sql']
+                    if SESSION_TABLE not in sql:
+                        continue
+                    if sql.lstrip().upper().startswith('SELECT'):
+                        reads += 1
+                    else:
+                        writes += 1
+                queries += len(captured.captured_queries)
+            results[page] = {
+                'session_reads': round(reads / requests, 2),
+                'session_writes': round(writes / requests, 2),
+                'queries': round(queries / requests, 2),
+                'latency': summarize(samples),
+                'errors': errors,
+            }
+        return results
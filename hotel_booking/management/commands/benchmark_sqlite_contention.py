@@ -0,0 +1,142 @@
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.utils import timezone
+
+from hotel_booking.benchmarking import seed_bookings, seed_rooms, summarize, write_results
+from project.database import sqlite_database
+
+PROFILES = ('stock', 'tuned')
+
+
+def _worker(worker, seconds, write_ratio, results):
+    """Mixed booking writes and availability reads until the deadline, in a forked process."""
+    from hotel_booking.models import Booking, Room
+
+    # Keep the per-booking INFO lines of every worker out of the logs
+    logging.disable(logging.WARNING)
+    rng = random.Random(worker)
+    rooms = list(Room.objects.all())
+    today = timezone.now().date()
+    counts = {'reads': 0, 'writes': 0, 'lock_errors': 0, 'other_errors': 0}
+    latency = {'read': [], 'write': []}
+
+    deadline = time.monotonic() + seconds
+    i = 0
+    while time.monotonic() < deadline:
+        i += 1
+        room = rng.choice(rooms)
+        check_in = today + timedelta(days=rng.randint(1, 365))
+        check_out = check_in + timedelta(days=rng.randint(1, 4))
+        write = rng.random() < write_ratio
+        start = time.perf_counter()
+        try:
+            if write:
+                # Read-then-write like the chat booking flow
+                with transaction.atomic():
+                    Booking.objects.overlapping(check_in, check_out).filter(room=room).exists()
+                    Booking.objects.create(
+                        room=room, guest_name=f'Contention {worker}', guest_email=f'worker{worker}@example.com',
+                        check_in_date=check_in, check_out_date=check_out, status='pending',
+                        booking_id=f'CT-{worker}-{i}',
+                    )
+            else:
+                list(Room.get_available_rooms(check_in, check_out))
+                Booking.objects.filter(guest_email=f'worker{rng.randrange(8)}@example.com').first()
+        except OperationalError as e:
+            counts['lock_errors' if 'locked' in str(e) else 'other_errors'] += 1
+            continue
+        latency['write' if write else 'read'].append((time.perf_counter() - start) * 1000)
+        counts['writes' if write else 'reads'] += 1
+    connection.close()
+    results.put({'counts': counts, 'latency': latency})
+
+
+class Command(BaseCommand):
+    help = ("Run several processes reading and writing bookings in one SQLite file, with Django's "
+            "stock SQLite settings and with project/database.py's tuning, and report throughput "
+            "and the rate of 'database is locked' errors.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', choices=PROFILES,
+                            help='Profile to measure; repeat for several (default: all)')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent processes')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Run time per profile')
+        parser.add_argument('--write-ratio', type=float, default=0.3, help='Share of operations that write')
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+
+    def handle(self, *args, **options):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError("This benchmark needs the 'fork' start method")
+        if connection.vendor != 'sqlite':
+            raise CommandError("The default database is not SQLite")
+
+        original = dict(connection.settings_dict)
+        results = {}
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                for profile in options['profile'] or PROFILES:
+                    path = os.path.join(directory, f'{profile}.sqlite3')
+                    self._use(sqlite_database(path, tuned=profile == 'tuned'))
+                    call_command('migrate', verbosity=0, interactive=False)
+                    seed_bookings(seed_rooms(), 'Seed Guest', 50)
+                    results[profile] = self._run(options['workers'], options['seconds'], options['write_ratio'])
+        finally:
+            self._use(original)
+
+        self.stdout.write(f"{options['workers']} processes, {options['seconds']}s, "
+                          f"{options['write_ratio']:.0%} writes:")
+        for profile, result in results.items():
+            self.stdout.write(
+                f"  {profile:<6} {result['ops_per_sec']:>8} ops/s  writes {result['writes']:>6}  "
+                f"reads {result['reads']:>6}  locked {result['lock_errors']:>5} ({result['lock_error_rate']:.1%})  "
+                f"write p95 {result['write_latency'].get('p95_ms', 0)} ms  read p95 {result['read_latency'].get('p95_ms', 0)} ms"
+            )
+
+        if options['output']:
+            write_results(options['output'], 'sqlite_contention', results)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _use(self, settings_dict):
+        connection.close()
+        connection.settings_dict.clear()
+        connection.settings_dict.update(settings_dict)
+        # Fill in the keys Django defaults (TIME_ZONE, TEST, ...)
+        connections.configure_settings({connection.alias: connection.settings_dict})
+
+    def _run(self, workers, seconds, write_ratio):
+        connection.close()
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        processes = [context.Process(target=_worker, args=(i, seconds, write_ratio, queue)) for i in range(workers)]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        outcomes = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        totals = {'reads': 0, 'writes': 0, 'lock_errors': 0, 'other_errors': 0}
+        read_latency, write_latency = [], []
+        for outcome in outcomes:
+            for key, value in outcome['counts'].items():
+                totals[key] += value
+            read_latency += outcome['latency']['read']
+            write_latency += outcome['latency']['write']
+        attempts = totals['reads'] + totals['writes'] + totals['lock_errors'] + totals['other_errors']
+        return {
+            **totals,
+            'ops_per_sec': round((totals['reads'] + totals['writes']) / elapsed, 1),
+            'lock_error_rate': totals['lock_errors'] / attempts if attempts else 0.0,
+            'read_latency': summarize(read_latency),
+            'write_latency': summarize(write_latency),
+        }
@@ -0,0 +1,58 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.utils import timezone
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ("Delete expired rows from django_session in batches, pausing between them so "
+            "requests writing to the same SQLite file aren't locked out. Unlike clearsessions "
+            "this works whatever SESSION_ENGINE is, so rows left from an earlier profile go too.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Sessions deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches')
+        parser.add_argument('--limit', type=int, help='Stop after this many sessions')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the expired sessions')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        if options['limit'] is not None and options['limit'] < 1:
+            raise CommandError("--limit must be at least 1")
+
+        now = timezone.now()
+        expired = Session.objects.filter(expire_date__lt=now)
+        if options['dry_run']:
+            self.stdout.write(f"{expired.count()} expired sessions would be deleted "
+                              f"(SESSION_ENGINE is {settings.SESSION_ENGINE})")
+            return
+
+        limit = options['limit']
+        deleted = 0
+        started = time.perf_counter()
+        while limit is None or deleted < limit:
+            size = options['batch_size'] if limit is None else min(options['batch_size'], limit - deleted)
+            keys = list(expired.order_by('expire_date').values_list('session_key', flat=True)[:size])
+            if not keys:
+                break
+            with transaction.atomic():
+                # Re-check the expiry: a request may have extended the session since
+                batch, _ = Session.objects.filter(session_key__in=keys, expire_date__lt=now).delete()
+            deleted += batch
+            if not connection.force_debug_cursor:
+                reset_queries()
+            if len(keys) < size:
+                break
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired sessions in {elapsed:.2f}s"))
@@ -0,0 +1,65 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from hotel_booking.booking_io import DEFAULT_CHUNK_SIZE, FORMATS, detect_format, export_rows, write_rows
+from hotel_booking.models import Booking
+
+# Rows between progress lines
+PROGRESS_EVERY = 50000
+
+
+class Command(BaseCommand):
+    help = "Stream bookings to a CSV or JSON lines file (the format import_bookings reads)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help="Destination file, or '-' for stdout (default)")
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the output extension, else csv')
+        parser.add_argument('--status', action='append', choices=[s for s, _ in Booking.STATUS_CHOICES],
+                            help='Only export bookings in this status (repeatable)')
+        parser.add_argument('--check-in-from', help='Only stays checking in on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--check-in-to', help='Only stays checking in on or before this date (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Rows fetched from the database at a time')
+
+    def handle(self, *args, **options):
+        fmt = detect_format(options['output'], options['format'])
+        queryset = Booking.objects.all()
+        if options['status']:
+            queryset = queryset.filter(status__in=options['status'])
+        if options['check_in_from']:
+            queryset = queryset.filter(check_in_date__gte=self._date(options['check_in_from'], '--check-in-from'))
+        if options['check_in_to']:
+            queryset = queryset.filter(check_in_date__lte=self._date(options['check_in_to'], '--check-in-to'))
+
+        to_stdout = options['output'] == '-'
+        stream = sys.stdout if to_stdout else open(options['output'], 'w', newline='', encoding='utf-8')
+        started = time.perf_counter()
+        try:
+            count = write_rows(stream, fmt, self._with_progress(export_rows(queryset, options['chunk_size']), started))
+        finally:
+            if not to_stdout:
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        # Progress goes to stderr so stdout can carry the data
+        self.stderr.write(self.style.SUCCESS(f"Exported {count} bookings in {elapsed:.1f}s ({rate:.0f} rows/sec)"))
+
+    def _with_progress(self, rows, started):
+        for count, row in enumerate(rows, 1):
+            if count % PROGRESS_EVERY == 0:
+                elapsed = time.perf_counter() - started
+                self.stderr.write(f"  {count} rows, {count / elapsed:.0f} rows/sec")
+            yield row
+
+    def _date(self, value, option):
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise CommandError(f"{option} must be a date (YYYY-MM-DD), got {value!r}")
+        return day
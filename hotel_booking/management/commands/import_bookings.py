@@ -0,0 +1,102 @@
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hotel_booking.booking_io import DEFAULT_BATCH_SIZE, FORMATS, BookingImporter, detect_format, read_rows
+from hotel_booking.reporting import rebuild_rollups
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 1.0
+# Errors printed when no --errors file is given
+PRINTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = ("Import bookings from a CSV or JSON lines file in batches (bulk_create/bulk_update). "
+            "Rows whose booking_id exists update that booking.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSON lines file, or '-' for stdin")
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Rows validated and written per transaction')
+        parser.add_argument('--no-update', action='store_true', help='Reject rows whose booking_id already exists')
+        parser.add_argument('--allow-past', action='store_true',
+                            help='Accept check-in dates in the past (historical data)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate every row, then roll back')
+        parser.add_argument('--errors', help='Write every rejected row to this CSV file')
+        parser.add_argument('--skip-rollups', action='store_true',
+                            help='Do not refresh the reporting rollups of the imported dates')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        fmt = detect_format(options['path'], options['format'])
+
+        error_file = error_writer = None
+        if options['errors']:
+            error_file = open(options['errors'], 'w', newline='', encoding='utf-8')
+            error_writer = csv.writer(error_file)
+            error_writer.writerow(['line', 'booking_id', 'error'])
+
+        def on_error(error):
+            if error_writer:
+                error_writer.writerow([error.line, error.booking_id or '', error.message])
+
+        importer = BookingImporter(
+            batch_size=options['batch_size'],
+            update_existing=not options['no_update'],
+            allow_past=options['allow_past'],
+            dry_run=options['dry_run'],
+            on_error=on_error,
+        )
+        try:
+            stream = sys.stdin if options['path'] == '-' else self._open(options['path'])
+            try:
+                result = importer.run(read_rows(stream, fmt), progress=self._progress())
+            finally:
+                if stream is not sys.stdin:
+                    stream.close()
+        finally:
+            if error_file:
+                error_file.close()
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result.processed} rows in {result.elapsed:.1f}s ({result.rows_per_second:.0f} rows/sec): "
+            f"{result.created} created, {result.updated} updated, {result.failed} rejected"
+        ))
+        if result.failed and not error_writer:
+            for error in result.errors[:PRINTED_ERRORS]:
+                self.stderr.write(f"  {error}")
+            if result.failed > PRINTED_ERRORS:
+                self.stderr.write(f"  ... {result.failed - PRINTED_ERRORS} more (use --errors to see all)")
+
+        if options['dry_run'] or options['skip_rollups'] or not result.stay_range:
+            return
+        start, end = result.stay_range
+        nights = rebuild_rollups(start, end)
+        self.stdout.write(f"Refreshed reporting rollups for {nights} nights ({start} to {end})")
+
+    def _open(self, path):
+        try:
+            # utf-8-sig drops the BOM spreadsheet exports start with
+            return open(path, newline='', encoding='utf-8-sig')
+        except OSError as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+
+    def _progress(self):
+        last = [time.perf_counter()]
+
+        def report(result):
+            now = time.perf_counter()
+            if now - last[0] < PROGRESS_INTERVAL:
+                return
+            last[0] = now
+            self.stdout.write(
+                f"  {result.processed} rows, {result.rows_per_second:.0f} rows/sec "
+                f"({result.created} created, {result.updated} updated, {result.failed} rejected)"
+            )
+        return report
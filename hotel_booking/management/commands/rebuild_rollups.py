@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from hotel_booking.reporting import REBUILD_WINDOW_DAYS, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily revenue and occupancy rollups from the bookings."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First night to rebuild (YYYY-MM-DD); default: earliest check-in')
+        parser.add_argument('--end', help='Night after the last one to rebuild (YYYY-MM-DD); default: latest check-out')
+        parser.add_argument('--window-days', type=int, default=REBUILD_WINDOW_DAYS,
+                            help='Nights recomputed per transaction')
+
+    def handle(self, *args, **options):
+        start = self._date(options['start'], '--start')
+        end = self._date(options['end'], '--end')
+        if start and end and end <= start:
+            raise CommandError("--end must be after --start")
+        if options['window_days'] < 1:
+            raise CommandError("--window-days must be at least 1")
+
+        started = time.perf_counter()
+        nights = rebuild_rollups(start, end, window_days=options['window_days'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {nights} nights of rollups in {elapsed:.2f}s"))
+
+    def _date(self, value, option):
+        if not value:
+            return None
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise CommandError(f"{option} must be a date (YYYY-MM-DD), got {value!r}")
+        return day
@@ -1,40 +1,63 @@
 import logging
-import traceback
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.exceptions import BadRequest, PermissionDenied, SuspiciousOperation
+from django.http import FileResponse, Http404, JsonResponse
 from django.contrib.auth import get_user_model
-from django.contrib.auth.models import User
 from django.contrib import auth
 from django.contrib.sessions.models import Session
 from django.utils import timezone
 from django.contrib.sessions.backends.db import SessionStore
 
+from .db_routing import conversation
+from .error_reporting import format_exception, report_exception
+from .identity import get_admin_user, get_user
+from .metrics import REGISTRY as metrics_registry
+from .request_timing import AsyncTimedStream, TimedStream, track_request
+
 logger = logging.getLogger(__name__)
+perf_logger = logging.getLogger('hotel_booking.perf')
+
+class ExceptionMiddleware:
+    """
+    Turn unhandled exceptions into JSON 500 responses.
+
+    Exceptions are grouped, counted and rate limited by ``error_reporting``,
+    so the traceback is formatted at most once per exception, and only when
+    it is logged or DEBUG is on. With DEBUG the body carries the details and
+    traceback; otherwise just a generic error and the fingerprint to look for
+    in the logs. ``CLIENT_ERRORS`` are left to Django's 404/403/400 handling.
+    """
+
+    CLIENT_ERRORS = (Http404, PermissionDenied, BadRequest, SuspiciousOperation)
 
-class DebugMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
         try:
-            response = self.get_response(request)
-            return response
+            return self.get_response(request)
         except Exception as e:
-            logger.error(f"Unhandled exception: {str(e)}")
-            logger.error(traceback.format_exc())
-            return JsonResponse({
-                'error': 'Server internal error',
-                'details': str(e),
-                'traceback': traceback.format_exc()
-            }, status=500)
+            response = self.process_exception(request, e)
+            if response is None:
+                raise
+            return response
 
     def process_exception(self, request, exception):
-        logger.error(f"Exception in request: {str(exception)}")
-        logger.error(traceback.format_exc())
-        return JsonResponse({
-            'error': 'Server internal error',
-            'details': str(exception),
-            'traceback': traceback.format_exc()
-        }, status=500)
+        if isinstance(exception, self.CLIENT_ERRORS):
+            return None
+        key, formatted = report_exception(exception, request)
+        body = {'error': 'Server internal error', 'fingerprint': key}
+        if settings.DEBUG:
+            body['details'] = str(exception)
+            body['traceback'] = formatted or format_exception(exception)
+        response = JsonResponse(body, status=500)
+        # Already logged (or deliberately not) above; keeps django.request quiet
+        response._has_been_logged = True
+        return response
+
+
+# Old name, still referenced by older settings modules
+DebugMiddleware = ExceptionMiddleware
 
 
 class SeparateAdminSessionMiddleware:
@@ -51,16 +74,16 @@ class SeparateAdminSessionMiddleware:
     
     def __init__(self, get_response):
         self.get_response = get_response
-        # Get admin user for admin panel
+        # The admin user is looked up per request through the identity cache,
+        # so a superuser created or changed later is picked up
         try:
-            self.admin_user = User.objects.filter(is_superuser=True, is_active=True).first()
-            if self.admin_user:
-                logger.info(f"Admin user found: {self.admin_user.username}")
+            admin_user = get_admin_user()
+            if admin_user:
+                logger.info(f"Admin user found: {admin_user.username}")
             else:
                 logger.warning("No admin user found")
         except Exception as e:
             logger.error(f"Error finding admin user: {str(e)}")
-            self.admin_user = None
     
     def __call__(self, request):
         # Handle admin panel requests ONLY
@@ -75,13 +98,17 @@ class SeparateAdminSessionMiddleware:
         Handle admin panel requests with forced admin login.
         This method ONLY affects /admin/ URLs and does NOT touch other sessions.
         """
-        if not self.admin_user:
+        # Already the admin: no lookup needed
+        if request.user.is_authenticated and request.user.is_superuser:
+            return self.get_response(request)
+
+        admin_user = get_admin_user()
+        if not admin_user:
             return self.get_response(request)
         
         # Force admin login ONLY for admin panel access
-        if not (request.user.is_authenticated and request.user.is_superuser):
-            auth.login(request, self.admin_user)
-            logger.info(f"Admin user {self.admin_user.username} logged in for admin panel")
+        auth.login(request, admin_user)
+        logger.info(f"Admin user {admin_user.username} logged in for admin panel")
         
         return self.get_response(request)
 
@@ -108,14 +135,75 @@ class SessionIsolationMiddleware:
         return response
 
 
+class ReadYourWritesMiddleware:
+    """
+    Keep a session's reads on the primary database for a while after it
+    writes a booking or room, so staff see their own changes on the
+    replica-backed dashboards (see ``db_routing.py``).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with conversation(request.session):
+            return self.get_response(request)
+
+
+class RequestTimingMiddleware:
+    """
+    Per-request timing breakdown: DB time and query count, NLP phases,
+    template rendering and email (see ``request_timing.py``).
+
+    Writes one compact JSON line per request to the ``hotel_booking.perf``
+    logger and sets a ``Server-Timing`` header. Listed first in MIDDLEWARE so
+    the total covers the other middleware too. Streaming responses are logged
+    once their body has been sent, and get no header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with track_request() as timing:
+            response = self.get_response(request)
+        # Files are read as they are sent, not generated; keep their sendfile path
+        if response.streaming and not isinstance(response, FileResponse):
+            stream = AsyncTimedStream if response.is_async else TimedStream
+            response.streaming_content = stream(timing, response.streaming_content,
+                                                lambda: self.log(request, response, timing))
+            return response
+        response['Server-Timing'] = timing.server_timing()
+        self.log(request, response, timing)
+        return response
+
+    def log(self, request, response, timing):
+        if perf_logger.isEnabledFor(logging.INFO):
+            perf_logger.info(timing.as_json(request, response))
+
+
+class MetricsMiddleware:
+    """Write this worker's metrics for /metrics to aggregate (see ``metrics.py``)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        metrics_registry.flush_if_due()
+        return response
+
+
 # Utility functions for session management
 def ensure_admin_login(request):
     """
     Utility function to ensure admin user is logged in for admin operations.
     """
     try:
-        admin_user = User.objects.filter(is_superuser=True, is_active=True).first()
-        if admin_user and not (request.user.is_authenticated and request.user.is_superuser):
+        if request.user.is_authenticated and request.user.is_superuser:
+            return False
+        admin_user = get_admin_user()
+        if admin_user:
             auth.login(request, admin_user)
             logger.info(f"Admin user {admin_user.username} logged in via utility function")
             return True
@@ -130,8 +218,7 @@ def get_hotel_booking_user(request):
     if hasattr(request, 'session'):
         hotel_user_id = request.session.get('hotel_user_id')
         if hotel_user_id:
-            try:
-                return User.objects.get(id=hotel_user_id, is_active=True)
-            except User.DoesNotExist:
-                pass
+            user = get_user(hotel_user_id)
+            if user is not None and user.is_active:
+                return user
     return None
\ No newline at end of file
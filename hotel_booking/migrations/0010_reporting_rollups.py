@@ -0,0 +1,58 @@
+# Generated by Django 5.2 on 2026-10-19 10:56
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel_booking', '0009_booking_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAddonRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('addon_type', models.CharField(choices=[('breakfast', 'Breakfast Service'), ('transport', 'Airport Transfer Service')], max_length=20)),
+                ('quantity', models.IntegerField(default=0, help_text='Add-ons sold')),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+            ],
+            options={
+                'verbose_name': 'Daily Add-on Revenue',
+                'verbose_name_plural': 'Daily Add-on Revenue',
+                'ordering': ['date', 'addon_type'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('rooms_available', models.IntegerField(default=0, help_text='Rooms in the catalog when the night was computed')),
+                ('rooms_sold', models.IntegerField(default=0, help_text='Rooms occupied by non-cancelled bookings')),
+                ('room_revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('addon_revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('arrivals', models.IntegerField(default=0)),
+                ('cancellations', models.IntegerField(default=0, help_text='Cancelled bookings due to check in on this date')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Daily Revenue Rollup',
+                'verbose_name_plural': 'Daily Revenue Rollups',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['check_in_date', 'check_out_date'], name='booking_stay_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyaddonrevenue',
+            constraint=models.UniqueConstraint(fields=('date', 'addon_type'), name='daily_addon_revenue_unique'),
+        ),
+    ]
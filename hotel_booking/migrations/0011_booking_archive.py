@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-19 11:52
+
+import django.core.serializers.json
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel_booking', '0010_reporting_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(help_text='Primary key the booking had in the live table', unique=True)),
+                ('room_id', models.BigIntegerField(blank=True, null=True)),
+                ('room_name', models.CharField(max_length=100)),
+                ('room_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('guest_name', models.CharField(max_length=100)),
+                ('guest_email', models.EmailField(max_length=254)),
+                ('guest_phone', models.CharField(blank=True, max_length=20)),
+                ('check_in_date', models.DateField()),
+                ('check_out_date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('cancelled', 'Cancelled'), ('completed', 'Completed')], max_length=20)),
+                ('booking_id', models.CharField(blank=True, max_length=20, null=True, unique=True)),
+                ('base_total', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('addon_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('addons_data', models.JSONField(blank=True, default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('room_services_data', models.JSONField(blank=True, default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Archived Booking',
+                'verbose_name_plural': 'Archived Bookings',
+                'indexes': [models.Index(fields=['user', 'created_at'], name='archive_user_created_idx'), models.Index(fields=['check_in_date', 'check_out_date'], name='archive_stay_idx'), models.Index(fields=['guest_email'], name='archive_guest_email_idx')],
+            },
+        ),
+    ]
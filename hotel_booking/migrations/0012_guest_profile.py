@@ -0,0 +1,85 @@
+# Generated by Django 5.2 on 2026-10-19 12:11
+
+import re
+
+from django.db import migrations, models
+from django.utils import timezone
+
+BACKFILL_CHUNK_SIZE = 2000
+
+# Frozen copies of hotel_booking.guest_profiles as of this migration; later
+# changes there must not change what the backfill did
+RETURNING_STATUSES = ['approved', 'completed']
+MIN_PHONE_DIGITS = 7
+PROFILE_UPDATE_FIELDS = ['guest_name', 'name_key', 'phone', 'phone_key', 'last_booking_id', 'updated_at']
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def normalize_phone(phone):
+    digits = re.sub(r'\D', '', phone or '')
+    return digits if len(digits) >= MIN_PHONE_DIGITS else ''
+
+
+def name_key(name):
+    return ' '.join((name or '').lower().split())
+
+
+def backfill_guest_profiles(apps, schema_editor):
+    GuestProfile = apps.get_model('hotel_booking', 'GuestProfile')
+    now = timezone.now()
+    # Archived bookings first and oldest first, so each guest ends up with their latest details
+    for model_name in ('BookingArchive', 'Booking'):
+        rows = (
+            apps.get_model('hotel_booking', model_name).objects
+            .filter(status__in=RETURNING_STATUSES)
+            .order_by('updated_at', 'pk')
+            .values_list('guest_email', 'guest_name', 'guest_phone', 'booking_id')
+        )
+        profiles = {}
+        for email, guest_name, phone, booking_id in rows.iterator(chunk_size=BACKFILL_CHUNK_SIZE):
+            email = normalize_email(email)
+            if not email:
+                continue
+            profiles[email] = GuestProfile(
+                email=email, guest_name=guest_name, name_key=name_key(guest_name), phone=phone or '',
+                phone_key=normalize_phone(phone), last_booking_id=booking_id or '', created_at=now, updated_at=now,
+            )
+            if len(profiles) >= BACKFILL_CHUNK_SIZE:
+                GuestProfile.objects.bulk_create(profiles.values(), update_conflicts=True, unique_fields=['email'],
+                                                 update_fields=PROFILE_UPDATE_FIELDS)
+                profiles = {}
+        GuestProfile.objects.bulk_create(profiles.values(), update_conflicts=True, unique_fields=['email'],
+                                         update_fields=PROFILE_UPDATE_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel_booking', '0011_booking_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GuestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(help_text='Lower-cased guest email', max_length=254, unique=True)),
+                ('guest_name', models.CharField(max_length=100)),
+                ('name_key', models.CharField(db_index=True, help_text='Lower-cased name with single spaces', max_length=100)),
+                ('phone', models.CharField(blank=True, max_length=20)),
+                ('phone_key', models.CharField(blank=True, db_index=True, help_text='Digits of the phone number', max_length=20)),
+                ('last_booking_id', models.CharField(blank=True, max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Guest Profile',
+                'verbose_name_plural': 'Guest Profiles',
+                'ordering': ['-updated_at'],
+            },
+        ),
+        migrations.RunPython(backfill_guest_profiles, migrations.RunPython.noop),
+    ]
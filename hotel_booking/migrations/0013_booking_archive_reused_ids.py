@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel_booking', '0012_guest_profile'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookingarchive',
+            name='booking_id',
+            field=models.CharField(blank=True, db_index=True, max_length=20, null=True),
+        ),
+    ]
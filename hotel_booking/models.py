@@ -1,9 +1,20 @@
+from datetime import timedelta
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import (
+    Case, Count, DecimalField, ExpressionWrapper, F, Func, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value,
+    When,
+)
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.exceptions import ValidationError
 import logging
 
+from .metrics import availability_check_seconds
+
 logger = logging.getLogger(__name__)
 
 class UserProfile(models.Model):
@@ -130,13 +141,12 @@ class Room(models.Model):
             raise
 
     @classmethod
+    @availability_check_seconds.time()
     def get_available_rooms(cls, check_in_date, check_out_date):
         try:
             # Find rooms that are booked during the requested period
-            booked_rooms = Booking.objects.filter(
-                check_in_date__lt=check_out_date,
-                check_out_date__gt=check_in_date,
-                status__in=['pending', 'approved']  # Consider both pending and approved bookings
+            booked_rooms = Booking.objects.overlapping(check_in_date, check_out_date).filter(
+                status__in=Booking.BLOCKING_STATUSES  # Consider both pending and approved bookings
             ).values_list('room_id', flat=True)
             available_rooms = cls.objects.exclude(id__in=booked_rooms)
             logger.info(f"Available rooms found: {available_rooms.count()} for dates {check_in_date} to {check_out_date}")
@@ -149,6 +159,146 @@ class Room(models.Model):
         verbose_name = "Room"
         verbose_name_plural = "Rooms"
 
+class MoneyField(DecimalField):
+    """
+    Output field for computed money annotations.
+
+    SQLite hands back computed decimals as floats that Django doesn't
+    quantize, so values are rounded to cents here to compare equal (digit for
+    digit) with the Python methods.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_digits', 12)
+        kwargs.setdefault('decimal_places', 2)
+        super().__init__(**kwargs)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return Decimal(value).quantize(CENT)
+
+
+CENT = Decimal('0.01')
+MONEY_FIELD = MoneyField()
+
+
+def addon_line_total():
+    """``BookingAddon.get_total_price()`` as an expression over BookingAddon rows."""
+    return Case(
+        When(Q(addon_type='breakfast', breakfast_count__isnull=False) & ~Q(breakfast_count=0),
+             then=F('price') * F('breakfast_count')),
+        default=F('price'),
+        output_field=MONEY_FIELD,
+    )
+
+
+class DateDiffDays(Func):
+    """Whole days from ``start`` to ``end`` (``end - start``) for two date expressions."""
+    output_field = IntegerField()
+    arg_joiner = ' - '
+    template = '(%(expressions)s)'
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='CAST(julianday(%(expressions)s) AS INTEGER)',
+                           arg_joiner=') - julianday(', **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='DATEDIFF', template='%(function)s(%(expressions)s)',
+                           arg_joiner=', ', **extra_context)
+
+
+def longest_stay_nights():
+    """
+    Nights of the longest live or archived booking, from one aggregate query.
+
+    Only a hint for a batch of ``overlapping()`` queries run straight after
+    it (see ``reporting.rebuild_rollups``); don't keep it around, as a longer
+    stay saved later would be missed.
+    """
+    return max(
+        queryset.aggregate(longest=Max(DateDiffDays('check_out_date', 'check_in_date')))['longest'] or 0
+        for queryset in (Booking.objects.all(), BookingArchive.objects.all())
+    )
+
+
+class StayQuerySet(models.QuerySet):
+    """Queries shared by the live and archived booking tables."""
+
+    def overlapping(self, start, end, longest_stay=None):
+        """
+        Bookings with at least one night in ``[start, end)``.
+
+        ``longest_stay`` (nights, from ``longest_stay_nights()``) also bounds
+        the check-in range from below, which keeps the ``booking_stay_idx``
+        scan short on a long history. Availability and double-booking checks
+        must not pass it: a stale bound hides long stays.
+        """
+        queryset = self.filter(check_in_date__lt=end, check_out_date__gt=start)
+        if longest_stay is not None:
+            queryset = queryset.filter(check_in_date__gt=start - timedelta(days=longest_stay))
+        return queryset
+
+
+class BookingQuerySet(StayQuerySet):
+    def for_listing(self):
+        """Load each booking's room and user, and compute its totals, in a single query."""
+        return self.select_related('room', 'user').with_totals()
+
+    def with_totals(self):
+        """
+        Annotate the money of each booking in SQL, matching the Python methods:
+
+        - ``nights``: ``get_duration()``
+        - ``base_total``: ``get_total_price()`` (room price x nights)
+        - ``addon_total``: sum of ``BookingAddon.get_total_price()``
+        - ``grand_total``: ``get_total_with_addons()``
+        """
+        return self.with_addon_total().annotate(
+            nights=DateDiffDays('check_out_date', 'check_in_date'),
+        ).annotate(
+            base_total=ExpressionWrapper(F('room__price') * F('nights'), output_field=MONEY_FIELD),
+        ).annotate(
+            grand_total=ExpressionWrapper(F('base_total') + F('addon_total'), output_field=MONEY_FIELD),
+        )
+
+    def revenue(self):
+        """Booking count, nights and money totals over the whole queryset in one aggregate query."""
+        # Aggregate aliases must differ from the annotation names they sum
+        sums = self.with_totals().aggregate(
+            sum_bookings=Count('id'),
+            sum_nights=Sum('nights'),
+            sum_base_total=Sum('base_total', output_field=MONEY_FIELD),
+            sum_addon_total=Sum('addon_total', output_field=MONEY_FIELD),
+            sum_grand_total=Sum('grand_total', output_field=MONEY_FIELD),
+        )
+        # SUM() over no rows is NULL
+        return {
+            'bookings': sums['sum_bookings'],
+            'nights': sums['sum_nights'] or 0,
+            'base_total': sums['sum_base_total'] or Decimal('0.00'),
+            'addon_total': sums['sum_addon_total'] or Decimal('0.00'),
+            'grand_total': sums['sum_grand_total'] or Decimal('0.00'),
+        }
+
+    def with_addon_total(self):
+        """Annotate ``addon_total``, the sum of ``BookingAddon.get_total_price()``, in SQL."""
+        addon_totals = (
+            BookingAddon.objects.filter(booking=OuterRef('pk'))
+            .order_by()
+            .values('booking')
+            .annotate(total=Sum(addon_line_total()))
+            .values('total')
+        )
+        return self.annotate(
+            addon_total=Coalesce(Subquery(addon_totals, output_field=MONEY_FIELD), Value(Decimal('0.00')),
+                                 output_field=MONEY_FIELD)
+        )
+
+
 class Booking(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -156,6 +306,10 @@ class Booking(models.Model):
         ('cancelled', 'Cancelled'),
         ('completed', 'Completed')
     ]
+    # Statuses that hold a room for their dates
+    BLOCKING_STATUSES = ['pending', 'approved']
+    # BookingArchive rows say True (see archive.py)
+    is_archived = False
 
     room = models.ForeignKey(Room, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
@@ -169,6 +323,8 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BookingQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.guest_name} - {self.room.name} ({self.booking_id or 'No ID'})"
 
@@ -201,11 +357,32 @@ class Booking(models.Model):
         return (self.check_out_date - self.check_in_date).days
 
     def get_total_price(self):
+        # Use the with_totals() annotation when present
+        if hasattr(self, 'base_total'):
+            return self.base_total
         return self.room.price * self.get_duration()
 
+    def get_addon_total(self):
+        # Use the with_addon_total() annotation when present, otherwise the (prefetched) add-ons
+        if hasattr(self, 'addon_total'):
+            return self.addon_total
+        return sum((addon.get_total_price() for addon in self.addons.all()), Decimal('0.00'))
+
+    def get_total_with_addons(self):
+        if hasattr(self, 'grand_total'):
+            return self.grand_total
+        return self.get_total_price() + self.get_addon_total()
+
     class Meta:
         verbose_name = "Booking"
         verbose_name_plural = "Bookings"
+        indexes = [
+            # Keyset pagination of booking lists (see pagination.py)
+            models.Index(fields=['created_at', 'id'], name='booking_created_keyset_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='booking_status_keyset_idx'),
+            # Stay-date range scans of the reporting rollups (see reporting.py)
+            models.Index(fields=['check_in_date', 'check_out_date'], name='booking_stay_idx'),
+        ]
 
 class ContactMessage(models.Model):
     name = models.CharField(max_length=100, verbose_name="Your Name")
@@ -222,4 +399,166 @@ class ContactMessage(models.Model):
     class Meta:
         verbose_name = "Contact Message"
         verbose_name_plural = "Contact Messages"
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+class GuestProfile(models.Model):
+    """
+    A guest who has had an approved or completed booking, for returning-customer lookups.
+
+    Keyed by normalized email, with indexed phone and name keys; kept current
+    from bookings by ``guest_profiles.record_guests()``.
+    """
+    email = models.EmailField(unique=True, help_text="Lower-cased guest email")
+    guest_name = models.CharField(max_length=100)
+    name_key = models.CharField(max_length=100, db_index=True, help_text="Lower-cased name with single spaces")
+    phone = models.CharField(max_length=20, blank=True)
+    phone_key = models.CharField(max_length=20, blank=True, db_index=True, help_text="Digits of the phone number")
+    last_booking_id = models.CharField(max_length=20, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.guest_name} <{self.email}>"
+
+    class Meta:
+        verbose_name = "Guest Profile"
+        verbose_name_plural = "Guest Profiles"
+        ordering = ['-updated_at']
+
+class DailyRevenueRollup(models.Model):
+    """
+    Revenue and occupancy for one night, precomputed from bookings by reporting.py.
+
+    Room figures count the nights guests stay; add-ons and cancellations are
+    counted on the booking's check-in date.
+    """
+    date = models.DateField(unique=True)
+    rooms_available = models.IntegerField(default=0, help_text="Rooms in the catalog when the night was computed")
+    rooms_sold = models.IntegerField(default=0, help_text="Rooms occupied by non-cancelled bookings")
+    room_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    addon_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    arrivals = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0, help_text="Cancelled bookings due to check in on this date")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.date}: {self.rooms_sold}/{self.rooms_available} rooms, RM{self.room_revenue}"
+
+    class Meta:
+        verbose_name = "Daily Revenue Rollup"
+        verbose_name_plural = "Daily Revenue Rollups"
+        ordering = ['date']
+
+
+class DailyAddonRevenue(models.Model):
+    """Add-on revenue per check-in date and ``BookingAddon.addon_type`` (see reporting.py)."""
+    date = models.DateField()
+    addon_type = models.CharField(max_length=20, choices=BookingAddon.ADDON_TYPES)
+    quantity = models.IntegerField(default=0, help_text="Add-ons sold")
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+
+    def __str__(self):
+        return f"{self.date} {self.get_addon_type_display()}: RM{self.revenue}"
+
+    class Meta:
+        verbose_name = "Daily Add-on Revenue"
+        verbose_name_plural = "Daily Add-on Revenue"
+        ordering = ['date', 'addon_type']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'addon_type'], name='daily_addon_revenue_unique'),
+        ]
+
+
+class _ArchivedRelation(list):
+    """Snapshot rows of an archived booking, answering the RelatedManager calls read paths use."""
+
+    def all(self):
+        return self
+
+    def exists(self):
+        return bool(self)
+
+    def count(self):
+        return len(self)
+
+
+class BookingArchive(models.Model):
+    """
+    A booking moved out of the live table by ``archive_bookings`` (see archive.py).
+
+    The room, add-ons and room services are stored as snapshots, so archived
+    bookings read like Booking objects (``room.name``, ``addons.all()``,
+    ``get_total_with_addons()``) even after the room is edited or deleted.
+    """
+    original_id = models.BigIntegerField(unique=True, help_text="Primary key the booking had in the live table")
+    room_id = models.BigIntegerField(null=True, blank=True)
+    room_name = models.CharField(max_length=100)
+    room_price = models.DecimalField(max_digits=10, decimal_places=2)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    guest_name = models.CharField(max_length=100)
+    guest_email = models.EmailField()
+    guest_phone = models.CharField(max_length=20, blank=True)
+    check_in_date = models.DateField()
+    check_out_date = models.DateField()
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    # Not unique: live ids are only checked against the live table, so a new
+    # booking can reuse the id of an archived one
+    booking_id = models.CharField(max_length=20, blank=True, null=True, db_index=True)
+    base_total = models.DecimalField(max_digits=12, decimal_places=2)
+    addon_total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    addons_data = models.JSONField(default=list, blank=True, encoder=DjangoJSONEncoder)
+    room_services_data = models.JSONField(default=list, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = StayQuerySet.as_manager()
+
+    is_archived = True
+
+    def __str__(self):
+        return f"{self.guest_name} - {self.room_name} ({self.booking_id or 'No ID'}, archived)"
+
+    @property
+    def room(self):
+        # An unsaved Room carrying the snapshot; templates only read name/price
+        return Room(id=self.room_id, name=self.room_name, price=self.room_price)
+
+    @property
+    def addons(self):
+        return _ArchivedRelation(_from_snapshots(BookingAddon, self.addons_data))
+
+    @property
+    def room_services(self):
+        return _ArchivedRelation(_from_snapshots(RoomServiceRequest, self.room_services_data))
+
+    def get_duration(self):
+        return (self.check_out_date - self.check_in_date).days
+
+    def get_total_price(self):
+        return self.base_total
+
+    def get_addon_total(self):
+        return self.addon_total
+
+    def get_total_with_addons(self):
+        return self.base_total + self.addon_total
+
+    class Meta:
+        verbose_name = "Archived Booking"
+        verbose_name_plural = "Archived Bookings"
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='archive_user_created_idx'),
+            models.Index(fields=['check_in_date', 'check_out_date'], name='archive_stay_idx'),
+            models.Index(fields=['guest_email'], name='archive_guest_email_idx'),
+        ]
+
+
+def _from_snapshots(model, rows):
+    """Unsaved ``model`` instances from archived snapshot dicts (JSON strings back to dates, decimals...)."""
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    for row in rows:
+        yield model(**{
+            key: fields[key].to_python(value)
+            for key, value in row.items() if key in fields
+        })
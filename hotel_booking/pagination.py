@@ -0,0 +1,142 @@
+"""
+Keyset (cursor) pagination for booking lists.
+
+Pages are ordered newest first on (``created_at``, ``id``). Instead of an
+OFFSET, each page starts after the last row of the previous one, so the
+database seeks straight to it through the ``(created_at, id)`` or
+``(status, created_at, id)`` index and fetching page 10,000 costs the same
+as fetching page 1.
+"""
+import base64
+from datetime import datetime, time, timedelta
+from urllib.parse import urlencode
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(obj):
+    """Opaque cursor pointing just after ``obj``."""
+    raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the ``(created_at, pk)`` a cursor points after."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().rsplit('|', 1)
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    if created_at is None:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    return created_at, pk
+
+
+class KeysetPage:
+    """One page of results plus the cursor of the next page."""
+
+    def __init__(self, object_list, next_cursor, page_size, cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.page_size = page_size
+        self.cursor = cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self):
+        return not self.cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginate_keyset(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Fetch one page of ``queryset``, newest first.
+
+    Args:
+        queryset (QuerySet): Any queryset of a model with ``created_at``.
+        cursor (str): ``next_cursor`` of the previous page, or None for the first page.
+        page_size (int): Rows per page, capped at MAX_PAGE_SIZE.
+
+    Returns:
+        KeysetPage: The page; raises InvalidCursor for a malformed cursor.
+    """
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        # The leading range on created_at lets the index seek; the OR only
+        # breaks ties between rows created in the same instant.
+        queryset = queryset.filter(created_at__lte=created_at).filter(
+            Q(created_at__lt=created_at) | Q(id__lt=pk)
+        )
+
+    rows = list(queryset[:page_size + 1])
+    next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return KeysetPage(rows[:page_size], next_cursor, page_size, cursor)
+
+
+def filter_bookings(queryset, params):
+    """
+    Apply the booking list filters found in ``params`` (e.g. ``request.GET``).
+
+    ``status`` must be one of Booking.STATUS_CHOICES; ``date_from``/``date_to``
+    (YYYY-MM-DD, inclusive) bound the booking date as a ``created_at`` range so
+    the filter can use the keyset indexes. Invalid values are ignored.
+
+    Returns:
+        tuple: The filtered queryset and a dict of the filters that were applied.
+    """
+    from .models import Booking
+
+    filters = {}
+    status = params.get('status')
+    if status in dict(Booking.STATUS_CHOICES):
+        queryset = queryset.filter(status=status)
+        filters['status'] = status
+
+    date_from = _parse_day(params.get('date_from'))
+    if date_from:
+        queryset = queryset.filter(created_at__gte=_start_of_day(date_from))
+        filters['date_from'] = date_from.isoformat()
+
+    date_to = _parse_day(params.get('date_to'))
+    if date_to:
+        queryset = queryset.filter(created_at__lt=_start_of_day(date_to + timedelta(days=1)))
+        filters['date_to'] = date_to.isoformat()
+
+    return queryset, filters
+
+
+def _parse_day(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def page_query_string(filters, cursor):
+    """Query string for the page at ``cursor`` with the same filters."""
+    return urlencode({**filters, 'cursor': cursor})
@@ -0,0 +1,316 @@
+"""
+Revenue and occupancy reporting over precomputed daily rollups.
+
+``DailyRevenueRollup`` holds one row per night (rooms sold, room and add-on
+revenue, arrivals, cancellations) and ``DailyAddonRevenue`` one row per
+check-in date and add-on type. Reports read those rows, so a year is a few
+hundred rows no matter how many bookings there are.
+
+Rows are kept current by the Booking/BookingAddon signal handlers in
+``signals.py``, which call ``refresh_rollups()`` for the affected nights once
+the change commits. Bulk ``QuerySet.update()``/``bulk_create()`` calls send no
+signals; run ``refresh_rollups()`` for their date range or the
+``rebuild_rollups`` command afterwards. Room prices are read when a night is
+refreshed, so a price change only restates history after a rebuild.
+
+Archived bookings (``BookingArchive``) are counted like live ones, with the
+room price and add-on totals captured when they were archived.
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.utils import timezone
+
+from .models import (
+    MONEY_FIELD, Booking, BookingAddon, BookingArchive, DailyAddonRevenue, DailyRevenueRollup, addon_line_total,
+    longest_stay_nights,
+)
+from .room_catalog import get_room_catalog
+
+logger = logging.getLogger(__name__)
+
+# Bookings in this status neither occupy a room nor earn revenue
+CANCELLED = 'cancelled'
+# Nights recomputed per transaction by rebuild_rollups()
+REBUILD_WINDOW_DAYS = 31
+
+ZERO = Decimal('0.00')
+ROLLUP_DEFAULTS = {
+    'rooms_available': 0, 'rooms_sold': 0, 'room_revenue': ZERO, 'addon_revenue': ZERO,
+    'arrivals': 0, 'cancellations': 0,
+}
+ROLLUP_COLUMNS = (*ROLLUP_DEFAULTS, 'updated_at')
+
+_suspended = ContextVar('rollups_suspended', default=False)
+
+
+def _nights(start, end):
+    day = start
+    while day < end:
+        yield day
+        day += timedelta(days=1)
+
+
+def refresh_rollups(start, end, longest_stay=None):
+    """
+    Recompute the rollup rows of every night in ``[start, end)``.
+
+    ``longest_stay`` is passed on to ``overlapping()`` as a check-in bound.
+
+    Returns:
+        int: Number of nights written.
+    """
+    if end <= start:
+        return 0
+
+    with transaction.atomic():
+        nights = _lock_nights(start, end)
+
+        stays = (
+            Booking.objects.overlapping(start, end, longest_stay)
+            .exclude(status=CANCELLED)
+            .values_list('check_in_date', 'check_out_date', 'room__price')
+        )
+        archived_stays = (
+            BookingArchive.objects.overlapping(start, end, longest_stay)
+            .exclude(status=CANCELLED)
+            .values_list('check_in_date', 'check_out_date', 'room_price')
+        )
+        for rows in (stays, archived_stays):
+            for check_in, check_out, price in rows.iterator(chunk_size=2000):
+                for day in _nights(max(check_in, start), min(check_out, end)):
+                    nights[day].rooms_sold += 1
+                    nights[day].room_revenue += price
+
+        for model in (Booking, BookingArchive):
+            arrivals = (
+                model.objects.filter(check_in_date__gte=start, check_in_date__lt=end)
+                .values('check_in_date', 'status')
+                .annotate(bookings=Count('id'))
+                .order_by()
+            )
+            for row in arrivals:
+                if row['status'] == CANCELLED:
+                    nights[row['check_in_date']].cancellations += row['bookings']
+                else:
+                    nights[row['check_in_date']].arrivals += row['bookings']
+
+        addon_totals = {}
+        addon_rows = (
+            BookingAddon.objects.filter(booking__check_in_date__gte=start, booking__check_in_date__lt=end)
+            .exclude(booking__status=CANCELLED)
+            .values('booking__check_in_date', 'addon_type')
+            .annotate(addon_quantity=Count('id'), addon_revenue=Sum(addon_line_total(), output_field=MONEY_FIELD))
+            .order_by()
+        )
+        for row in addon_rows:
+            _add_addon(addon_totals, row['booking__check_in_date'], row['addon_type'],
+                       row['addon_quantity'], row['addon_revenue'] or ZERO)
+
+        archived_addons = (
+            BookingArchive.objects.filter(check_in_date__gte=start, check_in_date__lt=end)
+            .exclude(status=CANCELLED)
+            .exclude(addons_data=[])
+            .values_list('check_in_date', 'addons_data')
+        )
+        for day, snapshots in archived_addons.iterator(chunk_size=2000):
+            for snapshot in snapshots:
+                _add_addon(addon_totals, day, snapshot['addon_type'], 1, Decimal(snapshot['total']))
+
+        addons = []
+        for (day, addon_type), (quantity, revenue) in addon_totals.items():
+            nights[day].addon_revenue += revenue
+            addons.append(DailyAddonRevenue(date=day, addon_type=addon_type, quantity=quantity, revenue=revenue))
+
+        updated_at = timezone.now()
+        for rollup in nights.values():
+            rollup.updated_at = updated_at
+        DailyRevenueRollup.objects.bulk_update(nights.values(), ROLLUP_COLUMNS)
+        DailyAddonRevenue.objects.filter(date__gte=start, date__lt=end).delete()
+        DailyAddonRevenue.objects.bulk_create(addons)
+
+    logger.debug(f"Refreshed revenue rollups for {len(nights)} nights from {start} to {end}")
+    return len(nights)
+
+
+def _lock_nights(start, end):
+    """
+    The rollup rows of ``[start, end)``, created if missing, locked and reset to zero.
+
+    Concurrent refreshes of the same nights wait here for each other, so the
+    later one reads the bookings the earlier one committed instead of
+    overwriting its rows with an older count. SQLite ignores
+    ``select_for_update()``, but its IMMEDIATE transactions (project/database.py)
+    already take the write lock at ``atomic()``.
+    """
+    rooms_available = len(get_room_catalog())
+    DailyRevenueRollup.objects.bulk_create(
+        [DailyRevenueRollup(date=day) for day in _nights(start, end)], ignore_conflicts=True,
+    )
+    nights = {}
+    for rollup in DailyRevenueRollup.objects.select_for_update().filter(date__gte=start, date__lt=end):
+        for column, value in ROLLUP_DEFAULTS.items():
+            setattr(rollup, column, value)
+        rollup.rooms_available = rooms_available
+        nights[rollup.date] = rollup
+    return nights
+
+
+def _add_addon(totals, day, addon_type, quantity, revenue):
+    old_quantity, old_revenue = totals.get((day, addon_type), (0, ZERO))
+    totals[(day, addon_type)] = (old_quantity + quantity, old_revenue + revenue)
+
+
+def rebuild_rollups(start=None, end=None, window_days=REBUILD_WINDOW_DAYS):
+    """
+    Recompute the rollups of ``[start, end)`` in windows of ``window_days`` nights.
+
+    Without bounds the whole booking history is rebuilt and rollups outside it
+    are deleted.
+
+    Returns:
+        int: Number of nights written.
+    """
+    # Read once for all the windows below, straight from the tables
+    longest_stay = longest_stay_nights()
+    if start is None or end is None:
+        bounds = {'first': None, 'last': None}
+        for model in (Booking, BookingArchive):
+            model_bounds = model.objects.aggregate(first=Min('check_in_date'), last=Max('check_out_date'))
+            bounds = {
+                'first': min(filter(None, (bounds['first'], model_bounds['first'])), default=None),
+                'last': max(filter(None, (bounds['last'], model_bounds['last'])), default=None),
+            }
+        if start is None and end is None:
+            # Drop rollups left over from deleted or moved bookings
+            stale = {} if bounds['first'] is None else {'date__gte': bounds['first'], 'date__lt': bounds['last']}
+            DailyRevenueRollup.objects.exclude(**stale).delete()
+            DailyAddonRevenue.objects.exclude(**stale).delete()
+        start = start or bounds['first']
+        end = end or bounds['last']
+        if start is None or end is None:
+            # No bookings at all
+            return 0
+
+    written = 0
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + timedelta(days=window_days), end)
+        written += refresh_rollups(window_start, window_end, longest_stay)
+        window_start = window_end
+    logger.info(f"Rebuilt revenue rollups for {written} nights from {start} to {end}")
+    return written
+
+
+def schedule_refresh(start, end):
+    """Refresh the rollups of ``[start, end)`` once the current transaction commits."""
+    if _suspended.get():
+        return
+    transaction.on_commit(lambda: refresh_rollups(start, end), robust=True)
+
+
+def rollups_suspended():
+    return _suspended.get()
+
+
+@contextmanager
+def suspend_rollups():
+    """
+    Skip the signal-driven rollup refreshes inside the block.
+
+    For writes that don't change what the rollups count, such as moving
+    bookings into BookingArchive.
+    """
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+def _ratio(numerator, denominator):
+    if not denominator:
+        return ZERO
+    return (Decimal(numerator) / Decimal(denominator)).quantize(Decimal('0.01'))
+
+
+def _with_kpis(row):
+    """Add occupancy (%), ADR and RevPAR to a dict of summed rollup columns."""
+    row['total_revenue'] = row['room_revenue'] + row['addon_revenue']
+    row['occupancy'] = _ratio(row['rooms_sold'] * 100, row['rooms_available'])
+    row['adr'] = _ratio(row['room_revenue'], row['rooms_sold'])
+    row['revpar'] = _ratio(row['room_revenue'], row['rooms_available'])
+    return row
+
+
+def revenue_report(start, end, group='day'):
+    """
+    Revenue and occupancy between ``start`` and ``end`` (inclusive), from the rollups only.
+
+    Nights without a rollup row (nothing ever booked) count as empty nights
+    with the current number of rooms available.
+
+    Args:
+        start (date): First night.
+        end (date): Last night.
+        group (str): 'day' or 'month' rows.
+
+    Returns:
+        dict: ``rows`` (one per day or month, oldest first), ``totals`` and
+        ``addons`` (quantity and revenue per add-on type).
+    """
+    stored = {
+        rollup.date: rollup
+        for rollup in DailyRevenueRollup.objects.filter(date__gte=start, date__lte=end)
+    }
+    rooms_available = None
+
+    groups = {}
+    for day in _nights(start, end + timedelta(days=1)):
+        key = day.replace(day=1) if group == 'month' else day
+        row = groups.setdefault(key, {
+            'period': key, 'rooms_available': 0, 'rooms_sold': 0, 'room_revenue': ZERO,
+            'addon_revenue': ZERO, 'arrivals': 0, 'cancellations': 0,
+        })
+        rollup = stored.get(day)
+        if rollup is None:
+            if rooms_available is None:
+                rooms_available = len(get_room_catalog())
+            row['rooms_available'] += rooms_available
+            continue
+        row['rooms_available'] += rollup.rooms_available
+        row['rooms_sold'] += rollup.rooms_sold
+        row['room_revenue'] += rollup.room_revenue
+        row['addon_revenue'] += rollup.addon_revenue
+        row['arrivals'] += rollup.arrivals
+        row['cancellations'] += rollup.cancellations
+
+    rows = [_with_kpis(row) for row in groups.values()]
+    totals = {'period': None, 'rooms_available': 0, 'rooms_sold': 0, 'room_revenue': ZERO,
+              'addon_revenue': ZERO, 'arrivals': 0, 'cancellations': 0}
+    for row in rows:
+        for column in ('rooms_available', 'rooms_sold', 'room_revenue', 'addon_revenue', 'arrivals', 'cancellations'):
+            totals[column] += row[column]
+
+    addon_names = dict(BookingAddon.ADDON_TYPES)
+    addons = {}
+    addon_rows = (
+        DailyAddonRevenue.objects.filter(date__gte=start, date__lte=end)
+        .values('addon_type')
+        .annotate(addon_quantity=Sum('quantity'), addon_revenue=Sum('revenue'))
+        .order_by('addon_type')
+    )
+    for row in addon_rows:
+        addons[row['addon_type']] = {
+            'label': addon_names.get(row['addon_type'], row['addon_type']),
+            'quantity': row['addon_quantity'],
+            'revenue': row['addon_revenue'],
+        }
+
+    return {'start': start, 'end': end, 'group': group, 'rows': rows,
+            'totals': _with_kpis(totals), 'addons': addons}
@@ -0,0 +1,233 @@
+"""
+Per-request timing breakdown for the access/perf log.
+
+``RequestTimingMiddleware`` (in ``middleware.py``) opens a ``RequestTiming``
+for each request. While it is open, SQL run on any connection is counted and
+timed, and code wrapped in ``timed(phase)`` adds its duration to ``phase``.
+Timed blocks nest: a phase only gets its own time, so intent detection does
+not also count the input validation it calls. Outside a request ``timed()``
+does nothing.
+
+The finished timing becomes one compact JSON line on the ``hotel_booking.perf``
+logger (one object per line, like ``requests.jsonl``) and a ``Server-Timing``
+response header. Streaming responses are timed until their body has been sent
+(``TimedStream``) and get no header, since it would have to precede the body.
+"""
+import json
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils import timezone
+
+# Phases that make up the ``nlp`` total
+NLP_PHASES = ('validation', 'intent', 'dates', 'sentiment')
+
+_current = ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    """Phase durations, in seconds, and SQL totals of one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.phases = {}
+        # Time spent in nested timed blocks, per open block
+        self._children = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.db_queries += 1
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def as_dict(self, request, response):
+        """The perf log entry for ``request``; times in milliseconds."""
+        nlp = sum(self.phases.get(phase, 0.0) for phase in NLP_PHASES)
+        entry = {
+            'ts': timezone.now().isoformat(timespec='milliseconds'),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'ms': _ms(self.duration),
+            'db_ms': _ms(self.db_time),
+            'db_queries': self.db_queries,
+            'nlp_ms': _ms(nlp),
+            'phases': {phase: _ms(seconds) for phase, seconds in self.phases.items()},
+        }
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            entry['user'] = user.pk
+        return entry
+
+    def as_json(self, request, response):
+        return json.dumps(self.as_dict(request, response), separators=(',', ':'))
+
+    def server_timing(self):
+        """``Server-Timing`` header value: db, nlp, each phase and the total."""
+        metrics = [f'db;dur={_ms(self.db_time)};desc="{self.db_queries} queries"']
+        nlp = sum(self.phases.get(phase, 0.0) for phase in NLP_PHASES)
+        if nlp:
+            metrics.append(f'nlp;dur={_ms(nlp)}')
+        for phase, seconds in self.phases.items():
+            metrics.append(f'{phase};dur={_ms(seconds)}')
+        metrics.append(f'total;dur={_ms(self.duration)}')
+        return ', '.join(metrics)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def current_timing():
+    """The RequestTiming of the request being handled, or None."""
+    return _current.get()
+
+
+@contextmanager
+def track_request():
+    """Collect a RequestTiming for the block; SQL is counted on every connection."""
+    timing = RequestTiming()
+    try:
+        with resume_request(timing):
+            yield timing
+    finally:
+        timing.finish()
+
+
+@contextmanager
+def resume_request(timing):
+    """Make ``timing`` the current one again for the block, e.g. while a streamed body runs."""
+    token = _current.set(timing)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timing))
+            yield timing
+    finally:
+        _current.reset(token)
+
+
+_END = object()
+
+
+class TimedStream:
+    """
+    Body of a streaming response, produced inside its request's timing.
+
+    Views such as ``chatbot_stream_api`` do their work while the body is
+    iterated, after the middleware has returned. ``finished()`` is called
+    once the body has been sent or the response was closed.
+    """
+
+    def __init__(self, timing, content, finished):
+        self.timing = timing
+        self.content = content
+        self.finished = finished
+        self._closed = False
+
+    def __iter__(self):
+        iterator = iter(self.content)
+        while True:
+            with resume_request(self.timing):
+                chunk = next(iterator, _END)
+            if chunk is _END:
+                break
+            yield chunk
+        self.close()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.timing.finish()
+            self.finished()
+
+
+class AsyncTimedStream(TimedStream):
+    """TimedStream for asynchronous bodies (``StreamingHttpResponse.is_async``)."""
+
+    __iter__ = None
+
+    async def __aiter__(self):
+        iterator = aiter(self.content)
+        while True:
+            with resume_request(self.timing):
+                chunk = await anext(iterator, _END)
+            if chunk is _END:
+                break
+            yield chunk
+        self.close()
+
+
+class timed:
+    """
+    Add the time spent in a block, or a decorated function, to ``phase``.
+
+    Usable as ``with timed('email'):`` or ``@timed('intent')``.
+    """
+
+    def __init__(self, phase):
+        self.phase = phase
+        self._timing = None
+
+    def __enter__(self):
+        self._timing = _current.get()
+        if self._timing is not None:
+            self._timing._children.append(0.0)
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        timing = self._timing
+        if timing is None:
+            return False
+        elapsed = time.perf_counter() - self._start
+        nested = timing._children.pop()
+        timing.add(self.phase, elapsed - nested)
+        if timing._children:
+            timing._children[-1] += elapsed
+        return False
+
+    def __call__(self, func):
+        phase = self.phase
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            # A fresh block per call: the decorator is shared between threads
+            with timed(phase):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend that adds top-level template renders to the ``template`` phase."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
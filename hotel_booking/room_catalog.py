@@ -0,0 +1,154 @@
+"""
+In-process cache of the room catalog.
+
+The catalog is a handful of rows that changes only when staff edit rooms,
+yet it was queried on almost every page render and booking/upgrade turn.
+``get_room_catalog()`` returns an immutable snapshot built with a single
+query. Saving or deleting a Room (see ``signals.py``) drops the snapshot in
+this process and bumps a version number in the Django cache, so other
+processes sharing that cache rebuild theirs on their next version check.
+
+Bulk ``QuerySet.update()``/``delete()`` calls do not send signals; call
+``invalidate_room_catalog()`` after them.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.functional import cached_property
+
+from .db_health import retry_read
+from .metrics import cache_lookup
+from .room_resolver import RoomTypeResolver
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'hotel_booking:room_catalog:version'
+# Seconds between checks of the shared version key
+VERSION_CHECK_INTERVAL = 1.0
+
+_NORMALIZE_RE = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_room_name(name):
+    """Lowercase ``name`` and collapse punctuation/whitespace to single spaces."""
+    return _NORMALIZE_RE.sub(' ', str(name or '').lower()).strip()
+
+
+class RoomCatalog:
+    """Immutable snapshot of every Room, indexed by id, normalized name and price."""
+
+    def __init__(self, rooms, version=None):
+        self.version = version
+        self._rooms = tuple(sorted(rooms, key=lambda room: room.pk))
+        self._by_id = {room.pk: room for room in self._rooms}
+        self._by_price = tuple(sorted(self._rooms, key=lambda room: (room.price, room.pk)))
+        self._prices = [room.price for room in self._by_price]
+        self._names = tuple((normalize_room_name(room.name), room) for room in self._rooms)
+
+    def __len__(self):
+        return len(self._rooms)
+
+    def __iter__(self):
+        return iter(self._rooms)
+
+    def all(self):
+        """Every room in primary key order (the default queryset order)."""
+        return self._rooms
+
+    def first(self):
+        return self._rooms[0] if self._rooms else None
+
+    def get(self, pk):
+        """Room with primary key ``pk``, or None."""
+        return self._by_id.get(pk)
+
+    def by_price(self):
+        """Every room, cheapest first."""
+        return self._by_price
+
+    def priced_above(self, price):
+        """Rooms more expensive than ``price``, cheapest first."""
+        index = bisect.bisect_right(self._prices, Decimal(str(price)))
+        return self._by_price[index:]
+
+    def filter_name(self, name):
+        """Rooms whose normalized name contains ``name`` (like ``name__icontains``)."""
+        needle = normalize_room_name(name)
+        if not needle:
+            return ()
+        return tuple(room for normalized, room in self._names if needle in normalized)
+
+    def find(self, name):
+        """First room whose name contains ``name``, or None."""
+        matches = self.filter_name(name)
+        return matches[0] if matches else None
+
+    @cached_property
+    def resolver(self):
+        """RoomTypeResolver for free-text room type mentions, built on first use."""
+        return RoomTypeResolver(self._rooms, normalize_room_name)
+
+    def resolve(self, text):
+        """Room of the type mentioned in ``text`` (tolerating prefixes and typos), or None."""
+        return self.resolver.resolve(text)
+
+    def rooms_of_type(self, text):
+        """Every room of the type mentioned in ``text``."""
+        return self.resolver.rooms_of_type(self.resolver.resolve_type(text))
+
+
+_lock = threading.Lock()
+_catalog = None
+_checked_at = 0.0
+
+
+def _shared_version():
+    return cache.get_or_set(VERSION_KEY, 1, timeout=None)
+
+
+def get_room_catalog():
+    """The current RoomCatalog, rebuilt if a Room changed here or in another process."""
+    global _catalog, _checked_at
+
+    catalog = _catalog
+    now = time.monotonic()
+    if catalog is not None and now - _checked_at < VERSION_CHECK_INTERVAL:
+        cache_lookup('room_catalog', True)
+        return catalog
+
+    version = _shared_version()
+    if catalog is not None and catalog.version == version:
+        _checked_at = now
+        cache_lookup('room_catalog', True)
+        return catalog
+
+    from .models import Room
+
+    with _lock:
+        rebuild = _catalog is None or _catalog.version != version
+        cache_lookup('room_catalog', not rebuild)
+        if rebuild:
+            # Always from the primary: a lagging replica would be cached until the next Room change
+            _catalog = RoomCatalog(retry_read(list, Room.objects.using(DEFAULT_DB_ALIAS)), version=version)
+            logger.debug(f"Room catalog rebuilt: {len(_catalog)} rooms, version {version}")
+        _checked_at = now
+        return _catalog
+
+
+def invalidate_room_catalog():
+    """Drop this process's snapshot and bump the shared version for the others."""
+    global _catalog
+
+    with _lock:
+        _catalog = None
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Key missing or evicted; any value other than the old one forces a rebuild
+        cache.set(VERSION_KEY, int(time.time() * 1000), timeout=None)
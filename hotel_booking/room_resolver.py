@@ -0,0 +1,141 @@
+"""
+Map free-text room type mentions ("deluxe", "Delux room", "exec suite") to a room type.
+
+Built once per room catalog snapshot (see ``RoomCatalog.resolver``). Each
+room type (the normalized room name) is indexed by its tokens. A query
+scores every type sharing a token with it, weighted so that tokens
+appearing in fewer types ("deluxe") count for more than common ones
+("room"). Prefixes ("delux", "exec") and small typos ("dleuxe") fall back
+to prefix and bounded edit-distance matches. Ties go to the type whose
+first room has the lowest primary key, which is what the old
+``name__icontains(...).first()`` lookups returned, so results are
+deterministic.
+"""
+import math
+
+# Resolved queries kept per snapshot
+CACHE_SIZE = 1024
+
+PREFIX_WEIGHT = 0.8
+TYPO_WEIGHT = 0.6
+MIN_PREFIX_LENGTH = 3
+
+
+def max_edits(token):
+    """Typos tolerated for a token of this length."""
+    if len(token) < 4:
+        return 0
+    return 1 if len(token) < 7 else 2
+
+
+def edit_distance(a, b, limit):
+    """
+    Edit distance between ``a`` and ``b`` counting a swap of adjacent letters as
+    one edit (optimal string alignment), or ``limit + 1`` once it exceeds ``limit``.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i]
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                distance = min(distance, before_previous[j - 2] + 1)
+            current.append(distance)
+        if min(current) > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+class RoomTypeResolver:
+    """Token index over the room types of one catalog snapshot."""
+
+    def __init__(self, rooms, normalize):
+        self._normalize = normalize
+        # type name -> rooms of that type, in primary key order
+        self._types = {}
+        for room in sorted(rooms, key=lambda room: room.pk):
+            self._types.setdefault(normalize(room.name), []).append(room)
+
+        self._tokens = {}
+        for type_name in self._types:
+            for token in set(type_name.split()):
+                self._tokens.setdefault(token, []).append(type_name)
+
+        type_count = len(self._types)
+        self._weights = {
+            token: math.log(1 + type_count / len(type_names))
+            for token, type_names in self._tokens.items()
+        }
+        self._order = {type_name: index for index, type_name in enumerate(self._types)}
+        self._cache = {}
+
+    @property
+    def type_names(self):
+        return list(self._types)
+
+    def rooms_of_type(self, type_name):
+        return tuple(self._types.get(type_name, ()))
+
+    def resolve_type(self, text):
+        """Normalized room type mentioned in ``text``, or None."""
+        query = self._normalize(text)
+        if not query:
+            return None
+        try:
+            return self._cache[query]
+        except KeyError:
+            pass
+
+        type_name = self._resolve(query)
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[query] = type_name
+        return type_name
+
+    def resolve(self, text):
+        """First room (lowest primary key) of the type mentioned in ``text``, or None."""
+        type_name = self.resolve_type(text)
+        return self._types[type_name][0] if type_name else None
+
+    def _resolve(self, query):
+        if query in self._types:
+            return query
+
+        scores = {}
+        for token in set(query.split()):
+            for name_token, weight in self._match_token(token):
+                for type_name in self._tokens[name_token]:
+                    scores[type_name] = scores.get(type_name, 0.0) + weight
+
+        if not scores:
+            return None
+        return min(scores, key=lambda type_name: (-scores[type_name], self._order[type_name]))
+
+    def _match_token(self, token):
+        """Index tokens matching ``token`` exactly, by prefix or within a few typos, with weights."""
+        if token in self._tokens:
+            return [(token, self._weights[token])]
+
+        if len(token) >= MIN_PREFIX_LENGTH:
+            prefixed = [
+                (name_token, self._weights[name_token] * PREFIX_WEIGHT)
+                for name_token in self._tokens
+                if name_token.startswith(token)
+                or (len(name_token) >= MIN_PREFIX_LENGTH and token.startswith(name_token))
+            ]
+            if prefixed:
+                return prefixed
+
+        limit = max_edits(token)
+        if not limit:
+            return []
+        return [
+            (name_token, self._weights[name_token] * TYPO_WEIGHT)
+            for name_token in self._tokens
+            if edit_distance(token, name_token, limit) <= limit
+        ]
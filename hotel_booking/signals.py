@@ -0,0 +1,118 @@
+"""
+Model signal handlers for the hotel_booking app (connected in apps.py).
+"""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .guest_profiles import RETURNING_STATUSES, record_guests
+from .identity import invalidate_identity
+from .metrics import bookings
+from .models import Booking, BookingAddon, Room
+from .reporting import CANCELLED, rollups_suspended, schedule_refresh
+from .room_catalog import invalidate_room_catalog
+
+# Booking fields the rollups and booking metrics depend on
+STAY_FIELDS = frozenset({'check_in_date', 'check_out_date', 'status', 'room', 'room_id'})
+
+
+@receiver(post_save, sender=Room, dispatch_uid='room_catalog_saved')
+@receiver(post_delete, sender=Room, dispatch_uid='room_catalog_deleted')
+def room_changed(sender, instance, **kwargs):
+    # Drop the local snapshot now and bump the shared version again once the
+    # change is committed, so other processes can't rebuild from stale rows.
+    invalidate_room_catalog()
+    transaction.on_commit(invalidate_room_catalog)
+
+
+@receiver(post_save, sender=User, dispatch_uid='identity_user_saved')
+@receiver(post_delete, sender=User, dispatch_uid='identity_user_deleted')
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # auth.login() saves last_login on every login; nothing cached depends on it
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    # Again after commit, in case the old row was cached in between
+    pk = instance.pk
+    invalidate_identity(pk)
+    transaction.on_commit(lambda: invalidate_identity(pk))
+
+
+def _touches_stay(update_fields):
+    """Whether a save with ``update_fields`` can change what the rollups and booking metrics count."""
+    return update_fields is None or not STAY_FIELDS.isdisjoint(update_fields)
+
+
+@receiver(pre_save, sender=Booking, dispatch_uid='rollup_booking_presave')
+def remember_booking_stay(sender, instance, raw=False, update_fields=None, **kwargs):
+    # The nights the booking covered before this save also need refreshing;
+    # the status and room tell record_booking_event() what changed
+    instance._rollup_previous_stay = None
+    instance._previous_status = instance._previous_room_id = None
+    if instance.pk and not raw and _touches_stay(update_fields):
+        previous = (
+            Booking.objects.filter(pk=instance.pk)
+            .values_list('check_in_date', 'check_out_date', 'status', 'room_id').first()
+        )
+        if previous:
+            instance._rollup_previous_stay = previous[:2]
+            instance._previous_status, instance._previous_room_id = previous[2:]
+
+
+@receiver(post_save, sender=Booking, dispatch_uid='metrics_booking_saved')
+def record_booking_event(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        bookings.inc('created')
+        return
+    previous_status = getattr(instance, '_previous_status', None)
+    if instance.status == CANCELLED and previous_status not in (None, CANCELLED):
+        bookings.inc('cancelled')
+    elif previous_status and instance.room_id != instance._previous_room_id:
+        # Room changes only happen through the upgrade flows
+        bookings.inc('upgraded')
+
+
+@receiver(post_save, sender=Booking, dispatch_uid='guest_profile_booking_saved')
+def update_guest_profile(sender, instance, raw=False, **kwargs):
+    # Approved/completed bookings make the guest a returning customer
+    if not raw and instance.status in RETURNING_STATUSES:
+        record_guests([instance])
+
+
+@receiver(post_save, sender=Booking, dispatch_uid='rollup_booking_saved')
+@receiver(post_delete, sender=Booking, dispatch_uid='rollup_booking_deleted')
+def booking_changed(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or rollups_suspended() or not _touches_stay(update_fields):
+        return
+    stays = {(instance.check_in_date, instance.check_out_date)}
+    previous = getattr(instance, '_rollup_previous_stay', None)
+    if previous:
+        stays.add(previous)
+    for check_in, check_out in _merge_stays(stays):
+        schedule_refresh(check_in, check_out)
+
+
+@receiver(post_save, sender=BookingAddon, dispatch_uid='rollup_addon_saved')
+@receiver(post_delete, sender=BookingAddon, dispatch_uid='rollup_addon_deleted')
+def addon_changed(sender, instance, raw=False, **kwargs):
+    if raw or rollups_suspended():
+        return
+    # Add-on revenue is counted on the booking's check-in date
+    check_in = Booking.objects.filter(pk=instance.booking_id).values_list('check_in_date', flat=True).first()
+    if check_in:
+        schedule_refresh(check_in, check_in + timedelta(days=1))
+
+
+def _merge_stays(stays):
+    """Merge overlapping or adjacent ``(check_in, check_out)`` ranges."""
+    merged = []
+    for check_in, check_out in sorted(stays):
+        if merged and check_in <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], check_out))
+        else:
+            merged.append((check_in, check_out))
+    return merged
@@ -1,3 +1,1562 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import spacy
+from django.apps import apps
+from django.conf import settings
+from django.contrib.admin import site
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Q
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .archive import archive_bookings, bookings_for_user, find_archived_booking, search_bookings
+from .booking_io import BookingImporter, export_rows, read_rows, write_rows
+from .benchmarking import bulk_seed_bookings, seed_bookings, seed_rooms
+from .chatbot.views import check_returning_customer_by_context
+from .chatbot.booking_cache import booking_cache, find_booking, get_booking
+from .guest_profiles import find_guest_profile
+from .request_timing import current_timing, timed, track_request
+from .metrics import REGISTRY, Counter, Gauge, Histogram, Registry
+from .error_reporting import exception_groups
+from .identity import get_admin_user, get_user, invalidate_identity
+from .middleware import DebugMiddleware, ExceptionMiddleware, SeparateAdminSessionMiddleware, get_hotel_booking_user
+from .log_config import (
+    AsyncQueueHandler, QueueListener, RotatingFileHandler, SamplingFilter, configure_logging, stop_logging,
+)
+from .chatbot.instrumentation import track_transition, transition_metrics
+from .chatbot.testing import TransitionQueryBudgetMixin
+from .models import (
+    Booking, BookingAddon, BookingArchive, ContactMessage, DailyRevenueRollup, GuestProfile, Room,
+    RoomServiceRequest, longest_stay_nights,
+)
+from .pagination import InvalidCursor, filter_bookings, paginate_keyset
+from .reporting import rebuild_rollups, refresh_rollups, revenue_report
+from .room_catalog import VERSION_KEY, get_room_catalog, invalidate_room_catalog, normalize_room_name
+from .room_resolver import RoomTypeResolver, edit_distance
+
+SPACY_MODEL_AVAILABLE = spacy.util.is_package('en_core_web_sm')
+
+
+class TransitionInstrumentationTests(TransitionQueryBudgetMixin, TestCase):
+    def setUp(self):
+        transition_metrics.reset()
+
+    def test_queries_are_recorded_per_transition(self):
+        with track_transition('greeting') as transition:
+            Room.objects.count()
+            Room.objects.count()
+            transition.to_state = 'collecting_booking_info'
+
+        self.assertEqual(transition.query_count, 2)
+        metrics = transition_metrics.snapshot()['greeting->collecting_booking_info']
+        self.assertEqual(metrics['turns'], 1)
+        self.assertEqual(metrics['queries_total'], 2)
+        self.assertEqual(metrics['queries_max'], 2)
+
+    def test_state_defaults_to_greeting(self):
+        with track_transition(None) as transition:
+            pass
+        self.assertEqual(transition.key, 'greeting->greeting')
+
+    def test_client_sent_states_are_bounded(self):
+        def echo_turn(user_message, session_data, *args):
+            return {'message': 'ok', 'session': session_data}
+
+        with mock.patch('hotel_booking.chatbot.views.DialogManager'), \
+                mock.patch('hotel_booking.chatbot.views._run_chat_turn', side_effect=echo_turn):
+            for state in (['not', 'hashable'], 'junk-0', 'junk-1', {'a': 1}):
+                response = self.client.post(reverse('chatbot_api'), content_type='application/json',
+                                            data=json.dumps({'message': 'hi', 'session': {'state': state}}))
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(transition_metrics.snapshot()), ['other->other'])
+        self.assertEqual(transition_metrics.snapshot()['other->other']['turns'], 4)
+
+    def test_intent_labels_are_bounded(self):
+        for intent, known, label in (('booking', (), 'booking'), ('room_info', {'room_info': {}}, 'room_info'),
+                                     ('made-up', (), 'other'), (['x'], (), 'other'), (None, (), 'none')):
+            with track_transition('greeting') as transition:
+                transition.intent = intent
+                transition.known_intents = known
+            self.assertEqual(transition.intent, label)
+
+    def test_budget_passes_within_limit(self):
+        with self.assertTransitionQueryBudget({'greeting->greeting': 1}):
+            with track_transition('greeting'):
+                Room.objects.count()
+
+    def test_budget_fails_when_exceeded(self):
+        with self.assertRaisesMessage(AssertionError, 'ran 2 queries, budget is 1'):
+            with self.assertTransitionQueryBudget(default=1):
+                with track_transition('greeting'):
+                    Room.objects.count()
+                    Room.objects.exists()
+
+    def test_metrics_endpoint_is_staff_only(self):
+        url = reverse('chatbot_metrics')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        with track_transition('greeting'):
+            Room.objects.count()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('greeting->greeting', response.json()['transitions'])
+
+
+class BookingCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.booking = seed_bookings(seed_rooms(), 'John Smith', 1, prefix='BK')[0]
+
+    def test_booking_loaded_once_per_turn(self):
+        with booking_cache():
+            with self.assertNumQueries(3):
+                booking = find_booking('BK-10000')
+                self.assertEqual(booking.room.name, 'Standard Room')
+                self.assertEqual(list(booking.addons.all()), [])
+            with self.assertNumQueries(0):
+                self.assertIs(get_booking(booking.pk), booking)
+                self.assertIs(find_booking('BK-10000'), booking)
+
+    def test_misses_are_cached(self):
+        with booking_cache():
+            with self.assertNumQueries(1):
+                self.assertIsNone(find_booking('BK-99999'))
+                self.assertIsNone(find_booking('BK-99999'))
+
+    def test_nested_blocks_share_the_cache(self):
+        with booking_cache() as outer:
+            with booking_cache() as inner:
+                self.assertIs(inner, outer)
+
+    def test_no_sharing_outside_a_turn(self):
+        self.assertIsNot(find_booking('BK-10000'), find_booking('BK-10000'))
+
+
+class ChatStreamApiTests(TestCase):
+    def stream(self, message='hello', session=None):
+        response = self.client.post(reverse('chatbot_stream_api'),
+                                    data=json.dumps({'message': message, 'session': session or {}}),
+                                    content_type='application/json')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.endswith('\n\n'))
+        events = []
+        for block in body[:-2].split('\n\n'):
+            event, data = block.split('\n')
+            self.assertTrue(event.startswith('event: ') and data.startswith('data: '))
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+        return events
+
+    def test_reply_is_streamed_as_chunks(self):
+        reply = {'message': 'Welcome!\nHow can I help?', 'session': {'state': 'greeting'},
+                 'delayed_messages': ['Anything else?']}
+        with mock.patch('hotel_booking.chatbot.views.process_chat_message', return_value=reply) as process:
+            events = self.stream('  hello  ', {'state': 'initial'})
+        self.assertEqual(events, [
+            ('start', {}),
+            ('chunk', {'text': 'Welcome!\n'}),
+            ('chunk', {'text': 'How can I help?'}),
+            ('done', {'session': {'state': 'greeting'}, 'delayed_messages': ['Anything else?']}),
+        ])
+        self.assertEqual(process.call_args.args[:2], ('hello', {'state': 'initial'}))
+
+    def test_failed_turn_sends_an_error_event(self):
+        with mock.patch('hotel_booking.chatbot.views.process_chat_message', side_effect=RuntimeError('boom')), \
+                self.assertLogs('hotel_booking.chatbot.views', 'ERROR'):
+            events = self.stream(session={'state': 'booking', 'user_data': {'guest_name': 'Alice'}})
+        self.assertEqual([event for event, _ in events], ['start', 'error'])
+        self.assertEqual(events[1][1]['session'], {'state': 'booking', 'user_data': {'guest_name': 'Alice'}})
+        self.assertIn('temporarily unable', events[1][1]['message'])
+
+    async def test_asgi_requests_get_an_async_stream(self):
+        reply = {'message': 'Welcome!', 'session': {'state': 'greeting'}}
+        with mock.patch('hotel_booking.chatbot.views.process_chat_message', return_value=reply):
+            response = await self.async_client.post(reverse('chatbot_stream_api'), content_type='application/json',
+                                                    data=json.dumps({'message': 'hello', 'session': {}}))
+            self.assertTrue(response.is_async)
+            body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(body, 'event: start\ndata: {}\n\nevent: chunk\ndata: {"text": "Welcome!"}\n\n'
+                               'event: done\ndata: {"session": {"state": "greeting"}, "delayed_messages": []}\n\n')
+
+    def test_invalid_payload_is_rejected_before_streaming(self):
+        response = self.client.post(reverse('chatbot_stream_api'), data='{}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.streaming)
+
+
+class ChatConsumerTests(TestCase):
+    path = '/hotel_booking/ws/chatbot/'
+
+    def application(self, session):
+        from channels.routing import URLRouter
+        from django.contrib.auth.models import AnonymousUser
+        from .chatbot.routing import websocket_urlpatterns
+
+        router = URLRouter(websocket_urlpatterns)
+
+        async def application(scope, receive, send):
+            # What AuthMiddlewareStack would put in the scope
+            return await router(dict(scope, session=session, user=AnonymousUser()), receive, send)
+        return application
+
+    async def test_turn_round_trips_the_conversation(self):
+        from asgiref.sync import sync_to_async
+        from channels.testing import WebsocketCommunicator
+        from django.contrib.sessions.backends.db import SessionStore
+        from .chatbot.consumers import SESSION_CONVERSATION_KEY
+
+        session = SessionStore()
+        session[SESSION_CONVERSATION_KEY] = {'state': 'greeting'}
+        await sync_to_async(session.save)()
+        reply = {'message': 'Which dates?', 'session': {'state': 'booking', 'user_data': {'guest_name': 'Alice'}},
+                 'delayed_messages': []}
+        with mock.patch('hotel_booking.chatbot.consumers.DialogManager') as dialog_manager, \
+                mock.patch('hotel_booking.chatbot.consumers.process_chat_message', return_value=reply) as process:
+            communicator = WebsocketCommunicator(self.application(session), self.path)
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.send_json_to({'message': ' book a room '})
+            self.assertEqual(await communicator.receive_json_from(),
+                             {'message': 'Which dates?', 'state': 'booking', 'delayed_messages': []})
+            await communicator.send_json_to({'message': ''})
+            self.assertEqual((await communicator.receive_json_from())['error'], 'Bad request')
+            await communicator.disconnect()
+
+        self.assertEqual(process.call_args.args[0], 'book a room')
+        self.assertEqual(process.call_args.args[1]['state'], 'greeting')
+        self.assertIs(process.call_args.kwargs['dialog_manager'], dialog_manager.return_value)
+        # Saved back to the Django session on disconnect
+        stored = await sync_to_async(SessionStore(session.session_key).load)()
+        self.assertEqual(stored[SESSION_CONVERSATION_KEY], reply['session'])
+
+    async def test_visitors_without_a_session_leave_no_rows(self):
+        from asgiref.sync import sync_to_async
+        from channels.testing import WebsocketCommunicator
+        from django.contrib.sessions.backends.db import SessionStore
+
+        reply = {'message': 'Hello!', 'session': {'state': 'greeting'}, 'delayed_messages': []}
+        with mock.patch('hotel_booking.chatbot.consumers.DialogManager'), \
+                mock.patch('hotel_booking.chatbot.consumers.process_chat_message', return_value=reply):
+            communicator = WebsocketCommunicator(self.application(SessionStore()), self.path)
+            await communicator.connect()
+            await communicator.send_json_to({'message': 'hi'})
+            await communicator.receive_json_from()
+            await communicator.disconnect()
+        self.assertFalse(await sync_to_async(Session.objects.exists)())
+
+    @unittest.skipUnless(SPACY_MODEL_AVAILABLE, 'spaCy model en_core_web_sm is not installed')
+    async def test_connections_share_the_nlp_models(self):
+        from channels.testing import WebsocketCommunicator
+        from django.contrib.sessions.backends.signed_cookies import SessionStore
+
+        with mock.patch('hotel_booking.chatbot.dialog_manager.spacy.load', wraps=spacy.load) as load:
+            for _ in range(2):
+                communicator = WebsocketCommunicator(self.application(SessionStore()), self.path)
+                connected, _ = await communicator.connect()
+                self.assertTrue(connected)
+                await communicator.send_json_to({'message': 'hello'})
+                self.assertTrue((await communicator.receive_json_from(timeout=60))['message'])
+                await communicator.disconnect()
+        self.assertLessEqual(load.call_count, 1)
+
+
+class RoomCatalogTests(TestCase):
+    def setUp(self):
+        invalidate_room_catalog()
+        self.standard, self.deluxe, self.suite = seed_rooms()
+
+    def test_catalog_is_built_once(self):
+        get_room_catalog()
+        with self.assertNumQueries(0):
+            catalog = get_room_catalog()
+            self.assertIs(catalog.get(self.deluxe.pk), catalog.find('deluxe'))
+            self.assertEqual(catalog.find('  DELUXE-room '), catalog.get(self.deluxe.pk))
+            self.assertEqual([room.name for room in catalog.by_price()],
+                             ['Standard Room', 'Deluxe Room', 'Executive Suite'])
+            self.assertEqual(catalog.priced_above('250.00'), (catalog.get(self.suite.pk),))
+            self.assertIsNone(catalog.find('penthouse'))
+
+    def test_save_and_delete_invalidate(self):
+        get_room_catalog()
+        self.standard.price = 500
+        self.standard.save()
+        self.assertEqual(get_room_catalog().by_price()[-1].name, 'Standard Room')
+
+        self.suite.delete()
+        self.assertIsNone(get_room_catalog().find('suite'))
+
+    def test_shared_version_bump_forces_rebuild(self):
+        catalog = get_room_catalog()
+        cache.incr(VERSION_KEY)
+        with mock.patch('hotel_booking.room_catalog._checked_at', 0.0):
+            self.assertIsNot(get_room_catalog(), catalog)
+
+
+class RoomTypeResolverTests(SimpleTestCase):
+    def setUp(self):
+        names = ['Standard Room', 'Deluxe Room', 'Executive Suite', 'Deluxe Room']
+        self.rooms = [Room(pk=pk, name=name, price=100 * pk) for pk, name in enumerate(names, start=1)]
+        self.resolver = RoomTypeResolver(self.rooms, normalize_room_name)
+
+    def assertResolves(self, text, pk):
+        room = self.resolver.resolve(text)
+        self.assertEqual(room.pk if room else None, pk, text)
+
+    def test_exact_prefix_and_typo(self):
+        self.assertResolves('Deluxe Room', 2)
+        self.assertResolves('delux', 2)
+        self.assertResolves('dleuxe', 2)
+        self.assertResolves('exec', 3)
+        self.assertResolves('I would like the deluxe room please', 2)
+        self.assertResolves('penthouse', None)
+        self.assertResolves('', None)
+
+    def test_ties_and_duplicates_are_deterministic(self):
+        # "room" matches two types; the one whose first room has the lowest pk wins
+        self.assertResolves('room', 1)
+        self.assertEqual([room.pk for room in self.resolver.rooms_of_type('deluxe room')], [2, 4])
+
+    def test_edit_distance_limit(self):
+        self.assertEqual(edit_distance('dleuxe', 'deluxe', 1), 1)
+        self.assertEqual(edit_distance('kitten', 'sitting', 3), 3)
+        self.assertEqual(edit_distance('abc', 'xyz', 1), 2)
+
+
+class ListingQueryCountTests(TestCase):
+    """Listing pages must issue the same number of queries however many bookings they show."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rooms = seed_rooms()
+        cls.staff = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.guest = User.objects.create_user('guest', 'guest@example.com', 'pw')
+
+    def add_bookings(self, count):
+        start = Booking.objects.count()
+        for booking in seed_bookings(self.rooms, 'Jane Doe', count, prefix=f'Q{start}'):
+            booking.user = self.guest
+            booking.save()
+            BookingAddon.objects.create(booking=booking, addon_type='breakfast', price=20, breakfast_count=2)
+            BookingAddon.objects.create(booking=booking, addon_type='transport', price=50)
+
+    def assertConstantQueries(self, user, url):
+        self.client.force_login(user)
+        self.client.get(url)  # first request after login also updates the session
+        self.add_bookings(2)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.add_bookings(8)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(many), len(few), [query['sql'] for query in many.captured_queries])
+
+    def test_view_bookings(self):
+        self.assertConstantQueries(self.staff, reverse('view_bookings'))
+
+    def test_admin_home(self):
+        self.assertConstantQueries(self.staff, reverse('admin_home'))
+
+    def test_user_profile(self):
+        self.assertConstantQueries(self.guest, reverse('user_profile'))
+
+    def test_booking_admin_changelist(self):
+        self.assertConstantQueries(self.staff, reverse('admin:hotel_booking_booking_changelist'))
+
+    def test_addon_admin_changelist(self):
+        self.assertConstantQueries(self.staff, reverse('admin:hotel_booking_bookingaddon_changelist'))
+
+    def test_admin_total_includes_addons(self):
+        self.add_bookings(1)
+        booking = Booking.objects.with_addon_total().get()
+        # 2 nights of Standard Room, breakfast for two and one transfer
+        self.assertEqual(booking.addon_total, Decimal('90.00'))
+        self.assertEqual(booking.get_total_with_addons(), Decimal('390.00'))
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        bulk_seed_bookings(seed_rooms(), 23)
+        # Two bookings created in the same instant must still be paged exactly once
+        Booking.objects.filter(booking_id__in=['HX-0000005', 'HX-0000006']).update(
+            created_at=Booking.objects.get(booking_id='HX-0000005').created_at
+        )
+        cls.staff = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+    def test_pages_cover_every_row_once_in_order(self):
+        seen, cursor = [], None
+        while True:
+            page = paginate_keyset(Booking.objects.all(), cursor, page_size=5)
+            seen.extend(booking.pk for booking in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        expected = list(Booking.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_filters(self):
+        today = timezone.now().date()
+        bookings, filters = filter_bookings(Booking.objects.all(), {
+            'status': 'approved', 'date_from': today.isoformat(), 'date_to': 'not-a-date', 'cursor': 'x',
+        })
+        self.assertEqual(filters, {'status': 'approved', 'date_from': today.isoformat()})
+        self.assertTrue(bookings.exists())
+        self.assertFalse(bookings.exclude(status='approved').exists())
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            paginate_keyset(Booking.objects.all(), 'not-a-cursor')
+
+    def test_json_endpoint(self):
+        self.client.force_login(self.staff)
+        url = reverse('bookings_api')
+        first = self.client.get(url, {'page_size': 20}).json()
+        self.assertEqual(len(first['results']), 20)
+        second = self.client.get(url, {'page_size': 20, 'cursor': first['next_cursor']}).json()
+        self.assertEqual(len(second['results']), 3)
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(self.client.get(url, {'cursor': 'bad'}).status_code, 400)
+
+    def test_view_bookings_pages(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('view_bookings'), {'status': 'pending'})
+        self.assertEqual(len(response.context['bookings']), 6)
+        self.assertIsNone(response.context['next_query'])
+
+
+class BookingTotalsTests(TestCase):
+    """The SQL annotations must match the Python money methods to the cent."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rooms = [
+            Room.objects.create(name='Budget Room', description='', price=Decimal('99.99'), capacity=1),
+            Room.objects.create(name='Odd Suite', description='', price=Decimal('333.33'), capacity=3),
+        ]
+        today = timezone.now().date()
+        for i in range(12):
+            check_in = today + timedelta(days=1 + i)
+            booking = Booking.objects.create(
+                room=rooms[i % 2], guest_name=f'Guest {i}', guest_email=f'g{i}@example.com',
+                check_in_date=check_in, check_out_date=check_in + timedelta(days=1 + i % 5),
+                booking_id=f'TT-{i}',
+            )
+            if i % 3 == 0:
+                BookingAddon.objects.create(booking=booking, addon_type='breakfast',
+                                            price=Decimal('20.05'), breakfast_count=i % 4)
+            if i % 4 == 0:
+                BookingAddon.objects.create(booking=booking, addon_type='breakfast', price=Decimal('18.50'))
+                BookingAddon.objects.create(booking=booking, addon_type='transport', price=Decimal('45.45'))
+
+    def test_annotations_match_python(self):
+        annotated = {booking.pk: booking for booking in Booking.objects.with_totals()}
+        for booking in Booking.objects.select_related('room').prefetch_related('addons'):
+            row = annotated[booking.pk]
+            self.assertEqual(row.nights, booking.get_duration())
+            self.assertEqual(row.base_total, booking.get_total_price())
+            self.assertEqual(row.addon_total, booking.get_addon_total())
+            self.assertEqual(row.grand_total, booking.get_total_with_addons())
+            for value in (row.base_total, row.addon_total, row.grand_total):
+                self.assertIsInstance(value, Decimal)
+                self.assertEqual(value.as_tuple().exponent, -2)
+
+    def test_revenue_aggregate(self):
+        bookings = list(Booking.objects.select_related('room').prefetch_related('addons'))
+        with self.assertNumQueries(1):
+            revenue = Booking.objects.revenue()
+        self.assertEqual(revenue['bookings'], len(bookings))
+        self.assertEqual(revenue['nights'], sum(b.get_duration() for b in bookings))
+        self.assertEqual(revenue['base_total'], sum(b.get_total_price() for b in bookings))
+        self.assertEqual(revenue['addon_total'], sum(b.get_addon_total() for b in bookings))
+        self.assertEqual(revenue['grand_total'], sum(b.get_total_with_addons() for b in bookings))
+
+    def test_empty_revenue(self):
+        self.assertEqual(Booking.objects.none().revenue()['grand_total'], Decimal('0.00'))
+
+
+
+class RevenueRollupTests(TestCase):
+    def setUp(self):
+        invalidate_room_catalog()
+        self.rooms = [
+            Room.objects.create(name='Budget Room', description='', price=Decimal('99.99'), capacity=1),
+            Room.objects.create(name='Odd Suite', description='', price=Decimal('333.33'), capacity=3),
+        ]
+        self.today = timezone.now().date()
+
+    def _book(self, i, nights=2, status='approved', offset=1):
+        check_in = self.today + timedelta(days=offset + i)
+        return Booking.objects.create(
+            room=self.rooms[i % 2], guest_name=f'Guest {i}', guest_email=f'g{i}@example.com',
+            check_in_date=check_in, check_out_date=check_in + timedelta(days=nights),
+            status=status, booking_id=f'RR-{i}',
+        )
+
+    def _report(self, days=30):
+        return revenue_report(self.today, self.today + timedelta(days=days))
+
+    def test_rebuild_matches_bookings(self):
+        for i in range(10):
+            booking = self._book(i, nights=1 + i % 4, status='cancelled' if i % 5 == 4 else 'approved')
+            BookingAddon.objects.create(booking=booking, addon_type='breakfast',
+                                        price=Decimal('20.05'), breakfast_count=1 + i % 3)
+            if i % 2:
+                BookingAddon.objects.create(booking=booking, addon_type='transport', price=Decimal('45.45'))
+        rebuild_rollups()
+
+        report = self._report()
+        sold = Booking.objects.exclude(status='cancelled').revenue()
+        self.assertEqual(report['totals']['rooms_sold'], sold['nights'])
+        self.assertEqual(report['totals']['room_revenue'], sold['base_total'])
+        self.assertEqual(report['totals']['addon_revenue'], sold['addon_total'])
+        self.assertEqual(report['totals']['cancellations'], 2)
+        self.assertEqual(report['totals']['arrivals'], 8)
+        self.assertEqual(sum(addon['revenue'] for addon in report['addons'].values()), sold['addon_total'])
+        self.assertEqual(report['totals']['adr'],
+                         (sold['base_total'] / sold['nights']).quantize(Decimal('0.01')))
+        self.assertEqual(report['totals']['rooms_available'], 2 * 31)
+
+    def test_signals_update_rollups_incrementally(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = self._book(0, nights=3)
+        first_night = DailyRevenueRollup.objects.get(date=booking.check_in_date)
+        self.assertEqual((first_night.rooms_sold, first_night.room_revenue), (1, Decimal('99.99')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BookingAddon.objects.create(booking=booking, addon_type='breakfast',
+                                        price=Decimal('10.00'), breakfast_count=2)
+        self.assertEqual(self._report()['totals']['addon_revenue'], Decimal('20.00'))
+
+        # Moving the stay clears the nights it no longer covers
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.check_in_date += timedelta(days=10)
+            booking.check_out_date += timedelta(days=10)
+            booking.save()
+        self.assertEqual(DailyRevenueRollup.objects.get(date=first_night.date).rooms_sold, 0)
+        self.assertEqual(self._report()['totals']['rooms_sold'], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.status = 'cancelled'
+            booking.save()
+        totals = self._report()['totals']
+        self.assertEqual((totals['rooms_sold'], totals['cancellations'], totals['addon_revenue']),
+                         (0, 1, Decimal('0.00')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.delete()
+        self.assertEqual(self._report()['totals']['cancellations'], 0)
+
+    def test_saves_that_skip_stay_fields_skip_the_refresh(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = self._book(0, nights=3)
+        booking.guest_phone = '0123456789'
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as ctx:
+            booking.save(update_fields=['guest_phone'])
+        self.assertEqual(callbacks, [])
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('SELECT')])
+
+        booking.status = 'cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.save(update_fields=['status'])
+        self.assertEqual(DailyRevenueRollup.objects.get(date=booking.check_in_date).rooms_sold, 0)
+
+    def test_refresh_updates_rollup_rows_in_place(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = self._book(0, nights=2)
+        rows = dict(DailyRevenueRollup.objects.values_list('date', 'pk'))
+        refresh_rollups(booking.check_in_date - timedelta(days=1), booking.check_out_date)
+        self.assertEqual(DailyRevenueRollup.objects.get(date=booking.check_in_date).pk, rows[booking.check_in_date])
+        self.assertEqual(DailyRevenueRollup.objects.get(date=booking.check_in_date).rooms_sold, 1)
+        self.assertEqual(DailyRevenueRollup.objects.get(date=booking.check_in_date - timedelta(days=1)).rooms_sold, 0)
+
+    def test_long_stays_count_every_night(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = self._book(0, nights=40)
+        # The refresh of one night far into the stay still finds the booking
+        night = booking.check_in_date + timedelta(days=35)
+        refresh_rollups(night, night + timedelta(days=1))
+        self.assertEqual(DailyRevenueRollup.objects.get(date=night).rooms_sold, 1)
+        self.assertIn(booking, Booking.objects.overlapping(night, night + timedelta(days=1)))
+
+    def test_availability_ignores_stale_stay_bounds(self):
+        booking = self._book(0, nights=14)
+        night = booking.check_in_date + timedelta(days=10)
+        self.assertNotIn(booking.room, Room.get_available_rooms(night, night + timedelta(days=1)))
+        # Only an explicit bound narrows the check-in range
+        self.assertNotIn(booking, Booking.objects.overlapping(night, night + timedelta(days=1), longest_stay=3))
+        self.assertEqual(longest_stay_nights(), 14)
+
+    def test_report_reads_rollups_only(self):
+        for i in range(5):
+            self._book(i)
+        rebuild_rollups()
+        get_room_catalog()
+        with self.assertNumQueries(2):
+            report = revenue_report(self.today - timedelta(days=300), self.today + timedelta(days=65), group='month')
+        self.assertEqual(len(report['rows']), 13)
+        self.assertEqual(report['totals']['rooms_sold'], 10)
+
+    def test_dashboard_is_staff_only(self):
+        url = reverse('revenue_dashboard')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        staff = User.objects.create_user('finance', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(url, {'start': 'bogus', 'group': 'month'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['report']['group'], 'month')
+
+
+
+class BookingImportTests(TestCase):
+    HEADER = 'booking_id,room_id,room_name,guest_name,guest_email,check_in_date,check_out_date,status\n'
+
+    def setUp(self):
+        invalidate_room_catalog()
+        self.standard = Room.objects.create(name='Standard Room', description='', price=Decimal('100.00'))
+        self.deluxe = Room.objects.create(name='Deluxe Room', description='', price=Decimal('200.00'))
+        self.day = timezone.now().date() + timedelta(days=5)
+
+    def _csv(self, *rows):
+        lines = [','.join(str(value) for value in row) for row in rows]
+        return io.StringIO(self.HEADER + '\n'.join(lines) + '\n')
+
+    def _stay(self, booking_id, room='', offset=0, nights=2, status='approved', room_name=''):
+        check_in = self.day + timedelta(days=offset)
+        return (booking_id, room, room_name, 'Ann Lee', 'ann@example.com',
+                check_in, check_in + timedelta(days=nights), status)
+
+    def _import(self, stream, **kwargs):
+        return BookingImporter(**kwargs).run(read_rows(stream, 'csv'))
+
+    def test_creates_then_updates(self):
+        result = self._import(self._csv(
+            self._stay('IM-1', self.standard.pk), self._stay('IM-2', room_name='deluxe room'),
+        ))
+        self.assertEqual((result.created, result.updated, result.failed), (2, 0, 0))
+        self.assertEqual(Booking.objects.get(booking_id='IM-2').room, self.deluxe)
+
+        result = self._import(self._csv(self._stay('IM-1', self.standard.pk, offset=10, status='cancelled')))
+        self.assertEqual((result.created, result.updated), (0, 1))
+        booking = Booking.objects.get(booking_id='IM-1')
+        self.assertEqual((booking.status, booking.check_in_date), ('cancelled', self.day + timedelta(days=10)))
+        self.assertEqual(result.stay_range, (self.day, self.day + timedelta(days=12)))
+
+        result = self._import(self._csv(self._stay('IM-1', self.standard.pk)), update_existing=False)
+        self.assertEqual(result.failed, 1)
+
+    def test_validation_matches_booking_clean(self):
+        past = timezone.now().date() - timedelta(days=3)
+        result = self._import(self._csv(
+            ('IM-1', self.standard.pk, '', 'Ann', 'ann@example.com', past, past + timedelta(days=1), 'approved'),
+            self._stay('IM-2', self.standard.pk, nights=0),
+            self._stay('IM-3', 999),
+            self._stay('IM-4', self.standard.pk, status='confirmed'),
+            ('IM-5', self.standard.pk, '', 'Ann', 'not-an-email', self.day, self.day + timedelta(days=1), ''),
+        ))
+        self.assertEqual((result.created, result.failed), (0, 5))
+        messages_by_id = {error.booking_id: error.message for error in result.errors}
+        self.assertEqual(messages_by_id['IM-1'], 'Check-in date cannot be in the past')
+        self.assertEqual(messages_by_id['IM-2'], 'Check-out date must be after check-in date')
+        self.assertIn('Unknown room_id', messages_by_id['IM-3'])
+        self.assertIn('Invalid status', messages_by_id['IM-4'])
+        self.assertIn('Invalid guest_email', messages_by_id['IM-5'])
+
+        result = self._import(self._csv(
+            ('IM-1', self.standard.pk, '', 'Ann', 'ann@example.com', past, past + timedelta(days=1), 'completed'),
+        ), allow_past=True)
+        self.assertEqual(result.created, 1)
+
+    def test_overlaps_checked_setwise(self):
+        Booking.objects.create(room=self.standard, guest_name='Existing', guest_email='e@example.com',
+                               check_in_date=self.day, check_out_date=self.day + timedelta(days=2),
+                               status='approved', booking_id='EX-1')
+        rows = [
+            self._stay('IM-1', self.standard.pk, offset=1),  # overlaps EX-1
+            self._stay('IM-2', self.standard.pk, offset=2),  # starts on EX-1's check-out
+            self._stay('IM-3', self.standard.pk, offset=3),  # overlaps IM-2 from the same batch
+            self._stay('IM-4', self.standard.pk, offset=1, status='cancelled'),
+            self._stay('IM-5', self.deluxe.pk, offset=1),
+        ]
+        result = self._import(self._csv(*rows))
+        self.assertEqual(sorted(error.booking_id for error in result.errors), ['IM-1', 'IM-3'])
+        self.assertEqual(result.created, 3)
+
+        # Moving an existing booking frees its old nights for later rows in the batch
+        result = self._import(self._csv(
+            self._stay('EX-1', self.standard.pk, offset=20),
+            self._stay('IM-6', self.standard.pk, offset=0, nights=1),
+        ))
+        self.assertEqual((result.updated, result.created, result.failed), (1, 1, 0))
+
+    def test_queries_per_batch_are_constant(self):
+        def queries(count):
+            rows = [self._stay(f'Q{count}-{i}', self.standard.pk, offset=100 * count + 2 * i, nights=1)
+                    for i in range(count)]
+            with CaptureQueriesContext(connection) as ctx:
+                result = self._import(self._csv(*rows), batch_size=100)
+            self.assertEqual(result.created, count)
+            return len(ctx.captured_queries)
+
+        get_room_catalog()
+        self.assertEqual(queries(3), queries(60))
+
+    def test_export_round_trip_and_commands(self):
+        self._import(self._csv(self._stay('IM-1', self.standard.pk), self._stay('IM-2', self.deluxe.pk)))
+        stream = io.StringIO()
+        self.assertEqual(write_rows(stream, 'jsonl', export_rows(Booking.objects.all())), 2)
+        stream.seek(0)
+        result = BookingImporter().run(read_rows(stream, 'jsonl'))
+        self.assertEqual((result.updated, result.failed), (2, 0))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bookings.csv')
+            call_command('export_bookings', output=path, stderr=io.StringIO())
+            Booking.objects.all().delete()
+            out = io.StringIO()
+            call_command('import_bookings', path, stdout=out, stderr=io.StringIO())
+        self.assertEqual(Booking.objects.count(), 2)
+        self.assertIn('2 created', out.getvalue())
+        # bulk writes send no signals, so the command refreshes the rollups itself
+        self.assertEqual(DailyRevenueRollup.objects.get(date=self.day).rooms_sold, 2)
+
+
+class AdminCsvExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('boss', 'boss@example.com', 'secret')
+        self.client.force_login(self.admin)
+        room = Room.objects.create(name='Standard Room', description='', price=Decimal('100.00'))
+        today = timezone.now().date()
+        for i, status in enumerate(['approved', 'approved', 'pending']):
+            check_in = today + timedelta(days=1 + 3 * i)
+            booking = Booking.objects.create(
+                room=room, guest_name=f'Guest {i}', guest_email=f'g{i}@example.com',
+                check_in_date=check_in, check_out_date=check_in + timedelta(days=2),
+                status=status, booking_id=f'CSV-{i}',
+            )
+            BookingAddon.objects.create(booking=booking, addon_type='breakfast', price=Decimal('10.00'),
+                                        breakfast_count=2)
+
+    def _rows(self, response):
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        content = b''.join(response.streaming_content).decode()
+        return list(csv.reader(io.StringIO(content)))
+
+    def test_export_follows_changelist_filters(self):
+        response = self.client.get(reverse('admin:hotel_booking_booking_export'), {'status__exact': 'approved'})
+        rows = self._rows(response)
+        self.assertEqual(rows[0][:2], ['Booking ID', 'Guest name'])
+        self.assertEqual(sorted(row[0] for row in rows[1:]), ['CSV-0', 'CSV-1'])
+        grand_total = rows[0].index('Total (with add-ons)')
+        self.assertEqual({row[grand_total] for row in rows[1:]}, {'220.00'})
+
+    def test_export_queries_do_not_grow_with_rows(self):
+        url = reverse('admin:hotel_booking_bookingaddon_export')
+        self._rows(self.client.get(url))  # the first request also loads the session and user
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(len(self._rows(self.client.get(url))), 4)
+        booking = Booking.objects.first()
+        for _ in range(20):
+            BookingAddon.objects.create(booking=booking, addon_type='transport', price=Decimal('45.00'))
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(len(self._rows(self.client.get(url))), 24)
+        self.assertEqual(len(few), len(many))
+
+    def test_export_action_and_formula_escaping(self):
+        message = ContactMessage.objects.create(name='=HYPERLINK("x")', email='a@example.com',
+                                                subject='Hi', message='Hello')
+        ContactMessage.objects.create(name='Other', email='b@example.com', subject='Hi', message='Hello')
+        response = self.client.post(reverse('admin:hotel_booking_contactmessage_changelist'), {
+            'action': 'export_as_csv', '_selected_action': [message.pk],
+        })
+        rows = self._rows(response)
+        self.assertEqual(len(rows), 2)
+        self.assertIn('\'=HYPERLINK("x")', rows[1])
+
+    def test_export_requires_view_permission(self):
+        # The admin URL forces the superuser in (SeparateAdminSessionMiddleware), so call the view directly
+        request = RequestFactory().get('/admin/hotel_booking/booking/export/')
+        request.user = User.objects.create_user('clerk', password='secret', is_staff=True)
+        with self.assertRaises(PermissionDenied):
+            site._registry[Booking].export_csv_view(request)
+
+
+class BookingArchiveTests(TestCase):
+    def setUp(self):
+        invalidate_room_catalog()
+        self.room = Room.objects.create(name='Garden Room', description='', price=Decimal('120.50'))
+        self.guest = User.objects.create_user('returning', 'returning@example.com', 'secret')
+        self.today = timezone.now().date()
+
+    def _book(self, i, status, days_ago=400, nights=2):
+        # save() rejects past check-ins, so book ahead and move the stay back
+        booking = Booking.objects.create(
+            room=self.room, user=self.guest, guest_name=f'Old Guest {i}', guest_email=f'old{i}@example.com',
+            guest_phone=f'0198765{i:03d}', check_in_date=self.today + timedelta(days=1),
+            check_out_date=self.today + timedelta(days=1 + nights), status=status, booking_id=f'AR-{i}',
+        )
+        check_in = self.today - timedelta(days=days_ago + i)
+        Booking.objects.filter(pk=booking.pk).update(check_in_date=check_in,
+                                                    check_out_date=check_in + timedelta(days=nights))
+        return booking
+
+    def test_reused_booking_id_is_archived_again(self):
+        first = self._book(0, 'completed')
+        cutoff = self.today - timedelta(days=365)
+        self.assertEqual(archive_bookings(cutoff), 1)
+        # Live ids are only unique among live bookings
+        second = self._book(0, 'cancelled', days_ago=380)
+        self.assertEqual(archive_bookings(cutoff), 1)
+
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(BookingArchive.objects.filter(booking_id='AR-0').count(), 2)
+        self.assertEqual(find_archived_booking('AR-0').original_id, second.pk)
+        self.assertNotEqual(first.pk, second.pk)
+
+    def test_archiving_moves_bookings_and_keeps_rollups(self):
+        kept = self._book(0, 'approved')
+        recent = self._book(1, 'completed', days_ago=10)
+        for i, status in enumerate(['completed', 'cancelled', 'completed'], start=2):
+            booking = self._book(i, status)
+            BookingAddon.objects.create(booking=booking, addon_type='breakfast', price=Decimal('15.00'),
+                                        breakfast_count=2)
+            RoomServiceRequest.objects.create(booking=booking, service_type='cleaning', notes='Towels')
+        rebuild_rollups()
+        report_before = revenue_report(self.today - timedelta(days=500), self.today)
+
+        cutoff = self.today - timedelta(days=365)
+        self.assertEqual(archive_bookings(cutoff, batch_size=2), 3)
+
+        self.assertQuerySetEqual(Booking.objects.order_by('pk'), [kept, recent])
+        archived = BookingArchive.objects.get(booking_id='AR-2')
+        self.assertEqual((archived.room.name, archived.room_price), ('Garden Room', Decimal('120.50')))
+        self.assertEqual(archived.get_total_with_addons(), Decimal('271.00'))
+        self.assertEqual([addon.breakfast_count for addon in archived.addons.all()], [2])
+        self.assertEqual([service.notes for service in archived.room_services.all()], ['Towels'])
+        self.assertFalse(BookingAddon.objects.exists())
+
+        # Archived bookings still count, whether or not the rollups are rebuilt
+        self.assertEqual(revenue_report(self.today - timedelta(days=500), self.today), report_before)
+        rebuild_rollups()
+        self.assertEqual(revenue_report(self.today - timedelta(days=500), self.today), report_before)
+
+    def test_archiving_is_batched_and_limited(self):
+        for i in range(5):
+            self._book(i, 'completed')
+        batches = []
+        moved = archive_bookings(self.today, batch_size=2, limit=3, progress=batches.append)
+        self.assertEqual((moved, batches), (3, [2, 3]))
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_read_paths_find_archived_bookings(self):
+        self._book(0, 'completed')
+        live = Booking.objects.create(
+            room=self.room, user=self.guest, guest_name='Old Guest 1', guest_email='new@example.com',
+            check_in_date=self.today + timedelta(days=3), check_out_date=self.today + timedelta(days=4),
+            booking_id='AR-LIVE',
+        )
+        archive_bookings(self.today)
+
+        self.assertEqual(find_archived_booking('AR-0').guest_name, 'Old Guest 0')
+        self.assertIsNone(find_archived_booking('AR-LIVE'))
+        found = search_bookings(Q(guest_name__icontains='old guest'))
+        self.assertEqual([(booking.booking_id, booking.is_archived) for booking in found],
+                         [('AR-LIVE', False), ('AR-0', True)])
+        self.assertEqual(search_bookings(Q(guest_name__icontains='old guest'), limit=1), [live])
+        self.assertEqual([booking.booking_id for booking in bookings_for_user(self.guest)], ['AR-LIVE', 'AR-0'])
+
+        self.client.force_login(self.guest)
+        response = self.client.get(reverse('user_profile'))
+        self.assertContains(response, 'AR-0')
+        self.assertContains(response, 'Garden Room', count=2)
+
+        self.client.force_login(User.objects.create_superuser('boss', 'boss@example.com', 'secret'))
+        response = self.client.get(reverse('admin:hotel_booking_bookingarchive_changelist'))
+        self.assertContains(response, 'AR-0')
+
+    def test_archive_command_dry_run(self):
+        self._book(0, 'completed')
+        out = io.StringIO()
+        call_command('archive_bookings', '--months', '12', '--dry-run', stdout=out)
+        self.assertIn('1 bookings', out.getvalue())
+        self.assertEqual(Booking.objects.count(), 1)
+        call_command('archive_bookings', '--months', '12', stdout=io.StringIO())
+        self.assertEqual(BookingArchive.objects.count(), 1)
+
+
+class GuestProfileTests(TestCase):
+    def setUp(self):
+        self.room = Room.objects.create(name='Standard Room', description='', price=Decimal('100.00'))
+        self.today = timezone.now().date()
+
+    def _book(self, i, status='approved', email='Alice.Tan@Example.com', name='Alice Tan', phone='012-345 6789'):
+        check_in = self.today + timedelta(days=1 + 3 * i)
+        return Booking.objects.create(
+            room=self.room, guest_name=name, guest_email=email, guest_phone=phone, check_in_date=check_in,
+            check_out_date=check_in + timedelta(days=1), status=status, booking_id=f'GP-{i}',
+        )
+
+    def test_profiles_follow_approved_bookings(self):
+        booking = self._book(0, status='pending')
+        self.assertFalse(GuestProfile.objects.exists())
+        booking.status = 'approved'
+        booking.save()
+        self._book(1, phone='+60 12-999 0000')
+
+        profile = GuestProfile.objects.get()
+        self.assertEqual((profile.email, profile.phone_key, profile.last_booking_id),
+                         ('alice.tan@example.com', '60129990000', 'GP-1'))
+        self.assertEqual(find_guest_profile(email=' ALICE.TAN@example.com'), profile)
+        self.assertEqual(find_guest_profile(phone='+60129990000'), profile)
+        self.assertEqual(find_guest_profile(name='alice'), profile)
+        self.assertEqual(find_guest_profile(name='ALICE  TAN'), profile)
+        self.assertIsNone(find_guest_profile(name='ali'))
+        self.assertIsNone(find_guest_profile(phone='123'))
+
+    def test_lookups_are_cached_for_the_conversation(self):
+        self._book(0)
+        session = {'user_data': {}}
+        with self.assertNumQueries(1):
+            guest = check_returning_customer_by_context('Hi, my email is alice.tan@example.com', session)
+        self.assertEqual(guest['guest_name'], 'Alice Tan')
+
+        session['user_data']['email'] = 'alice.tan@example.com'
+        with self.assertNumQueries(0):
+            self.assertEqual(check_returning_customer_by_context('I want to book a room', session), guest)
+            check_returning_customer_by_context('Check in on 2026-12-01, booking BK-12345', session)
+
+        with self.assertNumQueries(1):
+            check_returning_customer_by_context("I'm Bob", session)
+        with self.assertNumQueries(0):
+            self.assertIsNone(check_returning_customer_by_context('hello', {'user_data': {}}))
+
+        # A phone number is an identifier too
+        with self.assertNumQueries(1):
+            guest = check_returning_customer_by_context('call me on 012 345 6789', {'user_data': {}})
+        self.assertEqual(guest['email'], 'alice.tan@example.com')
+
+    def test_import_and_backfill_maintain_profiles(self):
+        rows = [{'booking_id': 'GP-IMP', 'room_name': 'Standard Room', 'guest_name': 'Imported Guest',
+                 'guest_email': 'imported@example.com', 'check_in_date': str(self.today + timedelta(days=2)),
+                 'check_out_date': str(self.today + timedelta(days=3)), 'status': 'completed'}]
+        BookingImporter().run((i + 2, row, None) for i, row in enumerate(rows))
+        self.assertEqual(find_guest_profile(email='imported@example.com').guest_name, 'Imported Guest')
+
+        self._book(0, email='old@example.com', name='Old Name', status='completed')
+        archive_bookings(self.today + timedelta(days=30))
+        self._book(1, email='old@example.com', name='New Name')
+        GuestProfile.objects.all().delete()
+        migration = importlib.import_module('hotel_booking.migrations.0012_guest_profile')
+        migration.backfill_guest_profiles(apps, None)
+        self.assertEqual(sorted(GuestProfile.objects.values_list('email', 'guest_name')),
+                         [('imported@example.com', 'Imported Guest'), ('old@example.com', 'New Name')])
+
+
+class LogConfigTests(SimpleTestCase):
+    def _record(self, name, level=logging.INFO, msg='turn %s', args=(1,)):
+        return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+    def test_sampling_keeps_one_in_n_below_the_max_level(self):
+        sampling = SamplingFilter({'hotel_booking.chatbot.turns': 3})
+        kept = [sampling.filter(self._record('hotel_booking.chatbot.turns.sub')) for _ in range(7)]
+        self.assertEqual(kept, [True, False, False, True, False, False, True])
+        self.assertTrue(all(sampling.filter(self._record('hotel_booking.chatbot.turns', logging.WARNING))
+                            for _ in range(3)))
+        self.assertTrue(all(sampling.filter(self._record('hotel_booking.views')) for _ in range(3)))
+
+    def test_queue_handler_merges_arguments_when_enqueued(self):
+        handler = AsyncQueueHandler(queue.Queue(1))
+        data = {'state': 'greeting'}
+        handler.handle(self._record('hotel_booking', args=(data,)))
+        data['state'] = 'booking'
+        handler.handle(self._record('hotel_booking'))
+        record = handler.queue.get_nowait()
+        self.assertEqual((record.getMessage(), record.args), ("turn {'state': 'greeting'}", None))
+        self.assertEqual(handler.dropped, 1)
+
+    def test_queued_mode_writes_from_the_listener(self):
+        self.addCleanup(configure_logging, settings.LOGGING)
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_file = os.path.join(log_dir, 'chat.log')
+            config = {
+                'version': 1,
+                'disable_existing_loggers': False,
+                'formatters': {'plain': {'format': '%(name)s %(message)s'}},
+                'handlers': {'file': {'class': 'hotel_booking.log_config.RotatingFileHandler',
+                                      'filename': log_file, 'formatter': 'plain', 'maxBytes': 1000}},
+                'loggers': {'hotel_booking': {'handlers': ['file'], 'level': 'DEBUG'}},
+            }
+            with override_settings(LOG_MODE='queued', LOG_SAMPLING={'hotel_booking.chatbot.turns': 2}):
+                configure_logging(config)
+                self.assertIsInstance(logging.getLogger('hotel_booking').handlers[0], AsyncQueueHandler)
+                for i in range(4):
+                    logging.getLogger('hotel_booking.chatbot.turns').info('turn %d', i)
+                logging.getLogger('hotel_booking.views').warning('slow')
+                stop_logging()
+            with open(log_file) as f:
+                self.assertEqual(f.read().splitlines(), [
+                    'hotel_booking.chatbot.turns turn 0', 'hotel_booking.chatbot.turns turn 2',
+                    'hotel_booking.views slow',
+                ])
+            for handler in logging.getLogger('hotel_booking').handlers:
+                handler.close()
+
+    def test_listener_logs_dropped_records(self):
+        handler = AsyncQueueHandler(queue.Queue(1))
+        for i in range(3):
+            handler.handle(self._record('hotel_booking', args=(i,)))
+        captured = logging.handlers.BufferingHandler(10)
+        listener = QueueListener(handler, captured)
+        listener.start()
+        listener.stop()
+        self.assertEqual([record.getMessage() for record in captured.buffer],
+                         ['2 log records dropped: the logging queue was full', 'turn 0'])
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs fork()')
+    def test_forked_child_restarts_the_listeners(self):
+        self.addCleanup(configure_logging, settings.LOGGING)
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_file = os.path.join(log_dir, 'chat.log')
+            config = {
+                'version': 1,
+                'disable_existing_loggers': False,
+                'formatters': {'plain': {'format': '%(process)d %(message)s'}},
+                'handlers': {'file': {'class': 'logging.FileHandler', 'filename': log_file, 'formatter': 'plain'}},
+                'loggers': {'hotel_booking': {'handlers': ['file'], 'level': 'DEBUG'}},
+            }
+            with override_settings(LOG_MODE='queued'):
+                configure_logging(config)
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    logging.getLogger('hotel_booking').warning('from the child')
+                    stop_logging()
+                finally:
+                    os._exit(0)
+            os.waitpid(pid, 0)
+            stop_logging()
+            with open(log_file) as f:
+                self.assertEqual(f.read().splitlines(), [f'{pid} from the child'])
+            for handler in logging.getLogger('hotel_booking').handlers:
+                handler.close()
+
+    def test_rotating_file_handler_rolls_over_by_size(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_file = os.path.join(log_dir, 'debug.log')
+            handler = RotatingFileHandler(log_file, maxBytes=50, backupCount=2)
+            for i in range(10):
+                handler.emit(self._record('hotel_booking', msg='x' * 20, args=()))
+            handler.close()
+            self.assertEqual(sorted(os.listdir(log_dir)), ['debug.log', 'debug.log.1', 'debug.log.2'])
+            self.assertLessEqual(os.path.getsize(log_file + '.1'), 50 + 21)
+
+
+class RequestTimingTests(TestCase):
+    def test_request_writes_perf_line_and_server_timing(self):
+        seed_rooms()
+        with self.assertLogs('hotel_booking.perf', 'INFO') as logs:
+            response = self.client.get(reverse('index'))
+        self.assertEqual(len(logs.records), 1)
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry['method'], entry['path'], entry['status']), ('GET', reverse('index'), 200))
+        self.assertGreater(entry['db_queries'], 0)
+        self.assertIn('template', entry['phases'])
+        self.assertEqual(entry['nlp_ms'], 0)
+        header = response['Server-Timing']
+        self.assertTrue(header.startswith(f'db;dur={entry["db_ms"]};desc="{entry["db_queries"]} queries"'))
+        self.assertIn('template;dur=', header)
+        self.assertTrue(header.endswith(f'total;dur={entry["ms"]}'))
+
+    def test_streamed_body_is_timed_until_sent(self):
+        def turn(*args, **kwargs):
+            with timed('intent'):
+                time.sleep(0.02)
+                Room.objects.count()
+            return {'message': 'Hi', 'session': {}}
+
+        with mock.patch('hotel_booking.chatbot.views.process_chat_message', side_effect=turn), \
+                self.assertLogs('hotel_booking.perf', 'INFO') as logs:
+            response = self.client.post(reverse('chatbot_stream_api'), content_type='application/json',
+                                        data=json.dumps({'message': 'hi', 'session': {}}))
+            self.assertNotIn('Server-Timing', response)
+            # Nothing logged until the body has run; the perf logger needs one record for assertLogs
+            logging.getLogger('hotel_booking.perf').info('marker')
+            self.assertEqual(len(logs.records), 1)
+            b''.join(response.streaming_content)
+            response.close()
+        self.assertEqual(len(logs.records), 2)
+        entry = json.loads(logs.records[1].getMessage())
+        self.assertEqual(entry['db_queries'], 1)
+        self.assertGreaterEqual(entry['phases']['intent'], 20)
+        self.assertGreaterEqual(entry['ms'], entry['phases']['intent'])
+
+    def test_nested_phases_only_count_their_own_time(self):
+        @timed('validation')
+        def validate():
+            time.sleep(0.02)
+
+        validate()  # outside a request: not recorded
+        self.assertIsNone(current_timing())
+        with track_request() as timing:
+            with timed('intent'):
+                validate()
+            with timed('dates'):
+                Room.objects.count()
+        self.assertGreaterEqual(timing.phases['validation'], 0.02)
+        self.assertLess(timing.phases['intent'], 0.02)
+        self.assertEqual(timing.db_queries, 1)
+        self.assertIn('nlp;dur=', timing.server_timing())
+
+
+class MetricsTests(TestCase):
+    def _sample(self, text, line_prefix):
+        lines = [line for line in text.splitlines() if line.startswith(line_prefix + ' ')]
+        return float(lines[0].rsplit(' ', 1)[1]) if lines else 0.0
+
+    def test_render_uses_prometheus_text_format(self):
+        registry = Registry()
+        turns = Counter('turns_total', 'Turns.', ('intent', 'state'), registry=registry)
+        latency = Histogram('turn_seconds', 'Latency.', ('state',), buckets=(0.1, 1.0), registry=registry)
+        turns.inc('book', 'say "hi"\n')
+        turns.inc('book', 'say "hi"\n', amount=2)
+        for seconds in (0.05, 0.1, 0.5, 3):
+            latency.observe(seconds, 'greeting')
+        with latency.time('idle'):
+            pass
+
+        text = registry.render()
+        self.assertIn('# TYPE turns_total counter\nturns_total{intent="book",state="say \\"hi\\"\\n"} 3.0\n', text)
+        self.assertIn('turn_seconds_bucket{state="greeting",le="0.1"} 2\n'
+                      'turn_seconds_bucket{state="greeting",le="1.0"} 3\n'
+                      'turn_seconds_bucket{state="greeting",le="+Inf"} 4\n'
+                      'turn_seconds_count{state="greeting"} 4\n'
+                      'turn_seconds_sum{state="greeting"} 3.65\n', text)
+        self.assertEqual(self._sample(text, 'turn_seconds_count{state="idle"}'), 1)
+
+    def test_multiprocess_directory_aggregates_workers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            registry = Registry(directory)
+            turns = Counter('turns_total', 'Turns.', ('state',), registry=registry)
+            busy = Gauge('busy', 'Busy.', registry=registry)
+            turns.inc('greeting')
+            busy.set(2)
+            # Snapshot left behind by a worker that has exited
+            dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+            dead.wait()
+            with open(os.path.join(directory, f'{dead.pid}.json'), 'w') as f:
+                json.dump({'pid': dead.pid, 'metrics': {
+                    'turns_total': {'type': 'counter', 'samples': [[['greeting'], 4]]},
+                    'busy': {'type': 'gauge', 'samples': [[[], 5]]},
+                }}, f)
+
+            text = registry.render()
+            self.assertEqual(self._sample(text, 'turns_total{state="greeting"}'), 5)
+            self.assertEqual(self._sample(text, 'busy'), 2)
+            self.assertTrue(os.path.exists(os.path.join(directory, f'{os.getpid()}.json')))
+
+    def test_endpoint_counts_booking_events(self):
+        REGISTRY.clear()
+        room = Room.objects.create(name='Standard Room', description='', price=Decimal('100.00'))
+        suite = Room.objects.create(name='Executive Suite', description='', price=Decimal('300.00'))
+        check_in = timezone.now().date() + timedelta(days=3)
+        booking = Booking.objects.create(room=room, guest_name='Metric Guest', guest_email='m@example.com',
+                                         check_in_date=check_in, check_out_date=check_in + timedelta(days=2))
+        booking.room = suite
+        booking.save()
+        booking.status = 'cancelled'
+        booking.save()
+
+        # No token configured: closed unless DEBUG is on
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.client.get('/metrics').status_code, 200)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        for event in ('created', 'upgraded', 'cancelled'):
+            self.assertEqual(self._sample(text, f'hotel_bookings_total{{event="{event}"}}'), 1)
+        self.assertIn('# TYPE hotel_chatbot_turn_seconds histogram', text)
+
+
+class ExceptionMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        exception_groups.reset()
+        self.addCleanup(exception_groups.reset)
+
+    def _fail(self, request, message='database is locked'):
+        raise RuntimeError(message)
+
+    def _request(self, middleware):
+        return middleware(RequestFactory().get('/hotel_booking/chatbot/api/'))
+
+    @override_settings(DEBUG=False, EXCEPTION_LOG_INTERVAL=60)
+    def test_identical_exceptions_are_logged_once_per_interval(self):
+        middleware = ExceptionMiddleware(self._fail)
+        with self.assertLogs('hotel_booking.error_reporting', 'ERROR') as logs, \
+                mock.patch('hotel_booking.error_reporting.traceback.format_exception',
+                           wraps=traceback.format_exception) as format_exception:
+            responses = [self._request(middleware) for _ in range(5)]
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(format_exception.call_count, 1)
+        self.assertIn('RuntimeError', logs.output[0])
+        body = json.loads(responses[0].content)
+        self.assertEqual(responses[0].status_code, 500)
+        self.assertEqual(set(body), {'error', 'fingerprint'})
+        self.assertEqual({json.loads(r.content)['fingerprint'] for r in responses}, {body['fingerprint']})
+
+        group = exception_groups.snapshot()[body['fingerprint']]
+        self.assertEqual((group['type'], group['count'], group['suppressed']), ('RuntimeError', 5, 4))
+        with override_settings(EXCEPTION_LOG_INTERVAL=0), \
+                self.assertLogs('hotel_booking.error_reporting', 'ERROR') as logs:
+            self._request(middleware)
+        self.assertIn('(4 similar since last report)', logs.output[0])
+
+    @override_settings(DEBUG=True)
+    def test_debug_response_includes_traceback(self):
+        def fail_elsewhere(request):
+            raise RuntimeError('database is locked')
+
+        with self.assertLogs('hotel_booking.error_reporting', 'ERROR'):
+            first = json.loads(self._request(ExceptionMiddleware(self._fail)).content)
+            other = json.loads(self._request(DebugMiddleware(fail_elsewhere)).content)
+        self.assertEqual(first['details'], 'database is locked')
+        self.assertIn('Traceback', first['traceback'])
+        self.assertNotEqual(first['fingerprint'], other['fingerprint'])
+
+    def test_client_errors_keep_their_status(self):
+        def missing(request):
+            raise Http404('No such room')
+
+        with self.assertRaises(Http404):
+            self._request(ExceptionMiddleware(missing))
+        self.assertEqual(exception_groups.snapshot(), {})
+
+
+class ExceptionPassthroughTests(TestCase):
+    def test_missing_room_is_a_404(self):
+        exception_groups.reset()
+        self.assertEqual(self.client.get(reverse('room_details', args=[999999])).status_code, 404)
+        self.assertEqual(exception_groups.snapshot(), {})
+
+
+class IdentityCacheTests(TestCase):
+    def setUp(self):
+        invalidate_identity()
+        self.addCleanup(invalidate_identity)
+        self.admin = User.objects.create_superuser('boss', 'boss@example.com', 'pw')
+        self.guest = User.objects.create_user('guest', 'guest@example.com', 'pw')
+
+    def test_users_are_cached_until_saved(self):
+        with self.assertNumQueries(2):
+            first = get_admin_user()
+            self.assertEqual(get_admin_user(), self.admin)
+            self.assertEqual(get_user(str(self.guest.pk)), self.guest)
+            self.assertEqual(get_user(self.guest.pk), self.guest)
+        self.assertIsNot(first, get_admin_user())
+
+        # last_login updates from auth.login() keep the cache
+        self.admin.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            get_admin_user()
+
+        self.admin.is_active = False
+        self.admin.save()
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_admin_user())
+            self.assertIsNone(get_admin_user())
+
+        invalidate_identity()
+        with override_settings(IDENTITY_CACHE_TTL=0), self.assertNumQueries(2):
+            get_user(self.guest.pk)
+            get_user(self.guest.pk)
+
+    def test_admin_and_hotel_user_resolution_do_no_queries_when_warm(self):
+        middleware = SeparateAdminSessionMiddleware(lambda request: 'ok')
+        request = RequestFactory().get('/admin/')
+        request.user = self.admin
+        request.session = {'hotel_user_id': self.guest.pk}
+        get_hotel_booking_user(request)
+        with self.assertNumQueries(0):
+            self.assertEqual(middleware(request), 'ok')
+            self.assertEqual(get_hotel_booking_user(request), self.guest)
+
+        self.guest.is_active = False
+        self.guest.save()
+        self.assertIsNone(get_hotel_booking_user(request))
+
+
+class ClearExpiredSessionsTests(TestCase):
+    def test_deletes_only_expired_sessions_in_batches(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f'expired{i}', session_data='', expire_date=now - timedelta(hours=i + 1))
+        Session.objects.create(session_key='live', session_data='', expire_date=now + timedelta(days=1))
+
+        out = io.StringIO()
+        call_command('clear_expired_sessions', '--dry-run', stdout=out)
+        self.assertIn('5 expired sessions would be deleted', out.getvalue())
+        self.assertEqual(Session.objects.count(), 6)
+
+        call_command('clear_expired_sessions', '--batch-size', '2', '--limit', '3', '--pause', '0', stdout=out)
+        self.assertEqual(Session.objects.count(), 3)
+        call_command('clear_expired_sessions', '--batch-size', '2', '--pause', '0', stdout=out)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+
+
+class SqliteDatabaseSettingsTests(SimpleTestCase):
+    def test_tuned_connection_uses_wal_and_immediate_transactions(self):
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        from project.database import sqlite_database
+
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict = connection.settings_dict.copy()
+            settings_dict.update(sqlite_database(os.path.join(directory, 'tuned.sqlite3')))
+            wrapper = DatabaseWrapper(settings_dict, alias='tuned')
+            try:
+                with wrapper.cursor() as cursor:
+                    pragmas = {}
+                    for name in ('journal_mode', 'synchronous', 'cache_size', 'busy_timeout'):
+                        cursor.execute(f'PRAGMA {name}')
+                        pragmas[name] = cursor.fetchone()[0]
+                self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1,
+                                           'cache_size': -64 * 1024, 'busy_timeout': 20000})
+                self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+            finally:
+                wrapper.close()
+        with mock.patch.dict(os.environ, {'SQLITE_TUNED': '0'}):
+            self.assertNotIn('OPTIONS', sqlite_database('stock.sqlite3'))
+
+
+class DatabaseFromEnvTests(SimpleTestCase):
+    DB_VARIABLES = ('DATABASE_URL', 'DB_ENGINE', 'DB_NAME', 'DB_HOST', 'DB_POOL', 'DB_CONN_MAX_AGE')
+
+    def database(self, **environ):
+        from project.database import database_from_env
+
+        with mock.patch.dict(os.environ, environ):
+            for name in self.DB_VARIABLES:
+                if name not in environ:
+                    os.environ.pop(name, None)
+            return database_from_env('fallback.sqlite3')
+
+    def test_sqlite_fallback(self):
+        self.assertEqual(self.database()['NAME'], 'fallback.sqlite3')
+        self.assertEqual(self.database(DATABASE_URL='sqlite:////srv/hotel.sqlite3')['NAME'], '/srv/hotel.sqlite3')
+
+    def test_server_profiles(self):
+        from django.core.exceptions import ImproperlyConfigured
+
+        mysql = self.database(DATABASE_URL='mysql://hotel:p%40ss@db:3306/hotel')
+        self.assertEqual((mysql['ENGINE'], mysql['NAME'], mysql['USER'], mysql['PASSWORD'], mysql['HOST'], mysql['PORT']),
+                         ('django.db.backends.mysql', 'hotel', 'hotel', 'p@ss', 'db', '3306'))
+        self.assertEqual((mysql['CONN_MAX_AGE'], mysql['CONN_HEALTH_CHECKS']), (600, False))
+        self.assertEqual(mysql['OPTIONS']['charset'], 'utf8mb4')
+
+        pooled = self.database(DB_ENGINE='postgresql', DB_HOST='pg', DB_POOL='1')
+        self.assertEqual(pooled['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(pooled['CONN_MAX_AGE'], 0)
+        self.assertEqual(pooled['OPTIONS']['pool'], {'min_size': 2, 'max_size': 10, 'timeout': 10})
+
+        with self.assertRaises(ImproperlyConfigured):
+            self.database(DB_ENGINE='mysql', DB_POOL='1')
+        with self.assertRaises(ImproperlyConfigured):
+            self.database(DB_ENGINE='oracle')
+
+
+class ConnectionHealthTests(SimpleTestCase):
+    def fake_connection(self, usable=True, **attributes):
+        conn = mock.Mock(alias='default', connection=object(), in_atomic_block=False, health_last_used=100.0)
+        conn.is_usable.return_value = usable
+        for name, value in attributes.items():
+            setattr(conn, name, value)
+        return conn
+
+    def test_only_idle_connections_are_checked(self):
+        from .db_health import check_connection
+
+        busy = self.fake_connection(usable=False)
+        self.assertFalse(check_connection(busy, now=110.0, idle_limit=30))
+        busy.is_usable.assert_not_called()
+
+        alive = self.fake_connection()
+        self.assertFalse(check_connection(alive, now=200.0, idle_limit=30))
+        alive.close.assert_not_called()
+
+        stale = self.fake_connection(usable=False)
+        with self.assertLogs('hotel_booking.db_health', 'WARNING'):
+            self.assertTrue(check_connection(stale, now=200.0, idle_limit=30))
+        stale.close.assert_called_once_with()
+
+    def test_reads_are_retried_once_on_a_lost_connection(self):
+        from django.db import OperationalError
+        from .db_health import retry_read
+
+        read = mock.Mock(side_effect=[OperationalError('server has gone away'), 'booking'])
+        lost = self.fake_connection(usable=False)
+        with mock.patch('hotel_booking.db_health.connections', {'default': lost}), \
+                self.assertLogs('hotel_booking.db_health', 'WARNING'):
+            self.assertEqual(retry_read(read, 'BK-1'), 'booking')
+        self.assertEqual(read.call_count, 2)
+        lost.close.assert_called_once_with()
+
+        # A lock timeout on a working connection, or any error inside a transaction, is not retried
+        for conn in (self.fake_connection(), self.fake_connection(usable=False, in_atomic_block=True)):
+            read = mock.Mock(side_effect=OperationalError('database is locked'))
+            with mock.patch('hotel_booking.db_health.connections', {'default': conn}):
+                with self.assertRaises(OperationalError):
+                    retry_read(read)
+            self.assertEqual(read.call_count, 1)
+
+    def test_lost_replica_connection_is_retried_on_the_replica(self):
+        from django.db import OperationalError
+        from .chatbot.booking_cache import BookingCache
+
+        # The queryset's db is what the router picked inside replica_reads()
+        queryset = mock.Mock(db='replica')
+        queryset.filter.return_value = queryset
+        queryset.first.side_effect = [OperationalError('server closed the connection'), Booking(pk=7, booking_id='BK-7')]
+        default, replica = self.fake_connection(), self.fake_connection(usable=False)
+        with mock.patch.object(BookingCache, '_booking_queryset', return_value=queryset), \
+                mock.patch('hotel_booking.db_health.connections', {'default': default, 'replica': replica}), \
+                self.assertLogs('hotel_booking.db_health', 'WARNING'):
+            self.assertEqual(BookingCache().find_booking('BK-7').pk, 7)
+        replica.close.assert_called_once_with()
+        default.close.assert_not_called()
+
+
+@unittest.skipIf('replica' in settings.DATABASES, 'DB_REPLICA_URL is set; the replica mirrors the test database')
+class ReplicaRoutingTests(TestCase):
+    """A second SQLite file stands in for a replica that hasn't caught up with the primary."""
+
+    @classmethod
+    def setUpClass(cls):
+        from project.database import sqlite_database
+
+        super().setUpClass()
+        # The alias only exists from here on: the test runner's system checks
+        # would reject it in ``databases`` before setUpClass
+        cls.directory = tempfile.TemporaryDirectory()
+        replica = sqlite_database(os.path.join(cls.directory.name, 'replica.sqlite3'))
+        connections.configure_settings({'default': connection.settings_dict, 'replica': replica})
+        connections.settings['replica'] = replica
+        cls.databases = {'default', 'replica'}
+        call_command('migrate', database='replica', verbosity=0, interactive=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        del cls.databases
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.booking = seed_bookings(seed_rooms(), 'Primary Guest', 1)[0]
+
+    def booking_visible(self):
+        return Booking.objects.filter(pk=self.booking.pk).exists()
+
+    def test_only_replica_blocks_read_from_the_replica(self):
+        from .db_routing import replica_reads
+
+        User.objects.create_user('night_manager')
+        self.assertTrue(self.booking_visible())
+        with replica_reads():
+            self.assertFalse(self.booking_visible())
+            self.assertEqual(Booking.objects.all().db, 'replica')
+            # Users and sessions always come from the primary
+            self.assertTrue(User.objects.filter(username='night_manager').exists())
+            self.booking.status = 'confirmed'
+            self.booking.save()
+            # After a write the rest of the block reads from the primary
+            self.assertTrue(self.booking_visible())
+        self.assertEqual(Booking.objects.get(pk=self.booking.pk).status, 'confirmed')
+
+    def test_conversation_reads_its_own_writes(self):
+        from .db_routing import PRIMARY_UNTIL_KEY, conversation, replica_reads
+
+        session = {}
+        with conversation(session), replica_reads():
+            self.assertFalse(self.booking_visible())
+        self.booking.status = 'cancelled'
+        with conversation(session):
+            self.booking.save()
+        self.assertIn(PRIMARY_UNTIL_KEY, session)
+
+        # The next turn of the same conversation stays on the primary, other conversations don't
+        with conversation(session), replica_reads():
+            self.assertTrue(self.booking_visible())
+        with conversation({}), replica_reads():
+            self.assertFalse(self.booking_visible())
+        with override_settings(REPLICA_STICKY_SECONDS=0):
+            with conversation(session):
+                self.booking.save()
+            with conversation(session), replica_reads():
+                self.assertFalse(self.booking_visible())
+
+    def test_client_sent_deadline_is_validated(self):
+        from .db_routing import PRIMARY_UNTIL_KEY, conversation, replica_reads
+
+        # Numeric strings still pin; anything else reads from the replica
+        for deadline, pinned in ((str(time.time() + 60), True), ('soon', False), ([1], False), (None, False)):
+            with conversation({PRIMARY_UNTIL_KEY: deadline}), replica_reads():
+                self.assertEqual(self.booking_visible(), pinned)
+
+
+@unittest.skipUnless(SPACY_MODEL_AVAILABLE, 'spaCy model en_core_web_sm is not installed')
+class ChatQueryBudgetTests(TransitionQueryBudgetMixin, TestCase):
+    """Query budgets for the main chatbot flows; tighten these as lookups are optimized."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_bookings(seed_rooms(), 'John Smith', 2, prefix='BK')
+
+    def chat(self, messages):
+        from .chatbot.dialog_manager import DialogManager
+        from .chatbot.views import process_chat_message
+
+        dialog_manager = DialogManager()
+        session = {}
+        for message in messages:
+            dialog_manager.delayed_messages = []
+            session = process_chat_message(message, session, dialog_manager=dialog_manager)['session']
+        return session
+
+    def test_cancel_flow(self):
+        with self.assertTransitionQueryBudget(default=8):
+            self.chat(["I want to cancel my booking", "BK-10000", "yes"])
+
+    def test_upgrade_flow(self):
+        with self.assertTransitionQueryBudget(default=10):
+            self.chat(["upgrade room", "BK-10001", "deluxe room"])
@@ -20,10 +20,15 @@ urlpatterns = [
     path('add/', views.add_room, name='add_room'),
     path('edit/<int:room_id>/', views.edit_room, name='edit_room'),
     path('bookings/', views.view_bookings, name='view_bookings'),
+    path('bookings/api/', views.bookings_api, name='bookings_api'),
+    path('reports/revenue/', views.revenue_dashboard, name='revenue_dashboard'),
+    path('reports/exceptions/', views.exception_report, name='exception_report'),
     path('bookings/approve/<int:booking_id>/', views.approve_booking, name='approve_booking'),
     # 添加聊天机器人URL
     path('chatbot/', chatbot_views.chatbot_view, name='chatbot'),
     path('chatbot/api/', chatbot_views.chatbot_api, name='chatbot_api'),
+    path('chatbot/api/stream/', chatbot_views.chatbot_stream_api, name='chatbot_stream_api'),
+    path('chatbot/api/metrics/', chatbot_views.chatbot_metrics, name='chatbot_metrics'),
     # 在现有的urlpatterns列表中添加以下内容
     path('contact/', views.contact_us, name='contact_us'),
     path('user/profile/', views.user_profile, name='user_profile'),
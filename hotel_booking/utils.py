@@ -1,7 +1,8 @@
-from django.contrib.auth.models import User
 from django.contrib import auth
 import logging
 
+from .identity import get_admin_user, get_user
+
 logger = logging.getLogger(__name__)
 
 def ensure_admin_logged_in(request):
@@ -10,8 +11,10 @@ def ensure_admin_logged_in(request):
     Can be called from views that need to guarantee admin access.
     """
     try:
-        admin_user = User.objects.filter(is_superuser=True, is_active=True).first()
-        if admin_user and not (request.user.is_authenticated and request.user.is_superuser):
+        if request.user.is_authenticated and request.user.is_superuser:
+            return True
+        admin_user = get_admin_user()
+        if admin_user:
             auth.login(request, admin_user)
             logger.info(f"Ensured admin login for user: {admin_user.username}")
             return True
@@ -27,8 +30,5 @@ def get_hotel_booking_user(request):
     if hasattr(request, 'session'):
         hotel_user_id = request.session.get('hotel_user_id')
         if hotel_user_id:
-            try:
-                return User.objects.get(id=hotel_user_id)
-            except User.DoesNotExist:
-                pass
+            return get_user(hotel_user_id)
     return None
\ No newline at end of file
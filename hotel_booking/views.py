@@ -1,26 +1,41 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import HttpResponse, JsonResponse
+from urllib.parse import urlencode
 from django.contrib import messages
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY as METRICS_REGISTRY
 from .models import Room, Booking, UserProfile
+from .archive import bookings_for_user
+from .db_routing import replica_reads
+from .error_reporting import exception_groups
 from .forms import AddRoomForm, BookingApprovalForm, RoomForm, UserRegisterForm, UserProfileForm
+from .pagination import InvalidCursor, filter_bookings, page_query_string, paginate_keyset
+from .reporting import revenue_report
+from .room_catalog import get_room_catalog
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.forms import AuthenticationForm
+from django.conf import settings
+import hmac
 
 # Home and Admin Views
 def index(request):
-    rooms = Room.objects.all()
+    rooms = get_room_catalog().all()
     return render(request, 'hotel_booking/index.html', {'rooms': rooms})
 
 @staff_member_required
 @login_required
+@replica_reads()
 def admin_home(request):
-    rooms = Room.objects.all()
-    bookings = Booking.objects.all()
+    rooms = get_room_catalog().all()
+    page, filters = _booking_page(request)
     return render(request, 'hotel_booking/admin_home.html', {
         'rooms': rooms,
-        'bookings': bookings
+        'bookings': page,
+        'next_query': page_query_string(filters, page.next_cursor) if page.has_next else None,
     })
 
 # Room Management Views
@@ -38,9 +53,10 @@ def add_room(request):
     return render(request, 'hotel_booking/add_room.html', {'form': form})
 
 def available_rooms(request):
-    rooms = Room.objects.all()
+    rooms = get_room_catalog().all()
     return render(request, 'hotel_booking/available_rooms.html', {'rooms': rooms})
 
+@replica_reads()
 def room_details(request, room_id):
     room = get_object_or_404(Room, id=room_id)
     return render(request, 'hotel_booking/room_details.html', {'room': room})
@@ -114,12 +130,84 @@ def approve_booking(request, booking_id):
         'form': form
     })
 
+def _booking_page(request):
+    """One keyset page of bookings, newest first, filtered by the request's query string."""
+    bookings, filters = filter_bookings(Booking.objects.for_listing(), request.GET)
+    try:
+        page = paginate_keyset(bookings, request.GET.get('cursor'))
+    except InvalidCursor:
+        page = paginate_keyset(bookings)
+    return page, filters
+
 @staff_member_required
+@replica_reads()
 def view_bookings(request):
-    bookings = Booking.objects.all().order_by('-created_at')
-    return render(request, 'hotel_booking/view_bookings.html', {'bookings': bookings})
+    page, filters = _booking_page(request)
+    return render(request, 'hotel_booking/view_bookings.html', {
+        'bookings': page,
+        'filters': filters,
+        'status_choices': Booking.STATUS_CHOICES,
+        'first_query': urlencode(filters),
+        'next_query': page_query_string(filters, page.next_cursor) if page.has_next else None,
+    })
+
+@staff_member_required
+@replica_reads()
+def bookings_api(request):
+    """JSON variant of view_bookings for loading pages incrementally."""
+    bookings, filters = filter_bookings(Booking.objects.for_listing(), request.GET)
+    try:
+        page = paginate_keyset(bookings, request.GET.get('cursor'), request.GET.get('page_size') or 50)
+    except (InvalidCursor, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'results': [{
+            'id': booking.id,
+            'booking_id': booking.booking_id,
+            'guest_name': booking.guest_name,
+            'room': booking.room.name,
+            'user': booking.user.username if booking.user else None,
+            'check_in_date': booking.check_in_date,
+            'check_out_date': booking.check_out_date,
+            'status': booking.status,
+            'total': booking.get_total_with_addons(),
+            'created_at': booking.created_at,
+        } for booking in page],
+        'filters': filters,
+        'next_cursor': page.next_cursor,
+    })
+
+# Longest period the revenue dashboard reports on at once
+MAX_REPORT_DAYS = 3 * 366
+
 
 @staff_member_required
+@replica_reads()
+def revenue_dashboard(request):
+    """Revenue and occupancy (ADR, RevPAR, add-ons, cancellations) read from the daily rollups."""
+    today = timezone.localdate()
+    end = _report_day(request.GET.get('end')) or today
+    start = _report_day(request.GET.get('start')) or end - timedelta(days=29)
+    if start > end:
+        start, end = end, start
+    if (end - start).days >= MAX_REPORT_DAYS:
+        messages.warning(request, f'Reports cover at most {MAX_REPORT_DAYS} days; the period was shortened.')
+        start = end - timedelta(days=MAX_REPORT_DAYS - 1)
+    group = request.GET.get('group') if request.GET.get('group') in ('day', 'month') else 'day'
+
+    report = revenue_report(start, end, group=group)
+    return render(request, 'hotel_booking/revenue_dashboard.html', {'report': report})
+
+
+def _report_day(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+@staff_member_required
+@replica_reads()
 def manage_rooms(request):
     rooms = Room.objects.all()
     return render(request, 'hotel_booking/manage_rooms.html', {'rooms': rooms})
@@ -183,7 +271,7 @@ def edit_profile(request):
 @login_required
 def user_profile(request):
     # Get user information and booking history
-    bookings = Booking.objects.filter(user=request.user).order_by('-created_at')
+    bookings = bookings_for_user(request.user)
     # Get or create user profile
     profile, created = UserProfile.objects.get_or_create(user=request.user)
     return render(request, 'hotel_booking/user_profile.html', {'bookings': bookings, 'profile': profile})
@@ -226,4 +314,25 @@ def contact_us(request):
             messages.error(request, "Sorry, there was an error sending your message. Please try again.")
             return render(request, 'hotel_booking/contact_us.html')
 
-    return render(request, 'hotel_booking/contact_us.html')
\ No newline at end of file
+    return render(request, 'hotel_booking/contact_us.html')
+
+
+@staff_member_required
+def exception_report(request):
+    """Unhandled exception groups of this process with their counts (staff only)"""
+    return JsonResponse({'groups': exception_groups.snapshot()})
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint (see metrics.py). Requests need an
+    ``Authorization: Bearer <METRICS_TOKEN>`` header; without a token
+    configured the endpoint is only open when DEBUG is on.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=403)
+    return HttpResponse(METRICS_REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
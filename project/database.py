@@ -0,0 +1,195 @@
+"""
+Database settings for project.settings.
+
+SQLite is tuned for several gunicorn workers sharing one file:
+
+* WAL journal, so readers never block the writer and the writer never blocks
+  readers; ``synchronous=NORMAL`` is durable across application crashes in
+  WAL mode and only fsyncs at checkpoints.
+* A larger page cache and memory-mapped reads.
+* ``timeout`` (SQLite's busy_timeout) makes a connection wait for the write
+  lock instead of failing with "database is locked" straight away.
+* ``transaction_mode=IMMEDIATE`` takes the write lock when a transaction
+  starts. A deferred transaction that reads and then writes can't be helped
+  by busy_timeout: if another connection wrote in between, SQLite fails the
+  upgrade at once.
+* Connections are kept for ``CONN_MAX_AGE`` seconds and health-checked before
+  reuse, so the pragmas run once per connection rather than per request.
+
+Every value can be overridden from the environment (see ``sqlite_database``).
+
+Setting DATABASE_URL or DB_ENGINE switches to a MySQL or PostgreSQL server
+instead (see ``server_database``): persistent connections, checked by
+``hotel_booking.db_health`` after idle periods, or a psycopg connection pool
+on PostgreSQL with DB_POOL=1. DB_REPLICA_URL adds a read replica that
+``hotel_booking.db_routing`` sends read-only lookups to.
+"""
+import os
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from django.core.exceptions import ImproperlyConfigured
+
+# PRAGMAs run on every new connection (Django's ``init_command`` option)
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('temp_store', 'MEMORY'),
+)
+
+
+def _env(name, default, cast=str):
+    value = os.environ.get(name)
+    return default if value in (None, '') else cast(value)
+
+
+def sqlite_pragmas(cache_mb=None, mmap_mb=None):
+    """``init_command`` string: SQLITE_PRAGMAS plus the page cache and mmap sizes."""
+    cache_mb = _env('SQLITE_CACHE_MB', 64, int) if cache_mb is None else cache_mb
+    mmap_mb = _env('SQLITE_MMAP_MB', 256, int) if mmap_mb is None else mmap_mb
+    pragmas = list(SQLITE_PRAGMAS) + [
+        # Negative cache_size is in KiB rather than pages
+        ('cache_size', -cache_mb * 1024),
+        ('mmap_size', mmap_mb * 1024 * 1024),
+    ]
+    return ';'.join(f'PRAGMA {name}={value}' for name, value in pragmas)
+
+
+def sqlite_database(name, tuned=True):
+    """
+    ``DATABASES`` entry for the SQLite file ``name``.
+
+    Environment overrides: SQLITE_TUNED=0 for Django's stock settings,
+    SQLITE_BUSY_TIMEOUT (seconds), SQLITE_CACHE_MB, SQLITE_MMAP_MB and
+    DB_CONN_MAX_AGE (seconds; 0 closes connections after each request).
+    """
+    tuned = tuned and _env('SQLITE_TUNED', '1') != '0'
+    if not tuned:
+        return {'ENGINE': 'django.db.backends.sqlite3', 'NAME': name}
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': _env('DB_CONN_MAX_AGE', 600, int),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': _env('SQLITE_BUSY_TIMEOUT', 20, float),
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': sqlite_pragmas(),
+        },
+    }
+
+
+SERVER_ENGINES = {
+    'mysql': 'django.db.backends.mysql',
+    'postgres': 'django.db.backends.postgresql',
+    'postgresql': 'django.db.backends.postgresql',
+}
+
+
+def server_database(engine, name, user='', password='', host='', port='', options=None):
+    """
+    ``DATABASES`` entry for a MySQL or PostgreSQL server.
+
+    Environment overrides: DB_CONN_MAX_AGE (seconds), DB_CONNECT_TIMEOUT
+    (seconds) and, PostgreSQL only, DB_POOL=1 with DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE and DB_POOL_TIMEOUT (needs ``psycopg[pool]``). A pool
+    replaces persistent connections, so CONN_MAX_AGE is 0 with it.
+    """
+    if engine not in SERVER_ENGINES:
+        raise ImproperlyConfigured(f"Unsupported database engine {engine!r}; "
+                                   f"use one of {', '.join(sorted(SERVER_ENGINES))} or sqlite")
+    pool = _env('DB_POOL', '0') != '0'
+    connect_timeout = _env('DB_CONNECT_TIMEOUT', 5, int)
+    if engine == 'mysql':
+        if pool:
+            raise ImproperlyConfigured("DB_POOL is only supported on PostgreSQL; "
+                                       "MySQL reuses connections through DB_CONN_MAX_AGE")
+        engine_options = {
+            'charset': 'utf8mb4',
+            'connect_timeout': connect_timeout,
+            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+            'isolation_level': 'read committed',
+        }
+    else:
+        engine_options = {'connect_timeout': connect_timeout}
+        if pool:
+            engine_options['pool'] = {
+                'min_size': _env('DB_POOL_MIN_SIZE', 2, int),
+                'max_size': _env('DB_POOL_MAX_SIZE', 10, int),
+                'timeout': _env('DB_POOL_TIMEOUT', 10, float),
+            }
+    engine_options.update(options or {})
+    return {
+        'ENGINE': SERVER_ENGINES[engine],
+        'NAME': name,
+        'USER': user,
+        'PASSWORD': password,
+        'HOST': host,
+        'PORT': str(port or ''),
+        'CONN_MAX_AGE': 0 if pool else _env('DB_CONN_MAX_AGE', 600, int),
+        # hotel_booking.db_health pings only connections that sat idle, instead
+        # of every reused connection once per request
+        'CONN_HEALTH_CHECKS': False,
+        'OPTIONS': engine_options,
+    }
+
+
+def parse_database_url(url):
+    """
+    ``(engine, name, user, password, host, port, options)`` from a URL such
+    as ``mysql://user:secret@db:3306/hotel?charset=utf8mb4``.
+    """
+    parts = urlsplit(url)
+    return (
+        parts.scheme,
+        # sqlite:////abs/path keeps its leading slash
+        unquote(parts.path[1:]),
+        unquote(parts.username or ''),
+        unquote(parts.password or ''),
+        parts.hostname or '',
+        parts.port or '',
+        dict(parse_qsl(parts.query)),
+    )
+
+
+def database_from_url(url, sqlite_path=None):
+    """``DATABASES`` entry for a DATABASE_URL-style ``url``."""
+    engine, name, user, password, host, port, options = parse_database_url(url)
+    if engine == 'sqlite':
+        return sqlite_database(name or sqlite_path)
+    return server_database(engine, name, user, password, host, port, options)
+
+
+def database_from_env(sqlite_path):
+    """
+    ``DATABASES['default']`` from the environment.
+
+    DATABASE_URL wins; otherwise DB_ENGINE (``mysql``, ``postgresql`` or the
+    default ``sqlite``) with DB_NAME, DB_USER, DB_PASSWORD, DB_HOST and
+    DB_PORT. SQLite uses ``sqlite_path`` unless DB_NAME is set.
+    """
+    url = _env('DATABASE_URL', '')
+    if url:
+        return database_from_url(url, sqlite_path)
+
+    engine = _env('DB_ENGINE', 'sqlite').lower()
+    if engine in ('sqlite', 'sqlite3'):
+        return sqlite_database(_env('DB_NAME', sqlite_path))
+    return server_database(
+        engine, _env('DB_NAME', 'hotel_booking'), _env('DB_USER', ''), _env('DB_PASSWORD', ''),
+        _env('DB_HOST', 'localhost'), _env('DB_PORT', ''),
+    )
+
+
+def replica_from_env():
+    """
+    ``DATABASES['replica']`` from DB_REPLICA_URL, or None without one.
+
+    The replica is a read-only copy of the default database kept up to date
+    by the server's replication, so tests use the default database for it.
+    """
+    url = _env('DB_REPLICA_URL', '')
+    if not url:
+        return None
+    replica = database_from_url(url)
+    replica['TEST'] = {'MIRROR': 'default'}
+    return replica
@@ -13,9 +13,20 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 import os
 from pathlib import Path
 
+from .database import database_from_env, replica_from_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Deployment settings can live in a .env file next to manage.py; variables
+# already set in the environment take precedence.
+try:
+    from dotenv import load_dotenv
+except ImportError:  # python-dotenv missing: use the process environment only
+    pass
+else:
+    load_dotenv(BASE_DIR / '.env')
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -42,6 +53,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'hotel_booking.middleware.RequestTimingMiddleware',         # perf.log and Server-Timing
+    'hotel_booking.middleware.MetricsMiddleware',               # /metrics across workers
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,16 +62,18 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'hotel_booking.middleware.SeparateAdminSessionMiddleware',  # Only admin panel interference
     'hotel_booking.middleware.SessionIsolationMiddleware',      # Session isolation
+    'hotel_booking.middleware.ReadYourWritesMiddleware',        # Replica stickiness after writes
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'hotel_booking.middleware.DebugMiddleware',
+    'hotel_booking.middleware.ExceptionMiddleware',
 ]
 
 ROOT_URLCONF = 'project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to the perf log
+        'BACKEND': 'hotel_booking.request_timing.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -73,18 +88,100 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'project.wsgi.application'
+# Under ASGI (daphne) chatbot_stream_api streams from an async generator;
+# WSGI workers stream its synchronous one
+ASGI_APPLICATION = 'project.asgi.application'
+
+# Channels layer for the chatbot WebSocket consumer. The in-memory layer is
+# enough for a single process; set CHANNEL_REDIS_URL to share it across workers.
+if os.environ.get('CHANNEL_REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.environ['CHANNEL_REDIS_URL']]},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+    }
+
+# Cache. The room catalog keeps its version key here, so set CACHE_REDIS_URL
+# when running several workers to invalidate their catalogs together.
+if os.environ.get('CACHE_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CACHE_REDIS_URL'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    }
+
+# Sessions. SESSION_PROFILE picks where request.session lives:
+#   db              django_session table only
+#   cached_db       django_session, read through the 'sessions' cache
+#   cache           'sessions' cache only; sessions are lost with the cache
+#   signed_cookies  in the cookie itself, signed with SECRET_KEY
+# The 'sessions' cache is Redis with CACHE_REDIS_URL, a directory shared by all
+# workers on the host with SESSION_CACHE_DIR, or local memory. Local memory is
+# per process, so a logout in one worker wouldn't reach another's copy: the
+# default is cached_db with a shared cache and db without one.
+# Expired rows are deleted by the clear_expired_sessions command.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SHARED_SESSION_CACHE = bool(os.environ.get('CACHE_REDIS_URL') or os.environ.get('SESSION_CACHE_DIR'))
+SESSION_PROFILE = os.environ.get('SESSION_PROFILE', 'cached_db' if SHARED_SESSION_CACHE else 'db')
+SESSION_ENGINE = SESSION_ENGINES[SESSION_PROFILE]
+SESSION_CACHE_ALIAS = 'sessions'
+if os.environ.get('CACHE_REDIS_URL'):
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['CACHE_REDIS_URL'],
+        'KEY_PREFIX': 'sessions',
+    }
+elif os.environ.get('SESSION_CACHE_DIR'):
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['SESSION_CACHE_DIR'],
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    }
+else:
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# SQLite in WAL mode with persistent connections, or a MySQL/PostgreSQL server
+# from DATABASE_URL / DB_ENGINE; see project/database.py.
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_from_env(BASE_DIR / 'db.sqlite3'),
 }
 
+# Read replica for read-only lookups (hotel_booking/db_routing.py). After a
+# conversation or staff session writes a booking its reads stay on the
+# primary for REPLICA_STICKY_SECONDS, which must exceed the replication lag.
+replica = replica_from_env()
+if replica:
+    DATABASES['replica'] = replica
+DATABASE_ROUTERS = ['hotel_booking.db_routing.PrimaryReplicaRouter']
+REPLICA_STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
+# Reused connections idle for longer than this are pinged before the next
+# request's queries (hotel_booking/db_health.py)
+DB_IDLE_CHECK_SECONDS = float(os.environ.get('DB_IDLE_CHECK_SECONDS', 30))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -140,6 +237,36 @@ EMAIL_HOST_PASSWORD = 'your_password'  # 替换为您的密码
 DEFAULT_FROM_EMAIL = 'your_email@example.com'  # 发件人邮箱
 
 # 在文件末尾添加
+# Logging. LOG_MODE 'queued' hands records to a background thread that formats
+# and writes them (see hotel_booking/log_config.py); 'sync' writes them from
+# the request thread. debug.log rotates by size, or daily with LOG_ROTATION=time.
+# perf.log gets one JSON line per request (hotel_booking.middleware.RequestTimingMiddleware)
+# and rotates the same way; set PERF_LOG_LEVEL=WARNING to turn it off.
+LOGGING_CONFIG = 'hotel_booking.log_config.configure_logging'
+LOG_MODE = os.environ.get('LOG_MODE', 'queued')
+LOG_QUEUE_SIZE = 10000
+LOG_ROTATION = os.environ.get('LOG_ROTATION', 'size')
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG')
+PERF_LOG_LEVEL = os.environ.get('PERF_LOG_LEVEL', 'INFO')
+# Keep 1 in N records at or below LOG_SAMPLING_MAX_LEVEL from these loggers
+LOG_SAMPLING = {
+    'hotel_booking.chatbot.turns': int(os.environ.get('LOG_TURN_SAMPLE_EVERY', 10)),
+}
+LOG_SAMPLING_MAX_LEVEL = 'INFO'
+
+if LOG_ROTATION == 'time':
+    LOG_FILE_HANDLER = {
+        'class': 'logging.handlers.TimedRotatingFileHandler',
+        'when': 'midnight',
+        'backupCount': 7,
+    }
+else:
+    LOG_FILE_HANDLER = {
+        'class': 'hotel_booking.log_config.RotatingFileHandler',
+        'maxBytes': 10 * 1024 * 1024,
+        'backupCount': 5,
+    }
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -148,6 +275,9 @@ LOGGING = {
             'format': '{levelname} {asctime} {module} {message}',
             'style': '{',
         },
+        'message': {
+            'format': '%(message)s',
+        },
     },
     'handlers': {
         'console': {
@@ -156,10 +286,18 @@ LOGGING = {
             'formatter': 'verbose',
         },
         'file': {
+            **LOG_FILE_HANDLER,
             'level': 'DEBUG',
-            'class': 'logging.FileHandler',
             'filename': 'debug.log',
             'formatter': 'verbose',
+            'encoding': 'utf-8',
+        },
+        'perf_file': {
+            **LOG_FILE_HANDLER,
+            'level': 'INFO',
+            'filename': 'perf.log',
+            'formatter': 'message',
+            'encoding': 'utf-8',
         },
     },
     'loggers': {
@@ -170,13 +308,35 @@ LOGGING = {
         },
         'hotel_booking': {
             'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'level': LOG_LEVEL,
             'propagate': True,
         },
+        'hotel_booking.perf': {
+            'handlers': ['perf_file'],
+            'level': PERF_LOG_LEVEL,
+            'propagate': False,
+        },
     },
 }
 
 # Authentication settings
+# /metrics (hotel_booking/metrics.py). Point METRICS_MULTIPROC_DIR at a directory
+# shared by all gunicorn workers, emptied before the server starts, to report
+# totals over every worker instead of just the one that answers the scrape.
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1.0))
+# Scrapers must send "Authorization: Bearer <token>"; unset, /metrics is only served with DEBUG on
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Unhandled exceptions (hotel_booking/error_reporting.py): each fingerprint is
+# logged with its traceback at most once per interval (seconds)
+EXCEPTION_LOG_INTERVAL = float(os.environ.get('EXCEPTION_LOG_INTERVAL', 60))
+EXCEPTION_MAX_GROUPS = 500
+
+# Seconds another process may keep serving a changed admin/hotel user
+# (hotel_booking/identity.py); this process drops it on save
+IDENTITY_CACHE_TTL = 60
+
 LOGIN_URL = '/hotel_booking/login/'
 LOGIN_REDIRECT_URL = '/hotel_booking/'
 LOGOUT_REDIRECT_URL = '/hotel_booking/'
@@ -20,9 +20,12 @@ from django.urls import include, path
 from django.conf.urls.static import static
 from django.views.generic import RedirectView
 
+from hotel_booking.views import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('hotel_booking/', include('hotel_booking.urls')),
+    path('metrics', metrics, name='metrics'),
     path('', RedirectView.as_view(url='hotel_booking/', permanent=True)),  # Add this line to redirect root to hotel_booking
     ] + static (settings.MEDIA_URL, document_root =settings.MEDIA_ROOT)
 